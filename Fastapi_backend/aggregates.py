@@ -0,0 +1,226 @@
+"""
+Incrementally maintained dashboard aggregates (the stat_counters table)
+Writes bump counters in the same transaction; /api/stats reads a few hundred rows whatever the table sizes
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Appointment, Feedback, Prediction, StatCounter
+
+# Predictions below this confidence are reported as out of scope (as in main.py)
+LOW_CONFIDENCE_THRESHOLD = float(os.getenv("LOW_CONFIDENCE_THRESHOLD", "0.5"))
+STATS_DAYS = int(os.getenv("STATS_DAYS", "30"))
+
+# Counter scopes; daily keys are ISO dates (UTC), so they sort and range-filter as text
+PREDICTION_CLASS = "prediction_class"
+APPOINTMENT_STATUS = "appointment_status"
+TOTAL = "total"
+DAILY = {
+    "predictions": "daily_predictions",
+    "appointments": "daily_appointments",
+    "feedback": "daily_feedback",
+}
+
+# (scope, key) -> [count, value_sum, low_count]
+Deltas = Dict[Tuple[str, str], list]
+
+
+def _utc_day(value: Optional[datetime] = None) -> str:
+    """ISO date of ``value`` in UTC; naive values are UTC already (SQLite CURRENT_TIMESTAMP)"""
+    if value is None:
+        value = datetime.now(timezone.utc)
+    elif value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date().isoformat()
+
+
+def _bump(deltas: Deltas, scope: str, key: str, count: int = 1, value: float = 0.0, low: int = 0) -> None:
+    entry = deltas.setdefault((scope, key), [0, 0.0, 0])
+    entry[0] += count
+    entry[1] += value
+    entry[2] += low
+
+
+_upserts = {}
+
+
+def _upsert(dialect: str):
+    """INSERT ... ON CONFLICT DO UPDATE adding to the counters, built once per dialect"""
+    statement = _upserts.get(dialect)
+    if statement is None:
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(StatCounter)
+        statement = statement.on_conflict_do_update(
+            index_elements=[StatCounter.scope, StatCounter.key],
+            set_={
+                "count": StatCounter.count + statement.excluded.count,
+                "value_sum": StatCounter.value_sum + statement.excluded.value_sum,
+                "low_count": StatCounter.low_count + statement.excluded.low_count,
+            },
+        )
+        _upserts[dialect] = statement
+    return statement
+
+
+def apply_deltas(db, deltas: Deltas) -> None:
+    """Add ``deltas`` to the counters (PostgreSQL or SQLite) in the caller's transaction"""
+    if not deltas:
+        return
+    # Fixed key order so concurrent writers lock rows in the same order
+    rows = [
+        {"scope": scope, "key": key, "count": count, "value_sum": value, "low_count": low}
+        for (scope, key), (count, value, low) in sorted(deltas.items())
+    ]
+    db.execute(_upsert(db.get_bind().dialect.name), rows)
+
+
+def prediction_deltas(predictions: Iterable[Tuple[str, float]], day: Optional[str] = None) -> Deltas:
+    deltas: Deltas = {}
+    day = day or _utc_day()
+    for prediction_result, confidence in predictions:
+        low = int(confidence < LOW_CONFIDENCE_THRESHOLD)
+        _bump(deltas, PREDICTION_CLASS, prediction_result, 1, confidence, low)
+        _bump(deltas, TOTAL, "predictions", 1, confidence, low)
+        _bump(deltas, DAILY["predictions"], day)
+    return deltas
+
+
+def record_predictions(db, predictions: Iterable[Tuple[str, float]]) -> None:
+    """Count new (prediction_result, confidence) rows"""
+    apply_deltas(db, prediction_deltas(predictions))
+
+
+def record_feedback(db, count: int = 1) -> None:
+    deltas: Deltas = {}
+    _bump(deltas, TOTAL, "feedback", count)
+    _bump(deltas, DAILY["feedback"], _utc_day(), count)
+    apply_deltas(db, deltas)
+
+
+def record_appointment(db, status, previous_status=None) -> None:
+    """Count a new appointment, or move one from ``previous_status`` to ``status``"""
+    deltas: Deltas = {}
+    if previous_status is None:
+        _bump(deltas, TOTAL, "appointments")
+        _bump(deltas, DAILY["appointments"], _utc_day())
+    elif previous_status == status:
+        return
+    else:
+        _bump(deltas, APPOINTMENT_STATUS, _status_key(previous_status), -1)
+    _bump(deltas, APPOINTMENT_STATUS, _status_key(status))
+    apply_deltas(db, deltas)
+
+
+def _status_key(status) -> str:
+    return getattr(status, "value", status)
+
+
+def rebuild_aggregates(db, batch_size: int = 10000) -> Dict[str, int]:
+    """Recompute every counter from the base tables and replace the stored ones.
+
+    Streams rows rather than grouping in SQL so day boundaries are computed
+    in UTC identically on SQLite and PostgreSQL. Used to backfill an existing
+    database and to repair drift from writes made outside these routes.
+    """
+    deltas: Deltas = {}
+    rows = defaultdict(int)
+
+    query = db.query(Prediction.prediction_result, Prediction.confidence, Prediction.timestamp)
+    for prediction_result, confidence, timestamp in query.yield_per(batch_size):
+        low = int(confidence < LOW_CONFIDENCE_THRESHOLD)
+        _bump(deltas, PREDICTION_CLASS, prediction_result, 1, confidence, low)
+        _bump(deltas, TOTAL, "predictions", 1, confidence, low)
+        _bump(deltas, DAILY["predictions"], _utc_day(timestamp))
+        rows["predictions"] += 1
+
+    for (timestamp,) in db.query(Feedback.timestamp).yield_per(batch_size):
+        _bump(deltas, TOTAL, "feedback")
+        _bump(deltas, DAILY["feedback"], _utc_day(timestamp))
+        rows["feedback"] += 1
+
+    for status, timestamp in db.query(Appointment.status, Appointment.timestamp).yield_per(batch_size):
+        _bump(deltas, TOTAL, "appointments")
+        _bump(deltas, DAILY["appointments"], _utc_day(timestamp))
+        _bump(deltas, APPOINTMENT_STATUS, _status_key(status))
+        rows["appointments"] += 1
+
+    db.query(StatCounter).delete()
+    apply_deltas(db, deltas)
+    db.commit()
+    return {**rows, "counters": len(deltas)}
+
+
+def ensure_aggregates(db) -> Optional[Dict[str, int]]:
+    """Create and backfill the counters once for a database that predates them"""
+    StatCounter.__table__.create(bind=db.get_bind(), checkfirst=True)
+    if db.query(StatCounter.scope).first() is not None:
+        return None
+    if not any(db.query(model.id).first() for model in (Prediction, Feedback, Appointment)):
+        return None
+    return rebuild_aggregates(db)
+
+
+def read_stats(db, days: int = STATS_DAYS) -> Dict:
+    """Dashboard statistics from the counters alone"""
+    query = db.query(StatCounter)
+    if days > 0:
+        since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+        query = query.filter(or_(StatCounter.scope.notin_(DAILY.values()), StatCounter.key >= since))
+    else:
+        query = query.filter(StatCounter.scope.notin_(DAILY.values()))
+    counters = {(counter.scope, counter.key): counter for counter in query.all()}
+
+    def count(scope, key):
+        counter = counters.get((scope, key))
+        return counter.count if counter else 0
+
+    predictions = counters.get((TOTAL, "predictions"))
+    total_predictions = predictions.count if predictions else 0
+    by_status = {key: counter.count for (scope, key), counter in counters.items()
+                 if scope == APPOINTMENT_STATUS and counter.count}
+
+    per_class = {}
+    for (scope, key), counter in sorted(counters.items()):
+        if scope == PREDICTION_CLASS and counter.count:
+            per_class[key] = {
+                "count": counter.count,
+                "mean_confidence": round(counter.value_sum / counter.count, 4),
+                "low_confidence": counter.low_count,
+            }
+
+    daily = defaultdict(lambda: {name: 0 for name in DAILY})
+    for name, scope in DAILY.items():
+        for (counter_scope, key), counter in counters.items():
+            if counter_scope == scope:
+                daily[key][name] = counter.count
+
+    return {
+        # Keys the existing API test expects
+        "total_predictions": total_predictions,
+        "total_appointments": count(TOTAL, "appointments"),
+        "total_feedback": count(TOTAL, "feedback"),
+        "pending_appointments": by_status.get("pending", 0),
+        "approved_appointments": by_status.get("approved", 0),
+        "appointments_by_status": by_status,
+        "predictions_by_class": per_class,
+        "mean_confidence": round(predictions.value_sum / total_predictions, 4) if total_predictions else None,
+        "low_confidence_threshold": LOW_CONFIDENCE_THRESHOLD,
+        "low_confidence_rate": round(predictions.low_count / total_predictions, 4) if total_predictions else 0.0,
+        "daily": dict(sorted(daily.items())),
+    }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"✅ Rebuilt aggregates: {rebuild_aggregates(db)}")
+    finally:
+        db.close()
@@ -0,0 +1,144 @@
+"""
+Multi-image uploads for the batch prediction endpoints
+Expands zip/tar archives, predicts in chunks and formats NDJSON lines
+"""
+
+import asyncio
+import os
+import tarfile
+import zipfile
+from typing import Awaitable, Callable, Dict, List, Tuple, Union
+
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from batching import predict_batch
+from prediction_cache import content_key, prediction_cache
+from response_encoding import dumps
+from upload_limits import check_image_bytes, check_size
+
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "100"))
+# Images per forward pass; results are streamed after each chunk
+PREDICT_BATCH_CHUNK = int(os.getenv("PREDICT_BATCH_CHUNK", "32"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+ZIP_TYPES = ("application/zip", "application/x-zip-compressed")
+TAR_TYPES = ("application/x-tar", "application/gzip", "application/x-gzip", "application/x-gtar")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _is_zip(upload: UploadFile) -> bool:
+    name = (upload.filename or "").lower()
+    return upload.content_type in ZIP_TYPES or name.endswith(".zip")
+
+
+def _is_tar(upload: UploadFile) -> bool:
+    name = (upload.filename or "").lower()
+    return upload.content_type in TAR_TYPES or name.endswith((".tar", ".tar.gz", ".tgz"))
+
+
+def _read_archive(upload: UploadFile) -> List[Tuple[str, bytes]]:
+    """Image members of a zip or tar upload, read from the spooled temp file"""
+    images = []
+    upload.file.seek(0)
+    if _is_zip(upload):
+        with zipfile.ZipFile(upload.file) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    # Declared size, checked before inflating (zip bombs)
+                    check_size(info.file_size, info.filename)
+                    images.append((info.filename, archive.read(info)))
+                    if len(images) > MAX_BATCH_FILES:
+                        break
+    else:
+        with tarfile.open(fileobj=upload.file, mode="r:*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    check_size(member.size, member.name)
+                    images.append((member.name, archive.extractfile(member).read()))
+                    if len(images) > MAX_BATCH_FILES:
+                        break
+    return images
+
+
+async def collect_images(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """(filename, bytes) for every uploaded image, expanding archives"""
+    images = []
+    for upload in files:
+        if _is_zip(upload) or _is_tar(upload):
+            try:
+                images.extend(await run_in_threadpool(_read_archive, upload))
+            except (zipfile.BadZipFile, tarfile.TarError) as e:
+                raise HTTPException(status_code=400, detail=f"Invalid archive {upload.filename}: {str(e)}")
+        else:
+            check_size(upload.size or 0, upload.filename)
+            images.append((upload.filename, await upload.read()))
+
+        if len(images) > MAX_BATCH_FILES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many images in one request (max {MAX_BATCH_FILES})"
+            )
+
+    if not images:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    return images
+
+
+async def predict_many(images: List[Tuple[str, bytes]], model_version: str,
+                       decode: Callable[[bytes], Awaitable[np.ndarray]],
+                       predict_fn: Callable[[np.ndarray], np.ndarray],
+                       build_payload: Callable[[np.ndarray], Dict]) -> List[Union[Dict, Exception]]:
+    """Prediction payloads for a chunk of images with a single forward pass.
+
+    Cached uploads are answered directly, the rest are sniffed and
+    size-checked from their headers, then decoded in parallel and run
+    through the model together. Failed images yield their exception in
+    place of a payload so one bad file doesn't sink the batch.
+    """
+    keys = [content_key(data, model_version) for _, data in images]
+    cached = await asyncio.gather(*(prediction_cache.get(key) for key in keys))
+    results: List[Union[Dict, Exception, None]] = list(cached)
+
+    pending = []
+    for i, result in enumerate(results):
+        if result is None:
+            try:
+                check_image_bytes(images[i][1], images[i][0])
+                pending.append(i)
+            except HTTPException as e:
+                results[i] = e
+    decoded = await asyncio.gather(*(decode(images[i][1]) for i in pending), return_exceptions=True)
+
+    ready = []
+    for i, pixels in zip(pending, decoded):
+        if isinstance(pixels, Exception):
+            results[i] = pixels
+        else:
+            ready.append((i, pixels))
+
+    if ready:
+        try:
+            probabilities = await predict_batch(predict_fn, [pixels for _, pixels in ready])
+        except Exception as e:
+            for i, _ in ready:
+                results[i] = e
+        else:
+            for (i, _), row in zip(ready, probabilities):
+                payload = build_payload(row)
+                prediction_cache.put(keys[i], payload)
+                results[i] = payload
+
+    return results
+
+
+def error_detail(error: Exception) -> str:
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return str(error)
+
+
+def ndjson(obj: Dict) -> bytes:
+    return dumps(obj) + b"\n"
@@ -0,0 +1,213 @@
+"""
+Dynamic micro-batching for model inference
+Collects concurrent /predict requests into a single tensor batch
+"""
+
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from executors import MAX_PENDING_INFERENCE, BoundedExecutor, ExecutorSaturated, inference_executor
+from metrics import elapsed_ms, registry, stage_ms
+from preprocessing import BatchBuffer
+
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Queued by close(): everything ahead of it is still served, then the worker exits
+_CLOSE = object()
+
+
+class BatchScheduler:
+    """Groups single-image requests into batches for one model call.
+
+    A batch is flushed when it reaches ``max_batch_size`` or when the oldest
+    waiting request has been queued for ``max_wait_ms``. ``predict_fn`` takes
+    an ``(N, H, W, C)`` float32 array and returns ``(N, num_classes)`` and is
+    run on ``executor`` so the event loop stays responsive. Once ``max_queue``
+    requests are waiting, new submissions are rejected with a 503, as they
+    are after ``close()``; requests accepted before it are still answered.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 name: str = "predict",
+                 executor: BoundedExecutor = inference_executor,
+                 max_queue: int = MAX_PENDING_INFERENCE,
+                 labels: Optional[Dict[str, str]] = None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self.executor = executor
+        self.max_queue = max(1, max_queue)
+        # Distinguishes schedulers sharing a name (e.g. one per model version) in /metrics
+        self.labels = labels
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._buffer: Optional[BatchBuffer] = None
+        self._closing = False
+
+        self.batch_size_histogram = registry.histogram(
+            f"{name}_batch_size", "Images per model call", BATCH_SIZE_BUCKETS, labels=labels
+        )
+        self.queue_wait_histogram = registry.histogram(
+            f"{name}_queue_wait_ms", "Time a request waited for its batch (ms)", labels=labels
+        )
+        registry.gauge(f"{name}_queue_depth", "Requests waiting for a batch",
+                       lambda: self._queue.qsize() if self._queue is not None else 0, labels=labels)
+
+    def _ensure_worker(self) -> None:
+        """Start the batching task on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, image: np.ndarray) -> np.ndarray:
+        """Queue one image and wait for its class probabilities.
+
+        ``image`` is either uint8 pixels ``(H, W, C)``, normalised straight
+        into the batch buffer, or an already normalised float array.
+        """
+        if image.ndim == 4:
+            image = image[0]
+
+        if self._closing:
+            raise ExecutorSaturated(self.name)
+        self._ensure_worker()
+        if self._queue.qsize() >= self.max_queue:
+            raise ExecutorSaturated(self.name)
+
+        future = self._loop.create_future()
+        await self._queue.put((image, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future, float]]:
+        """The next batch; it ends with _CLOSE when close() was called behind it"""
+        items = [await self._queue.get()]
+        if items[0] is _CLOSE:
+            return items
+        deadline = items[0][2] + self.max_wait
+
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Take whatever is already queued without waiting
+                while len(items) < self.max_batch_size and not self._queue.empty():
+                    items.append(self._queue.get_nowait())
+                    if items[-1] is _CLOSE:
+                        return items
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+            if items[-1] is _CLOSE:
+                break
+
+        return items
+
+    async def _run(self) -> None:
+        while True:
+            items = await self._collect()
+            closing = items[-1] is _CLOSE
+            if closing:
+                items.pop()
+            if items:
+                await self._dispatch(items)
+            if closing:
+                return
+
+    async def _dispatch(self, items: List[Tuple[np.ndarray, asyncio.Future, float]]) -> None:
+        dispatched_at = time.perf_counter()
+
+        # Drop requests whose client already went away
+        items = [item for item in items if not item[1].done()]
+        if not items:
+            return
+
+        for _, _, enqueued_at in items:
+            self.queue_wait_histogram.observe((dispatched_at - enqueued_at) * 1000.0)
+        self.batch_size_histogram.observe(len(items))
+
+        # Assemble the batch in a reused buffer instead of np.stack
+        image_shape = items[0][0].shape
+        if self._buffer is None or self._buffer.array.shape[1:] != image_shape:
+            self._buffer = BatchBuffer(self.max_batch_size, image_shape)
+        started = time.perf_counter()
+        for i, (image, _, _) in enumerate(items):
+            self._buffer.fill(i, image)
+        stage_ms["normalize"].observe(elapsed_ms(started))
+        batch = self._buffer.view(len(items))
+        try:
+            predictions = await self.executor.run(timed_predict, self.predict_fn, batch)
+        except asyncio.CancelledError:
+            # Loop shutting down: the batch in flight must not hang its requests
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(ExecutorSaturated(self.name))
+            raise
+        except Exception as e:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, future, _) in enumerate(items):
+            if not future.done():
+                future.set_result(predictions[i])
+
+    def close(self) -> None:
+        """Stop accepting requests; the ones already queued are still served (see ``drained``)"""
+        if self._closing:
+            return
+        self._closing = True
+        for metric in ("queue_depth", "batch_size", "queue_wait_ms"):
+            registry.remove(f"{self.name}_{metric}", self.labels)
+        if self._worker is not None and not self._worker.done():
+            self._queue.put_nowait(_CLOSE)
+
+    async def drained(self) -> None:
+        """Wait until close() has let every accepted request finish"""
+        if self._worker is not None:
+            await asyncio.shield(self._worker)
+
+    def stats(self) -> dict:
+        """Batch-size and queue-wait histograms for monitoring"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_ms": self.queue_wait_histogram.snapshot(),
+        }
+
+
+def timed_predict(predict_fn: Callable[[np.ndarray], np.ndarray], batch: np.ndarray) -> np.ndarray:
+    """``predict_fn(batch)``, recorded as the inference stage (run on the executor, so no queueing)"""
+    started = time.perf_counter()
+    predictions = predict_fn(batch)
+    stage_ms["inference"].observe(elapsed_ms(started))
+    return predictions
+
+
+async def predict_batch(predict_fn: Callable[[np.ndarray], np.ndarray],
+                        images: List[np.ndarray],
+                        executor: BoundedExecutor = inference_executor) -> np.ndarray:
+    """One forward pass over a list of images, bypassing the request queue"""
+    started = time.perf_counter()
+    buffer = BatchBuffer(len(images), images[0].shape[-3:])
+    for i, image in enumerate(images):
+        buffer.fill(i, image[0] if image.ndim == 4 else image)
+    stage_ms["normalize"].observe(elapsed_ms(started))
+    return await executor.run(timed_predict, predict_fn, buffer.view(len(images)))
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Load test the database layer: async engine + AsyncSession routes vs sync Session in async handlers
+Serves each variant with uvicorn and drives it with --clients concurrent HTTP clients
+
+Usage:
+    python benchmark_db_pool.py                                   # temp SQLite file, 200 clients
+    python benchmark_db_pool.py --db-latency-ms 2 --duration 30
+    python benchmark_db_pool.py --url postgresql://user:pw@localhost/bench --db-latency-ms 0
+
+--db-latency-ms stands in for the network round trip to a database server
+on SQLite: every statement waits that long on the thread that runs it. With
+the sync engine that is the event loop, as with psycopg2; with aiosqlite it
+is the connection's own thread, as asyncpg waits on a socket.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+FEEDBACK_ROWS = 5000
+# (weight, method, path): mostly dashboard reads, some writes
+REQUEST_MIX = [
+    (8, "GET", "/api/feedback/?limit=20"),
+    (1, "GET", "/api/stats"),
+    (1, "POST", "/api/feedback/"),
+]
+
+
+def add_latency(engine, latency_ms: float) -> None:
+    """Make every statement on ``engine``'s SQLite connections take ``latency_ms`` longer"""
+    if latency_ms <= 0 or engine.dialect.name != "sqlite":
+        return
+    from sqlalchemy import event
+
+    delay = latency_ms / 1000.0
+
+    class SlowConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # Runs on the thread executing the statement
+            self.set_trace_callback(lambda statement: time.sleep(delay))
+
+    @event.listens_for(engine, "do_connect")
+    def use_slow_connection(dialect, conn_rec, cargs, cparams):
+        cparams["factory"] = SlowConnection
+
+
+def sync_app(url: str, latency_ms: float):
+    """The routes as they were: a sync Session used inside ``async def`` handlers"""
+    from fastapi import Depends, FastAPI, HTTPException, Query, Request
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session, sessionmaker
+
+    from aggregates import read_stats, record_feedback
+    from models import Feedback
+    from pagination import keyset_page, page_response
+    from schemas import FeedbackCreate, FeedbackResponse
+
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args)
+    add_latency(engine, latency_ms)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.post("/api/feedback/")
+    async def create_feedback(feedback: FeedbackCreate, db: Session = Depends(get_db)):
+        try:
+            db_feedback = Feedback(**feedback.model_dump())
+            db.add(db_feedback)
+            record_feedback(db)
+            db.commit()
+            db.refresh(db_feedback)
+            return {"status": "success", "data": {"id": db_feedback.id}}
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to save feedback: {str(e)}")
+
+    @app.get("/api/feedback/")
+    async def get_all_feedback(request: Request, limit: int = Query(100), db: Session = Depends(get_db)):
+        rows, next_cursor = keyset_page(db, Feedback, [], limit, None)
+        return page_response(rows, next_cursor, FeedbackResponse, request)
+
+    @app.get("/api/stats")
+    async def get_stats(db: Session = Depends(get_db)):
+        return read_stats(db)
+
+    return app
+
+
+def async_app(url: str, latency_ms: float):
+    """The real routers on the async engine from database.py"""
+    os.environ["DATABASE_URL"] = url
+    from fastapi import FastAPI
+
+    from database import async_engine
+    from routes import feedback, stats
+
+    add_latency(async_engine.sync_engine, latency_ms)
+    app = FastAPI()
+    app.include_router(feedback.router)
+    app.include_router(stats.router)
+    return app
+
+
+def seed(url: str) -> None:
+    from sqlalchemy import create_engine, insert
+
+    from aggregates import rebuild_aggregates
+    from database_sqlite import Base
+    from models import Feedback
+    from sqlalchemy.orm import Session
+
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Feedback), [
+            {"user_id": f"user-{i % 500}", "message": f"feedback {i}"} for i in range(FEEDBACK_ROWS)
+        ])
+    with Session(engine) as db:
+        rebuild_aggregates(db)
+    engine.dispose()
+
+
+def serve(args) -> None:
+    import uvicorn
+
+    build = async_app if args.serve == "async" else sync_app
+    uvicorn.run(build(args.url, args.db_latency_ms), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def request(reader, writer, method: str, path: str, body: bytes = b"") -> int:
+    """One HTTP/1.1 keep-alive request; returns the status code"""
+    head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n"
+    if body:
+        head += "Content-Type: application/json\r\n"
+    writer.write(head.encode("ascii") + b"\r\n" + body)
+    lines = (await reader.readuntil(b"\r\n\r\n")).split(b"\r\n")
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(lines[0].split()[1])
+
+
+async def wait_until_up(port: int, deadline: float) -> None:
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            status = await request(reader, writer, "GET", "/api/stats")
+            writer.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not start")
+        await asyncio.sleep(0.2)
+
+
+async def drive(port: int, clients: int, duration: float, timeout: float, seed_value: int) -> dict:
+    """``clients`` connections, each sending its next request as soon as the last one answers.
+
+    A bare asyncio client rather than httpx: httpx's own pool overhead at
+    hundreds of connections would otherwise be what gets measured.
+    """
+    latencies = []
+    errors = 0
+    choices = [entry for entry in REQUEST_MIX for _ in range(entry[0])]
+    await wait_until_up(port, time.monotonic() + 60)
+
+    async def run_client(index: int, stop_at: float) -> None:
+        nonlocal errors
+        rng = random.Random(seed_value * 1000 + index)
+        body = json.dumps({"user_id": f"load-{index}", "message": "load test"}).encode("utf-8")
+        writer = None
+        while time.monotonic() < stop_at:
+            _, method, path = rng.choice(choices)
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                status = await asyncio.wait_for(
+                    request(reader, writer, method, path, body if method == "POST" else b""), timeout
+                )
+                ok = status < 400
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                ok = False
+                # The connection is in an unknown state: start a new one
+                if writer is not None:
+                    writer.close()
+                writer = None
+            if ok:
+                latencies.append((time.perf_counter() - started) * 1000.0)
+            else:
+                errors += 1
+        if writer is not None:
+            writer.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(run_client(i, started + duration) for i in range(clients)))
+    elapsed = time.monotonic() - started
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def run_variant(variant: str, args, url: str, port: int) -> dict:
+    seed(url)
+    command = [sys.executable, os.path.abspath(__file__), "--serve", variant, "--url", url,
+               "--port", str(port), "--db-latency-ms", str(args.db_latency_ms)]
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return asyncio.run(drive(port, args.clients, args.duration, args.timeout, args.seed))
+    finally:
+        # A server still draining a backlog of blocked requests may not stop politely
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="SQLAlchemy URL of a scratch database (default: temp SQLite file)")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load per variant")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a request counts as failed")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--serve", choices=["async", "sync"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    path = None
+    url = args.url
+    if not url:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        url = f"sqlite:///{path}"
+
+    try:
+        report = {
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "db_latency_ms": args.db_latency_ms,
+            "request_mix": {f"{method} {path}": weight for weight, method, path in REQUEST_MIX},
+            "sync_session": run_variant("sync", args, url, args.port),
+            "async_session": run_variant("async", args, url, args.port),
+        }
+        sync_rps = report["sync_session"]["throughput_rps"]
+        if sync_rps:
+            report["speedup"] = round(report["async_session"]["throughput_rps"] / sync_rps, 2)
+        print(json.dumps(report, indent=2))
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark the inference worker transport: in-process predict vs shared-memory slots vs pickling batches over a pipe
+Measures per-batch latency for each batch size with the same backend on the other side
+
+Usage:
+    python benchmark_inference_worker.py --backend numpy --model model_graph.json
+    python benchmark_inference_worker.py --backend keras --model Medicinal_model.h5 --batch-sizes 1,8,32
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from inference_backends import create_backend
+from inference_worker import InferenceClient, InferenceServer
+
+
+def load(backend_name, model):
+    if backend_name == "keras":
+        return create_backend("keras", model)
+    return create_backend(backend_name, artifact_path=model)
+
+
+def run_server(backend_name, model, socket_path):
+    InferenceServer(load(backend_name, model), socket_path, max_wait_ms=0).serve_forever()
+
+
+def run_pipe_server(backend_name, model, conn):
+    """The naive transport: whole batches pickled both ways"""
+    backend = load(backend_name, model)
+    conn.send("ready")
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            return
+        conn.send(backend.predict(batch))
+
+
+def measure(fn, batch, iterations):
+    fn(batch)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(batch)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return round(float(np.median(timings)), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="numpy")
+    parser.add_argument("--model", default="model_graph.json")
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "inference.sock")
+    server = multiprocessing.Process(target=run_server, args=(args.backend, args.model, socket_path), daemon=True)
+    server.start()
+    parent, child = multiprocessing.Pipe()
+    pipe_server = multiprocessing.Process(target=run_pipe_server, args=(args.backend, args.model, child), daemon=True)
+    pipe_server.start()
+
+    backend = load(args.backend, args.model)
+    client = InferenceClient(socket_path, slots=1, slot_images=max(batch_sizes))
+    client.connect()
+    parent.recv()
+
+    def over_pipe(batch):
+        parent.send(batch)
+        return parent.recv()
+
+    rng = np.random.default_rng(0)
+    report = {"backend": args.backend, "batches": {}}
+    for size in batch_sizes:
+        batch = rng.random((size, *backend.input_shape[1:]), dtype=np.float32)
+        assert np.allclose(client.predict(batch), backend.predict(batch), atol=1e-5)
+        direct = measure(backend.predict, batch, args.iterations)
+        shared = measure(client.predict, batch, args.iterations)
+        pipe = measure(over_pipe, batch, args.iterations)
+        report["batches"][size] = {
+            "input_mb": round(batch.nbytes / 2 ** 20, 2),
+            "in_process_ms": direct,
+            "shared_memory_ms": shared,
+            "pickled_pipe_ms": pipe,
+            "shared_memory_overhead_ms": round(shared - direct, 3),
+            "pickled_pipe_overhead_ms": round(pipe - direct, 3),
+        }
+
+    parent.send(None)
+    client.close()
+    server.terminate()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of /metrics instrumentation against the /api/predict requests it measures
+Times one request's worth of metric updates in isolation, then real requests through the app and a scrape
+
+Usage:
+    INFERENCE_BACKEND=numpy python benchmark_metrics.py --model model_graph.json
+    python benchmark_metrics.py --model Medicinal_model.h5 --requests 50
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def instrumentation_us(iterations: int) -> float:
+    """What a cache-missing /api/predict adds: seven stage timings, the class/confidence
+    counters and the middleware's latency + status series"""
+    from metrics import RequestMetricsMiddleware, elapsed_ms, record_prediction, stage_ms
+
+    middleware = RequestMetricsMiddleware(None)
+    started = time.perf_counter()
+    for i in range(iterations):
+        request_started = time.perf_counter()
+        for stage in stage_ms.values():
+            stage_started = time.perf_counter()
+            stage.observe(elapsed_ms(stage_started))
+        record_prediction("Neem", 0.9)
+        middleware._record("POST", "/api/predict", 200, elapsed_ms(request_started))
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def leaf_jpeg(rng, size: int) -> bytes:
+    """A distinct photo-sized JPEG per request, so nothing is served from the cache"""
+    pixels = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def predict_requests(model: str, requests: int, size: int) -> dict:
+    scratch = tempfile.mkdtemp()
+    # Overrides the shell and .env: benchmark rows must never reach a real database or upload store
+    os.environ["DATABASE_URL"] = f"sqlite:///{scratch}/benchmark.db"
+    os.environ["PREDICTION_LOG_SPILL_PATH"] = os.path.join(scratch, "prediction_log.jsonl")
+    os.environ["PREDICTION_CACHE_SQLITE_PATH"] = ""
+    os.environ["UPLOAD_BACKEND"] = "local"
+    os.environ["UPLOAD_DIR"] = os.path.join(scratch, "uploads")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from fastapi.testclient import TestClient
+
+    import database
+    import models
+    # The models' metadata is database_sqlite.Base, which integrated_main does not create
+    models.Base.metadata.create_all(database.engine)
+    import routes.predictions
+    routes.predictions.MODEL_PATH = model
+    import integrated_main
+    from metrics import registry
+
+    rng = np.random.default_rng(0)
+    with TestClient(integrated_main.app) as client:
+        deadline = time.monotonic() + 300
+        while client.get("/api/model/status").json()["state"] != "ready":
+            if time.monotonic() > deadline:
+                sys.exit("model did not become ready")
+            time.sleep(0.1)
+        for i in range(requests + 1):
+            response = client.post("/api/predict", files={"file": ("leaf.jpg", leaf_jpeg(rng, size), "image/jpeg")},
+                                   data={"user_id": f"benchmark-{i}"})
+            response.raise_for_status()
+        body = client.get("/metrics").text
+
+    # Rendering only: the test client's own overhead would dwarf it
+    started = time.perf_counter()
+    for _ in range(20):
+        registry.render()
+    render_ms = (time.perf_counter() - started) / 20 * 1000.0
+
+    latency = registry.histogram("http_request_ms", labels={"method": "POST", "route": "/api/predict"}).snapshot()
+    stages = {
+        stage: registry.histogram("predict_stage_ms", labels={"stage": stage}).snapshot()["mean"]
+        for stage in ("upload_read", "decode", "resize", "normalize", "inference", "db_write", "serialize")
+    }
+    return {"request_mean_ms": latency["mean"], "stage_mean_ms": stages,
+            "scrape_render_ms": round(render_ms, 3), "scrape_bytes": len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="Medicinal_model.h5")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--image-size", type=int, default=1024, help="side of the synthetic JPEGs (px)")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    report = predict_requests(args.model, args.requests, args.image_size)
+    cost_us = instrumentation_us(args.iterations)
+    report["instrumentation_us_per_request"] = round(cost_us, 2)
+    report["overhead_percent"] = round(cost_us / 1000.0 / report["request_mean_ms"] * 100.0, 4)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark the predictions list: full-table fetch vs OFFSET vs keyset cursors
+Seeds a scratch database (SQLite by default) with --rows predictions
+
+Usage:
+    python benchmark_pagination.py                           # 1M rows in a temp SQLite file
+    python benchmark_pagination.py --rows 200000 --url postgresql://user:pw@localhost/bench
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database_sqlite import Base
+from models import Prediction
+from model_registry import DEFAULT_CLASS_NAMES
+from pagination import keyset_page, page_response
+from schemas import PredictionResponse
+
+DASHBOARD_FIELDS = ["id", "user_id", "prediction_result", "confidence", "timestamp"]
+
+
+def seed(engine, rows: int, chunk: int = 50000) -> None:
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    step = timedelta(days=365) / rows
+    with engine.begin() as conn:
+        for offset in range(0, rows, chunk):
+            batch = []
+            for i in range(offset, min(offset + chunk, rows)):
+                batch.append({
+                    "user_id": f"user-{rng.randrange(5000)}",
+                    "image_url": f"uploads/{i}.jpg",
+                    "prediction_result": rng.choice(DEFAULT_CLASS_NAMES),
+                    "confidence": rng.random(),
+                    # Coarse timestamps so (timestamp, id) ties are exercised
+                    "timestamp": start + step * (i - i % 3),
+                })
+            conn.execute(insert(Prediction), batch)
+
+
+def timed(fn, repeats: int):
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+    }, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--url", help="SQLAlchemy URL of a scratch database (default: temp SQLite file)")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=1000, help="page number for the deep-page comparison")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--skip-full", action="store_true", help="skip the legacy full-table fetch")
+    args = parser.parse_args()
+
+    path = None
+    url = args.url
+    if not url:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        url = f"sqlite:///{path}"
+
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    try:
+        Base.metadata.drop_all(engine, tables=[Prediction.__table__])
+        Base.metadata.create_all(engine, tables=[Prediction.__table__])
+        started = time.perf_counter()
+        seed(engine, args.rows)
+        report = {"rows": args.rows, "url": engine.url.render_as_string(hide_password=True),
+                  "seed_s": round(time.perf_counter() - started, 1), "limit": args.limit}
+
+        with Session() as db:
+            if not args.skip_full:
+                def full_table():
+                    rows = db.query(Prediction).order_by(Prediction.timestamp.desc()).all()
+                    body = page_response(rows, None, PredictionResponse).body
+                    db.expunge_all()
+                    return body
+                stats, body = timed(full_table, 1)
+                report["legacy_full_table"] = {**stats, "response_mb": round(len(body) / 1e6, 1)}
+
+            def first_page():
+                rows, cursor = keyset_page(db, Prediction, [], args.limit, None)
+                return page_response(rows, cursor, PredictionResponse).body
+            report["keyset_first_page"], body = timed(first_page, args.repeats)
+            report["keyset_first_page"]["response_kb"] = round(len(body) / 1e3, 1)
+
+            def projected_page():
+                rows, cursor = keyset_page(db, Prediction, [], args.limit, None, DASHBOARD_FIELDS)
+                return page_response(rows, cursor).body
+            report["keyset_projected_page"], body = timed(projected_page, args.repeats)
+            report["keyset_projected_page"]["response_kb"] = round(len(body) / 1e3, 1)
+
+            # Walk to the same depth both ways
+            offset = args.limit * args.depth
+            report["offset_deep_page"], _ = timed(
+                lambda: db.query(Prediction).order_by(Prediction.timestamp.desc(), Prediction.id.desc())
+                .offset(offset).limit(args.limit).all(), args.repeats)
+
+            cursor = None
+            walk_started = time.perf_counter()
+            for _ in range(args.depth):
+                _, cursor = keyset_page(db, Prediction, [], args.limit, cursor, ["id"])
+            report["keyset_walk_s"] = round(time.perf_counter() - walk_started, 2)
+            report["keyset_deep_page"], _ = timed(
+                lambda: keyset_page(db, Prediction, [], args.limit, cursor), args.repeats)
+
+            filters = {
+                "user_id": [Prediction.user_id == "user-42"],
+                "class": [Prediction.prediction_result == DEFAULT_CLASS_NAMES[3]],
+                "class_and_confidence": [Prediction.prediction_result == DEFAULT_CLASS_NAMES[3],
+                                         Prediction.confidence >= 0.9],
+            }
+            report["keyset_filtered_first_page"] = {
+                name: timed(lambda f=f: keyset_page(db, Prediction, f, args.limit, None), args.repeats)[0]
+                for name, f in filters.items()
+            }
+
+        print(json.dumps(report, indent=2))
+    finally:
+        engine.dispose()
+        if path:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark the preprocessing pipeline against the original PIL LANCZOS path
+Reports per-image latency, peak RSS and the numeric difference between outputs
+
+Usage:
+    python benchmark_preprocessing.py                 # synthetic 12MP JPEG
+    python benchmark_preprocessing.py leaf1.jpg ...   # real photos
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import TARGET_SIZE, BatchBuffer, decode_image
+
+
+def legacy_preprocess(image_bytes: bytes) -> np.ndarray:
+    """The pipeline main.py used before preprocessing.py"""
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    image = image.resize(TARGET_SIZE, Image.Resampling.LANCZOS)
+    img_array = np.array(image, dtype=np.float32)
+    img_array = img_array / 255.0
+    img_array = np.expand_dims(img_array, axis=0)
+    return img_array
+
+
+def make_buffer_pipeline():
+    buffer = BatchBuffer(1)
+
+    def run(image_bytes: bytes) -> np.ndarray:
+        buffer.fill(0, decode_image(image_bytes))
+        return buffer.view(1)
+
+    return run
+
+
+def synthetic_photo(width: int = 4032, height: int = 3024) -> bytes:
+    """Leaf-like green gradient with texture, encoded like a phone camera JPEG"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        60 + 40 * np.sin(x / 97.0),
+        140 + 60 * np.cos(y / 131.0),
+        50 + 30 * np.sin((x + y) / 211.0),
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format="JPEG", quality=92)
+    return out.getvalue()
+
+
+def load_inputs(paths):
+    if not paths:
+        return [("synthetic_12mp.jpg", synthetic_photo())]
+    inputs = []
+    for path in paths:
+        with open(path, "rb") as f:
+            inputs.append((path, f.read()))
+    return inputs
+
+
+def time_pipeline(fn, inputs, repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        for _, data in inputs:
+            start = time.perf_counter()
+            fn(data)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+    latencies.sort()
+    return {
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+    }
+
+
+def peak_rss_mb(pipeline: str, paths) -> float:
+    """Measure peak RSS in a fresh interpreter so pipelines don't share high-water marks"""
+    cmd = [sys.executable, __file__, "--rss-probe", pipeline, *paths]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def rss_probe(pipeline: str, paths) -> None:
+    inputs = load_inputs(paths)
+    fn = legacy_preprocess if pipeline == "legacy" else make_buffer_pipeline()
+    for _, data in inputs:
+        fn(data)
+
+    # VmHWM resets on exec, unlike ru_maxrss which Linux carries over from the parent
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    print(int(line.split()[1]) / 1024.0)
+                    return
+    import psutil
+    info = psutil.Process().memory_info()
+    print(getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="JPEG/PNG files to benchmark (default: synthetic 12MP JPEG)")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="maximum allowed mean absolute difference vs the legacy output")
+    parser.add_argument("--rss-probe", choices=["legacy", "buffer"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_probe:
+        rss_probe(args.rss_probe, args.images)
+        return
+
+    inputs = load_inputs(args.images)
+    paths = list(args.images)
+    if not paths:
+        # Probes read the synthetic photo from disk so generating it doesn't skew RSS
+        fd, synthetic_path = tempfile.mkstemp(suffix=".jpg")
+        with os.fdopen(fd, "wb") as f:
+            f.write(inputs[0][1])
+        paths = [synthetic_path]
+
+    optimized = make_buffer_pipeline()
+
+    # Numeric agreement with the original pipeline
+    max_diff = 0.0
+    mean_diffs = []
+    for _, data in inputs:
+        diff = np.abs(legacy_preprocess(data) - optimized(data))
+        max_diff = max(max_diff, float(diff.max()))
+        mean_diffs.append(float(diff.mean()))
+    mean_diff = statistics.mean(mean_diffs)
+
+    report = {
+        "images": [name for name, _ in inputs],
+        "legacy": time_pipeline(legacy_preprocess, inputs, args.repeats),
+        "optimized": time_pipeline(optimized, inputs, args.repeats),
+        "mean_abs_diff": round(mean_diff, 5),
+        "max_abs_diff": round(max_diff, 5),
+        "within_tolerance": mean_diff <= args.tolerance,
+    }
+    try:
+        report["legacy"]["peak_rss_mb"] = round(peak_rss_mb("legacy", paths), 1)
+        report["optimized"]["peak_rss_mb"] = round(peak_rss_mb("buffer", paths), 1)
+    finally:
+        if not args.images:
+            os.remove(paths[0])
+    report["speedup"] = round(report["legacy"]["mean_ms"] / report["optimized"]["mean_ms"], 2)
+
+    print(json.dumps(report, indent=2))
+    if not report["within_tolerance"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark /predict response encoding: per-request dict + FastAPI's default JSON vs pre-encoded fragments + orjson
+Measures building and serializing one response from a cached payload, and the bytes sent
+
+Usage:
+    python benchmark_response_encoding.py                  # the 10 classes in class_names.txt
+    python benchmark_response_encoding.py --classes 1000 --top-k 5
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import main
+from response_encoding import JSONBytes, encode, encoder_for, orjson, probability_list
+
+
+def load_classes(count):
+    if count:
+        return [f"class_{i}" for i in range(count)]
+    with open(main.CLASS_NAMES_PATH, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def before(probabilities, class_names):
+    """The route as it was: dict rebuilt per call, returned for FastAPI to encode"""
+    predicted_index = int(np.argmax(probabilities))
+    all_predictions = {}
+    for i, class_name in enumerate(class_names):
+        all_predictions[class_name] = round(float(probabilities[i]), 4)
+    content = {
+        "predicted_class": class_names[predicted_index],
+        "confidence": round(float(probabilities[predicted_index]), 4),
+        "all_predictions": all_predictions,
+        "medical_warning": main.MEDICAL_DISCLAIMER,
+        "safety_note": main.SAFETY_NOTE,
+        "model_info": {
+            "input_size": main.TARGET_SIZE,
+            "preprocessing": "RGB conversion, resize to 256x256, normalize by /255.0"
+        },
+    }
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def after(payload, class_names, top_k=None, compact=False):
+    """main.predict_plant's encoding of a cached payload"""
+    encoder = encoder_for(class_names)
+    probabilities = payload["probabilities"]
+    body = {"predicted_class": class_names[payload["predicted_index"]], "confidence": round(payload["confidence"], 4)}
+    if compact:
+        body["predicted_index"] = payload["predicted_index"]
+        body.update(encoder.compact(probabilities, top_k))
+        return JSONBytes(encode(body, main.COMPACT_TAILS[main.MEDICAL_DISCLAIMER]), headers=encoder.headers).body
+    body["all_predictions"] = encoder.all_predictions(probabilities, top_k)
+    return JSONBytes(encode(body, main.RESPONSE_TAILS[main.MEDICAL_DISCLAIMER])).body
+
+
+def measure(fn, iterations):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        body = fn()
+    return {"us_per_response": round((time.perf_counter() - started) / iterations * 1e6, 2), "bytes": len(body)}
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", type=int, default=0, help="synthetic class count (default: class_names.txt)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    class_names = load_classes(args.classes)
+    rng = np.random.default_rng(args.seed)
+    probabilities = rng.dirichlet(np.ones(len(class_names))).astype(np.float32)
+    # What the cache holds for a repeat upload
+    predicted_index = int(np.argmax(probabilities))
+    payload = {
+        "predicted_index": predicted_index,
+        "confidence": float(probabilities[predicted_index]),
+        "probabilities": probability_list(probabilities),
+    }
+
+    # Same document, same values
+    assert json.loads(before(probabilities, class_names)) == json.loads(after(payload, class_names))
+
+    n = args.iterations
+    report = {
+        "classes": len(class_names),
+        "encoder": "orjson" if orjson is not None else "json",
+        "before": measure(lambda: before(probabilities, class_names), n),
+        "full": measure(lambda: after(payload, class_names), n),
+        f"top_{args.top_k}": measure(lambda: after(payload, class_names, args.top_k), n),
+        "compact": measure(lambda: after(payload, class_names, compact=True), n),
+        f"compact_top_{args.top_k}": measure(lambda: after(payload, class_names, args.top_k, compact=True), n),
+        # One-off cost moved out of the request: the payload's probability array
+        "payload_build_us": measure(lambda: probability_list(probabilities), n)["us_per_response"],
+    }
+    report["speedup_full"] = round(report["before"]["us_per_response"] / report["full"]["us_per_response"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark SQLite write throughput: rollback journal vs WAL vs WAL + the single-writer queue
+Concurrent writers insert feedback rows (with counters) while readers page the list
+
+Usage:
+    python benchmark_sqlite_writes.py                       # 64 writers, 8 readers, 10 s per variant
+    python benchmark_sqlite_writes.py --writers 200 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database_sqlite import Base
+from db_config import apply_sqlite_profile, async_url, pool_options
+from models import Feedback
+from pagination import keyset_page
+from routes.feedback import insert_feedback
+from write_queue import WriteQueue
+
+# name -> (SQLite profile applied, writes through the queue)
+VARIANTS = {
+    "rollback_journal": (False, False),
+    "wal": (True, False),
+    "wal_write_queue": (True, True),
+}
+
+
+def percentiles(latencies):
+    latencies.sort()
+    if not latencies:
+        return {"p50_ms": None, "p99_ms": None}
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+    }
+
+
+async def run_variant(url: str, profile: bool, queued: bool, writers: int, readers: int, duration: float) -> dict:
+    engine = create_async_engine(async_url(url), **pool_options(url))
+    if profile:
+        apply_sqlite_profile(engine)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    queue = WriteQueue(url) if queued else None
+
+    write_latencies, read_latencies = [], []
+    errors = {}
+    stop_at = time.monotonic() + duration
+
+    async def write(index: int) -> None:
+        data = {"user_id": f"writer-{index}", "message": "benchmark"}
+        if queue is not None:
+            await queue.submit(insert_feedback, data)
+            return
+        async with Session() as db:
+            await db.run_sync(insert_feedback, data)
+            await db.commit()
+
+    async def writer(index: int) -> None:
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                await write(index)
+                write_latencies.append((time.perf_counter() - started) * 1000.0)
+            except Exception as e:
+                key = str(e).splitlines()[0][:80]
+                errors[key] = errors.get(key, 0) + 1
+
+    async def reader() -> None:
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                async with Session() as db:
+                    await db.run_sync(keyset_page, Feedback, [], 50, None)
+                read_latencies.append((time.perf_counter() - started) * 1000.0)
+            except Exception as e:
+                key = str(e).splitlines()[0][:80]
+                errors[key] = errors.get(key, 0) + 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(writer(i) for i in range(writers)), *(reader() for _ in range(readers)))
+    elapsed = time.monotonic() - started
+    report = {
+        "writes_per_s": round(len(write_latencies) / elapsed, 1),
+        "write": percentiles(write_latencies),
+        "reads_per_s": round(len(read_latencies) / elapsed, 1),
+        "read": percentiles(read_latencies),
+        "errors": errors,
+    }
+    if queue is not None:
+        report["mean_group_size"] = queue.stats()["batch_size"]["mean"]
+        await queue.close()
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per variant")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    args = parser.parse_args()
+
+    report = {"writers": args.writers, "readers": args.readers, "duration_s": args.duration}
+    for name in args.variants.split(","):
+        profile, queued = VARIANTS[name]
+        # Fresh file per variant: journal_mode=WAL sticks to the database file
+        directory = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        try:
+            report[name] = asyncio.run(run_variant(url, profile, queued, args.writers, args.readers, args.duration))
+        finally:
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+            os.rmdir(directory)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
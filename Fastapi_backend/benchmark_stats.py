@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/stats: live GROUP BY aggregation vs the stat_counters rollup
+Seeds a scratch database (SQLite by default) with --rows predictions
+
+Usage:
+    python benchmark_stats.py                  # 1M rows in a temp SQLite file
+    python benchmark_stats.py --rows 200000 --url postgresql://user:pw@localhost/bench
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from aggregates import LOW_CONFIDENCE_THRESHOLD, STATS_DAYS, read_stats, rebuild_aggregates, record_predictions
+from benchmark_pagination import seed, timed
+from database_sqlite import Base
+from models import Appointment, Feedback, Prediction, StatCounter
+
+
+def live_stats(db):
+    """What /api/stats would cost computed from the predictions table on every call"""
+    low = func.sum(case((Prediction.confidence < LOW_CONFIDENCE_THRESHOLD, 1), else_=0))
+    totals = db.query(func.count(Prediction.id), func.avg(Prediction.confidence), low).one()
+    per_class = (db.query(Prediction.prediction_result, func.count(Prediction.id),
+                          func.avg(Prediction.confidence), low)
+                 .group_by(Prediction.prediction_result).all())
+    since = datetime.now(timezone.utc) - timedelta(days=STATS_DAYS)
+    day = func.date(Prediction.timestamp)
+    daily = (db.query(day, func.count(Prediction.id))
+             .filter(Prediction.timestamp >= since).group_by(day).all())
+    return totals, per_class, daily
+
+
+def insert_cost(Session, count: int, with_counters: bool) -> float:
+    """Mean ms per single-row insert + commit, as in the /predict route"""
+    started = time.perf_counter()
+    for i in range(count):
+        with Session() as db:
+            db.add(Prediction(user_id="bench", prediction_result="Neem", confidence=0.8))
+            if with_counters:
+                record_predictions(db, [("Neem", 0.8)])
+            db.commit()
+    return round((time.perf_counter() - started) * 1000.0 / count, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--url", help="SQLAlchemy URL of a scratch database (default: temp SQLite file)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--inserts", type=int, default=500, help="single-row inserts for the write overhead")
+    args = parser.parse_args()
+
+    path = None
+    url = args.url
+    if not url:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        url = f"sqlite:///{path}"
+
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    tables = [Prediction.__table__, Feedback.__table__, Appointment.__table__, StatCounter.__table__]
+    try:
+        Base.metadata.drop_all(engine, tables=tables)
+        Base.metadata.create_all(engine, tables=tables)
+        started = time.perf_counter()
+        seed(engine, args.rows)
+        report = {"rows": args.rows, "url": engine.url.render_as_string(hide_password=True),
+                  "seed_s": round(time.perf_counter() - started, 1)}
+
+        with Session() as db:
+            report["live_aggregation"], _ = timed(lambda: live_stats(db), args.repeats)
+            started = time.perf_counter()
+            report["rebuild"] = rebuild_aggregates(db)
+            report["rebuild_s"] = round(time.perf_counter() - started, 2)
+            report["rollup_read"], stats = timed(lambda: read_stats(db), args.repeats)
+            report["counter_rows"] = db.query(StatCounter).count()
+            report["total_predictions"] = stats["total_predictions"]
+
+        report["insert_ms"] = {
+            "without_counters": insert_cost(Session, args.inserts, False),
+            "with_counters": insert_cost(Session, args.inserts, True),
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        engine.dispose()
+        if path:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
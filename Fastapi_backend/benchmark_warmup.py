@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark first-request latency with and without startup warm-up
+Each serving mode runs in a fresh interpreter so tracing caches start cold
+
+Usage:
+    python benchmark_warmup.py                       # Medicinal_model.h5
+    python benchmark_warmup.py --model other.h5 --requests 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = "Medicinal_model.h5"
+
+
+def load_model(path: str):
+    """The registered artifact, or an untrained MobileNetV2 head when it is unavailable"""
+    import tensorflow as tf
+    from model_registry import model_registry
+
+    try:
+        return model_registry.load(path).model
+    except Exception as e:
+        print(f"⚠️ {e}; using an untrained MobileNetV2 stand-in", file=sys.stderr)
+        base = tf.keras.applications.MobileNetV2(input_shape=(256, 256, 3), include_top=False, weights=None)
+        inputs = tf.keras.Input(shape=(256, 256, 3))
+        x = tf.keras.layers.GlobalAveragePooling2D()(base(inputs))
+        outputs = tf.keras.layers.Dense(10, activation="softmax")(x)
+        return tf.keras.Model(inputs, outputs)
+
+
+def probe(mode: str, warm: bool, model_path: str, requests: int) -> dict:
+    from model_registry import WARMUP_BATCH_SIZES, make_serving_fn, warm_up
+
+    model = load_model(model_path)
+    serving_fn = make_serving_fn(model, mode)
+    rng = np.random.default_rng(0)
+
+    report = {"mode": mode, "warmed": warm}
+    if warm:
+        started = time.perf_counter()
+        report["warmup"] = warm_up(serving_fn, model.input_shape, WARMUP_BATCH_SIZES)
+        report["warmup_total_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+
+    # Alternate single-image and small-batch calls like the batch scheduler does
+    sizes = [1, 2, 4, 1, 8]
+    latencies = []
+    for i in range(requests):
+        batch = rng.random((sizes[i % len(sizes)], *model.input_shape[1:]), dtype=np.float32)
+        started = time.perf_counter()
+        serving_fn(batch)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+
+    steady = sorted(latencies[len(sizes):]) or sorted(latencies)
+    report["first_request_ms"] = round(latencies[0], 1)
+    first_per_size = {}
+    for i, size in enumerate(sizes[:len(latencies)]):
+        first_per_size.setdefault(str(size), round(latencies[i], 1))
+    report["first_per_size_ms"] = first_per_size
+    report["steady_p50_ms"] = round(steady[len(steady) // 2], 1)
+    report["steady_mean_ms"] = round(statistics.mean(steady), 1)
+    return report
+
+
+def run_probe(mode: str, warm: bool, args) -> dict:
+    cmd = [sys.executable, __file__, "--probe", mode, "--model", args.model, "--requests", str(args.requests)]
+    if warm:
+        cmd.append("--warm")
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="2")
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True, env=env)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--modes", default="predict,call", help="comma-separated serving modes to compare")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.probe, args.warm, args.model, args.requests)))
+        return
+
+    results = []
+    for mode in args.modes.split(","):
+        for warm in (False, True):
+            results.append(run_probe(mode.strip(), warm, args))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Incremental "changes since" feed for the admin dashboard
+Each table is walked by (updated_at, id) ascending from a position kept in one opaque cursor
+"""
+
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import DateTime, func, literal, tuple_
+
+from models import Appointment, Feedback, Prediction, UserProfile
+from schemas import AppointmentResponse, FeedbackResponse, PredictionResponse, UserProfileResponse
+
+# Rows younger than this are held back for the next poll. Timestamps are
+# taken when a transaction starts, so a slow commit can land behind rows
+# that were already handed out; the lag keeps the cursor behind it.
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+
+# table -> (model, change column, response schema). Predictions are never
+# updated, so their insert timestamp is their change time.
+CHANGE_SOURCES = {
+    "feedback": (Feedback, Feedback.updated_at, FeedbackResponse),
+    "predictions": (Prediction, Prediction.timestamp, PredictionResponse),
+    "appointments": (Appointment, Appointment.updated_at, AppointmentResponse),
+    "profiles": (UserProfile, UserProfile.updated_at, UserProfileResponse),
+}
+
+Position = Tuple[datetime, int]
+
+
+def encode_sync_cursor(positions: Dict[str, Position]) -> str:
+    raw = json.dumps({table: [timestamp.isoformat(), row_id] for table, (timestamp, row_id) in positions.items()},
+                     separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> Dict[str, Position]:
+    """Per-table (updated_at, id) of the last row already delivered; 400 if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        positions = {table: (datetime.fromisoformat(timestamp), int(row_id))
+                     for table, (timestamp, row_id) in raw.items()}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    if set(positions) != set(CHANGE_SOURCES):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    return positions
+
+
+def comparable_timestamp(db, value: datetime):
+    """Bind ``value`` so it compares correctly against server-default timestamps.
+
+    SQLite stores CURRENT_TIMESTAMP as 'YYYY-MM-DD HH:MM:SS' text and
+    compares it as text, so the bound value has to be written the same way.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        text = value.strftime("%Y-%m-%d %H:%M:%S")
+        if value.microsecond:
+            text += f".{value.microsecond:06d}"
+        return literal(text)
+    return literal(value, DateTime(timezone=True))
+
+
+def sync_horizon(db) -> datetime:
+    """Database clock minus the settle lag, the upper bound of this poll"""
+    return db.query(func.now()).scalar() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+
+
+def changes_since(db, cursor: Optional[str], limit: int) -> Dict:
+    """Rows inserted or updated after ``cursor``, at most ``limit`` per table.
+
+    Without a cursor nothing is returned, only a cursor for "now": load the
+    lists first, then poll from it. ``has_more`` means at least one table
+    was cut at ``limit`` and the caller should poll again straight away.
+    Deletions are not reported; a full reload picks them up.
+    """
+    horizon = sync_horizon(db)
+    if not cursor:
+        positions = {table: (horizon, 0) for table in CHANGE_SOURCES}
+        return {"cursor": encode_sync_cursor(positions), "has_more": False,
+                **{table: [] for table in CHANGE_SOURCES}}
+
+    positions = decode_sync_cursor(cursor)
+    result = {"has_more": False}
+    for table, (model, column, schema) in CHANGE_SOURCES.items():
+        timestamp, row_id = positions[table]
+        rows = (
+            db.query(model)
+            .filter(tuple_(column, model.id) > tuple_(comparable_timestamp(db, timestamp), row_id))
+            .filter(column < comparable_timestamp(db, horizon))
+            .order_by(column, model.id)
+            .limit(limit + 1)
+            .all()
+        )
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            positions[table] = (getattr(last, column.key), last.id)
+            result["has_more"] = True
+        elif horizon > timestamp:
+            # Everything before the horizon has been delivered
+            positions[table] = (horizon, 0)
+        result[table] = [schema.model_validate(row).model_dump() for row in rows]
+
+    result["cursor"] = encode_sync_cursor(positions)
+    return jsonable_encoder(result)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Compare exported TFLite/ONNX artifacts and the NumPy engine against Keras
+Reports accuracy delta, top-1 agreement, latency and peak RSS per backend
+
+Usage:
+    python convert_model.py --calibration-dir dataset/train
+    python compare_backends.py --images dataset/val          # class subfolders -> accuracy
+    python compare_backends.py --threads 2 --json report.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import numpy as np
+
+from inference_backends import EXPORT_DIR, create_backend
+from preprocessing import TARGET_SIZE, decode_image, normalize
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def discover_artifacts(model_path: str, export_dir: str):
+    """(label, backend, path) for the baseline and every exported artifact of ``model_path``"""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    artifacts = [("keras", "keras", model_path), ("numpy", "numpy", model_path)]
+    for path in sorted(glob.glob(os.path.join(export_dir, f"{stem}.*.tflite"))):
+        variant = os.path.basename(path)[len(stem) + 1:-len(".tflite")]
+        artifacts.append((f"tflite-{variant}", "tflite", path))
+    onnx_path = os.path.join(export_dir, f"{stem}.onnx")
+    if os.path.exists(onnx_path):
+        artifacts.append(("onnx", "onnx", onnx_path))
+    return artifacts
+
+
+def load_eval_set(images_dir, class_names, limit: int):
+    """(batch, labels) from ``images_dir``; labels come from class-named subfolders.
+
+    Without a folder, random pixels are used: agreement and latency are
+    still meaningful, accuracy is not reported.
+    """
+    if not images_dir:
+        rng = np.random.default_rng(0)
+        return rng.random((limit, *TARGET_SIZE, 3), dtype=np.float32), None
+
+    paths, labels = [], []
+    for root, _, files in os.walk(images_dir):
+        folder = os.path.basename(root)
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+                labels.append(class_names.index(folder) if folder in class_names else -1)
+    paths, labels = paths[:limit], labels[:limit]
+
+    batch = np.empty((len(paths), *TARGET_SIZE, 3), dtype=np.float32)
+    for i, path in enumerate(paths):
+        with open(path, "rb") as f:
+            batch[i] = normalize(decode_image(f.read()))[0]
+    labelled = bool(labels) and all(label >= 0 for label in labels)
+    return batch, (np.array(labels) if labelled else None)
+
+
+def predict_all(backend, images: np.ndarray, batch_size: int) -> np.ndarray:
+    return np.concatenate([backend.predict(images[i:i + batch_size])
+                           for i in range(0, len(images), batch_size)])
+
+
+def time_backend(backend, images: np.ndarray, batch_size: int, repeats: int):
+    batch = images[:batch_size]
+    backend.predict(batch)
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        backend.predict(batch)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        "per_image_ms": round(statistics.mean(latencies) / len(batch), 2),
+    }
+
+
+def peak_rss_mb(backend: str, path: str, model_path: str, threads: int) -> float:
+    """Load and run one backend in a fresh interpreter; VmHWM of that process"""
+    cmd = [sys.executable, __file__, "--rss-probe", backend, path, "--model", model_path,
+           "--threads", str(threads)]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def rss_probe(backend_name: str, path: str, model_path: str, threads: int) -> None:
+    backend = create_backend(backend_name, model_path, artifact_path=path, num_threads=threads)
+    backend.predict(np.zeros((8, *TARGET_SIZE, 3), dtype=np.float32))
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    print(int(line.split()[1]) / 1024.0)
+                    return
+    import psutil
+    info = psutil.Process().memory_info()
+    print(getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="Medicinal_model.h5")
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    parser.add_argument("--images", help="evaluation images, ideally in class-named subfolders")
+    parser.add_argument("--limit", type=int, default=64, help="maximum evaluation images")
+    parser.add_argument("--threads", type=int, default=0, help="runtime threads (0 = default)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--rss-probe", nargs=2, metavar=("BACKEND", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_probe:
+        rss_probe(*args.rss_probe, args.model, args.threads)
+        return
+
+    artifacts = discover_artifacts(args.model, args.export_dir)
+    baseline = create_backend("keras", args.model, num_threads=args.threads)
+    images, labels = load_eval_set(args.images, baseline.class_names, args.limit)
+    reference = predict_all(baseline, images, 8)
+    reference_top1 = reference.argmax(axis=1)
+
+    report = {"images": len(images), "labelled": labels is not None, "threads": args.threads, "backends": {}}
+    for label, backend_name, path in artifacts:
+        backend = baseline if backend_name == "keras" else create_backend(
+            backend_name, args.model, artifact_path=path, num_threads=args.threads)
+        probabilities = predict_all(backend, images, 8)
+        top1 = probabilities.argmax(axis=1)
+
+        entry = {
+            "path": path,
+            "size_mb": round(os.path.getsize(path) / (1024 * 1024), 2),
+            "load_ms": round(backend.load_ms, 1),
+            "top1_agreement": round(float((top1 == reference_top1).mean()), 4),
+            "max_abs_prob_diff": round(float(np.abs(probabilities - reference).max()), 5),
+            "batch_1": time_backend(backend, images, 1, args.repeats),
+            "batch_8": time_backend(backend, images, 8, args.repeats),
+            "peak_rss_mb": round(peak_rss_mb(backend_name, path, args.model, args.threads), 1),
+        }
+        if labels is not None:
+            entry["accuracy"] = round(float((top1 == labels).mean()), 4)
+        report["backends"][label] = entry
+
+    keras_entry = report["backends"]["keras"]
+    for entry in report["backends"].values():
+        if labels is not None:
+            entry["accuracy_delta"] = round(entry["accuracy"] - keras_entry["accuracy"], 4)
+        entry["speedup_batch_1"] = round(keras_entry["batch_1"]["p50_ms"] / entry["batch_1"]["p50_ms"], 2)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,33 @@
-import tensorflow as tf
+"""
+Export the trained Keras model for CPU serving
+SavedModel, TFLite (dynamic-range, float16, int8) and ONNX artifacts
+
+Usage:
+    python convert_model.py                                   # every format
+    python convert_model.py --formats int8,onnx --calibration-dir dataset/train
+"""
+
+import argparse
 import os
 
 # Disable warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
-def convert_h5_to_savedmodel():
-    """Convert H5 model to SavedModel format with compatibility fixes"""
+import numpy as np
+import tensorflow as tf
+
+from inference_backends import EXPORT_DIR
+from model_registry import DEFAULT_CLASS_NAMES, read_class_names, resolve_class_names_path
+from preprocessing import TARGET_SIZE, decode_image, normalize
+
+MODEL_PATH = 'Medicinal_model.h5'
+TFLITE_VARIANTS = ("dynamic", "float16", "int8")
+ALL_FORMATS = ("savedmodel", *TFLITE_VARIANTS, "onnx")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def load_keras_model(path=MODEL_PATH):
+    """Load the H5 with compatibility fixes for models saved by newer Keras"""
     
     # Custom objects for loading
     def custom_input_layer(**config):
@@ -21,21 +43,25 @@ def convert_h5_to_savedmodel():
         'DTypePolicy': custom_dtype_policy
     }
     
+    # Load with custom objects and safe_mode=False
+    return tf.keras.models.load_model(
+        path,
+        custom_objects=custom_objects,
+        compile=False,
+        safe_mode=False
+    )
+
+
+def convert_h5_to_savedmodel():
+    """Convert H5 model to SavedModel format with compatibility fixes"""
     try:
-        # Load with custom objects and safe_mode=False
-        model = tf.keras.models.load_model(
-            'Medicinal_model.h5', 
-            custom_objects=custom_objects,
-            compile=False,
-            safe_mode=False
-        )
+        model = load_keras_model()
         
         # Save as SavedModel format
         model.save('medicinal_savedmodel', save_format='tf')
         print("✅ Model converted to SavedModel format")
         
         # Test the model
-        import numpy as np
         test_input = np.random.random((1, 256, 256, 3)).astype(np.float32)
         predictions = model.predict(test_input, verbose=0)
         print(f"Test prediction shape: {predictions.shape}")
@@ -47,5 +73,125 @@ def convert_h5_to_savedmodel():
         print(f"❌ Conversion failed: {e}")
         return False
 
+
+def serving_function(model):
+    """Inference-mode forward pass with a dynamic batch dimension"""
+    signature = [tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name="image")]
+
+    @tf.function(input_signature=signature)
+    def serve(image):
+        return model(image, training=False)
+
+    return serve
+
+
+def calibration_images(calibration_dir, limit):
+    """Preprocessed float32 images for int8 calibration, drawn from a dataset folder.
+
+    Falls back to random pixels when no folder is given, which produces a
+    working but less accurate int8 model.
+    """
+    paths = []
+    if calibration_dir:
+        for root, _, files in os.walk(calibration_dir):
+            paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        print("⚠️ No calibration images; calibrating int8 on random pixels")
+        rng = np.random.default_rng(0)
+        return [rng.random((1, *TARGET_SIZE, 3), dtype=np.float32) for _ in range(limit)]
+
+    # Spread the sample across classes rather than taking the first folder
+    step = max(1, len(paths) // limit)
+    images = []
+    for path in paths[::step][:limit]:
+        with open(path, 'rb') as f:
+            images.append(normalize(decode_image(f.read())))
+    print(f"✅ Calibrating int8 on {len(images)} images from {calibration_dir}")
+    return images
+
+
+def export_tflite(model, variant, out_path, calibration=None):
+    """Post-training quantized TFLite flatbuffer; inputs and outputs stay float32"""
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    # Keras 3 keeps weights as resource variables; fold them into the graph
+    frozen = convert_variables_to_constants_v2(serving_function(model).get_concrete_function())
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([frozen])
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        converter.representative_dataset = lambda: ([image] for image in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    flatbuffer = converter.convert()
+    with open(out_path, 'wb') as f:
+        f.write(flatbuffer)
+    return out_path
+
+
+def export_onnx(model, out_path, opset=17):
+    """ONNX graph via tf2onnx (pip install tf2onnx)"""
+    import tf2onnx
+
+    serve = serving_function(model)
+    tf2onnx.convert.from_function(serve, input_signature=serve.input_signature,
+                                  opset=opset, output_path=out_path)
+    return out_path
+
+
+def export_all(model_path=MODEL_PATH, output_dir=EXPORT_DIR, formats=ALL_FORMATS,
+               calibration_dir=None, calibration_samples=200):
+    """Write each requested artifact to ``output_dir``; returns {format: path}"""
+    os.makedirs(output_dir, exist_ok=True)
+    model = load_keras_model(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+
+    # Backends read the class list from next to the artifact
+    names_path = resolve_class_names_path(model_path)
+    class_names = read_class_names(names_path) if names_path else list(DEFAULT_CLASS_NAMES)
+    with open(os.path.join(output_dir, "class_names.txt"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(class_names) + "\n")
+
+    calibration = calibration_images(calibration_dir, calibration_samples) if "int8" in formats else None
+
+    artifacts = {}
+    for fmt in formats:
+        try:
+            if fmt == "savedmodel":
+                path = os.path.join(output_dir, f"{stem}_savedmodel")
+                tf.saved_model.save(model, path, signatures=serving_function(model).get_concrete_function())
+            elif fmt in TFLITE_VARIANTS:
+                path = export_tflite(model, fmt, os.path.join(output_dir, f"{stem}.{fmt}.tflite"), calibration)
+            elif fmt == "onnx":
+                path = export_onnx(model, os.path.join(output_dir, f"{stem}.onnx"))
+            else:
+                print(f"❌ Unknown format {fmt}")
+                continue
+        except Exception as e:
+            print(f"❌ {fmt} export failed: {e}")
+            continue
+        artifacts[fmt] = path
+        if os.path.isfile(path):
+            print(f"✅ {fmt}: {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
+        else:
+            print(f"✅ {fmt}: {path}")
+    return artifacts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output-dir", default=EXPORT_DIR)
+    parser.add_argument("--formats", default=",".join(ALL_FORMATS),
+                        help=f"comma-separated subset of {', '.join(ALL_FORMATS)}")
+    parser.add_argument("--calibration-dir", help="folder of training images for int8 calibration")
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    args = parser.parse_args()
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    export_all(args.model, args.output_dir, formats, args.calibration_dir, args.calibration_samples)
+
+
 if __name__ == "__main__":
-    convert_h5_to_savedmodel()
\ No newline at end of file
+    main()
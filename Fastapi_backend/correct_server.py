@@ -2,11 +2,12 @@ from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-import tensorflow as tf
 import numpy as np
 from PIL import Image
 import io
 
+from model_registry import DEFAULT_CLASS_NAMES, model_registry
+
 app = FastAPI(title="Medicinal Plant Classifier API")
 
 app.add_middleware(
@@ -18,20 +19,19 @@ app.add_middleware(
 )
 
 # Exact class names from your training (alphabetical order)
-class_names = [
-    'Basale', 'Betle', 'Drumstick', 'Guava', 'Jackfruit',
-    'Lemon', 'Mentha', 'Neem', 'Roxburgh fig', 'sinensis'
-]
+class_names = list(DEFAULT_CLASS_NAMES)
 
 model = None
 
 def load_model():
-    global model
+    global model, class_names
     model_path = "Medicinal_model.h5"
     
     try:
         print(f"Loading model from: {model_path}")
-        model = tf.keras.models.load_model(model_path, compile=False)
+        loaded = model_registry.load(model_path)
+        model = loaded.model
+        class_names = loaded.class_names
         print("✅ Model loaded successfully")
         print(f"Input shape: {model.input_shape}")
         print(f"Output shape: {model.output_shape}")
@@ -0,0 +1,110 @@
+"""
+Connection pool settings, driver selection and the SQLite profile shared by database.py and database_sqlite.py
+Sync engines serve scripts and thread-pool jobs; the API routes use the async engines
+"""
+
+import os
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from metrics import registry
+
+# Connections kept open per process, and how many more may be opened under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Reconnect connections older than this (seconds; -1 = never), ahead of server/proxy idle timeouts
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Test each connection on checkout so a restarted database does not fail the next request
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# SQLite production profile (file databases only). WAL lets readers run
+# while one writer commits; NORMAL sync is durable across app crashes and
+# only loses the last commits on power loss.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+
+# Async driver for each sync URL scheme the app has used
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_url(url: str) -> str:
+    """``url`` with its sync driver swapped for the asyncio one (asyncpg / aiosqlite)"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def pool_options(url: str) -> Dict:
+    """create_engine / create_async_engine keyword arguments for ``url``"""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        # SQLite connections are files; sessions hop threads via the pool
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            # Each in-memory connection is its own database: keep a single one
+            return {"connect_args": options["connect_args"]}
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def sqlite_pragmas():
+    """PRAGMA statements run on every new SQLite connection"""
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+    ]
+
+
+def apply_sqlite_profile(engine) -> None:
+    """Run ``sqlite_pragmas`` on each connection ``engine`` opens (sync or async engine)"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not is_sqlite_file(sync_engine.url.render_as_string(hide_password=False)):
+        return
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def register_pool_metrics(engine, name: str) -> None:
+    """Connections in use, idle and overflowing for ``engine``'s pool (QueuePool; others report what they have)"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    labels = {"engine": name}
+    for metric, method, description in (
+        ("db_pool_checked_out", "checkedout", "Connections in use"),
+        ("db_pool_checked_in", "checkedin", "Idle connections in the pool"),
+        ("db_pool_overflow", "overflow", "Connections opened past pool_size (negative: pool not yet full)"),
+        ("db_pool_size", "size", "Configured pool_size"),
+    ):
+        if callable(getattr(pool, method, None)):
+            registry.gauge(metric, description, getattr(pool, method), labels)
@@ -0,0 +1,198 @@
+"""
+In-process event bus for live dashboard updates
+Routes publish inserted/updated rows; /api/events fans them out to subscribers over SSE
+"""
+
+import asyncio
+import collections
+import itertools
+import json
+import os
+import time
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from metrics import registry
+
+# Frames each subscriber may have queued before it is dropped to a resync
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "256"))
+# Recent frames kept so a reconnecting client can resume from Last-Event-ID
+EVENT_REPLAY_SIZE = int(os.getenv("EVENT_REPLAY_SIZE", "1024"))
+EVENT_MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "100"))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+
+# Tells the client its view may have gaps: fetch /api/admin/changes. Not
+# numbered, since it is nothing a reconnecting client could resume from.
+RESYNC_EVENT = "resync"
+RESYNC_FRAME = f"event: {RESYNC_EVENT}\ndata: {{}}\n\n"
+
+published_events = registry.counter("events_published_total", "Events published to the bus")
+dropped_events = registry.counter("events_dropped_total", "Queued events dropped for slow subscribers")
+resync_events = registry.counter("events_resyncs_total", "Resyncs sent after a dropped backlog or replay gap")
+
+
+class Subscription:
+    """One connected client: a bounded queue of ready-to-send SSE frames"""
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, frame: str) -> None:
+        """Queue ``frame``; when full, drop the backlog and queue a resync instead"""
+        try:
+            self.queue.put_nowait(frame)
+            return
+        except asyncio.QueueFull:
+            pass
+        dropped = 0
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            dropped += 1
+        dropped_events.inc(dropped + 1)
+        resync_events.inc()
+        self.queue.put_nowait(RESYNC_FRAME)
+
+    async def next_frame(self, timeout: float) -> Optional[str]:
+        """Next frame, or None after ``timeout`` seconds without one or once the bus shuts down"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """Fan-out of published events to every subscriber of this process.
+
+    ``publish`` never blocks the caller: with no subscribers it returns at
+    once, otherwise encoding and delivery run as a loop callback after the
+    request handler yields. Each subscriber has its own bounded queue, so a
+    stalled client only loses its own backlog (and gets a resync) while
+    everyone else keeps streaming.
+
+    Events are per process. With several workers a dashboard only hears
+    about writes handled by the worker it is connected to; it still polls
+    /api/admin/changes occasionally to pick up the rest.
+    """
+
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE, replay_size: int = EVENT_REPLAY_SIZE,
+                 max_subscribers: int = EVENT_MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        # Event ids are "<epoch>-<seq>" so ids from before a restart never match
+        self.epoch = format(int(time.time() * 1000), "x")
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._history: Deque[Tuple[int, str]] = collections.deque(maxlen=replay_size)
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed = False
+        # Set by close(); open streams end when they see it
+        self.shutdown = asyncio.Event()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Optional[Subscription]:
+        """New subscription (None when at capacity), primed for a resumed stream.
+
+        A client reconnecting with ``last_event_id`` gets the frames it missed
+        from the replay buffer, or a resync when they are no longer there.
+        Must be called on the event loop.
+        """
+        if self._closed or len(self._subscribers) >= self.max_subscribers:
+            return None
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self.buffer_size)
+
+        if last_event_id:
+            missed = self._replay_after(last_event_id)
+            if missed is None:
+                resync_events.inc()
+                missed = [RESYNC_FRAME]
+            for frame in missed:
+                subscription.offer(frame)
+
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, event: str, rows: List, schema=None) -> None:
+        """Announce ``rows`` (ORM objects validated through ``schema``, or dicts) as ``event``.
+
+        Safe to call from any thread; returns without doing work when no one
+        is listening.
+        """
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        if schema is not None:
+            rows = [schema.model_validate(row).model_dump() for row in rows]
+        try:
+            loop.call_soon_threadsafe(self._fan_out, event, rows)
+        except RuntimeError:
+            # Loop shut down between the check and the call
+            pass
+
+    def close(self) -> None:
+        """Ask every open stream to finish (used at shutdown); safe from any thread"""
+        self._closed = True
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._close_streams)
+                return
+            except RuntimeError:
+                pass
+        self._close_streams()
+
+    def _close_streams(self) -> None:
+        self.shutdown.set()
+        for subscription in list(self._subscribers):
+            # Wake the stream if it is waiting; a full queue wakes it anyway
+            try:
+                subscription.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "buffer_size": self.buffer_size,
+            "last_event_id": f"{self.epoch}-{self._last_seq}",
+            "published": int(published_events.value),
+            "dropped": int(dropped_events.value),
+            "resyncs": int(resync_events.value),
+        }
+
+    def _fan_out(self, event: str, rows: List) -> None:
+        # Encoded once, shared by every subscriber
+        payload = json.dumps(jsonable_encoder(rows), separators=(",", ":"))
+        seq = next(self._seq)
+        self._last_seq = seq
+        frame = f"id: {self.epoch}-{seq}\nevent: {event}\ndata: {payload}\n\n"
+        self._history.append((seq, frame))
+        published_events.inc()
+        for subscription in list(self._subscribers):
+            subscription.offer(frame)
+
+    def _replay_after(self, last_event_id: str) -> Optional[List[str]]:
+        """Frames after ``last_event_id``, or None if some are no longer buffered"""
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._last_seq:
+            return None
+        oldest = self._history[0][0] if self._history else self._last_seq + 1
+        if seq + 1 < oldest:
+            return None
+        return [frame for frame_seq, frame in self._history if frame_seq > seq]
+
+
+event_bus = EventBus()
+
@@ -0,0 +1,102 @@
+"""
+Executor layer for CPU-bound work
+Keeps image decoding and model inference off the asyncio event loop
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from metrics import registry
+
+# Threads calling into TensorFlow (TF parallelises each call internally)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+# "thread" or "process"; a process pool sidesteps the GIL for PIL work
+PREPROCESS_POOL = os.getenv("PREPROCESS_POOL", "thread").lower()
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 2)))
+# Jobs allowed in flight (running + waiting) before new work gets a 503
+MAX_PENDING_INFERENCE = int(os.getenv("MAX_PENDING_INFERENCE", "64"))
+MAX_PENDING_PREPROCESS = int(os.getenv("MAX_PENDING_PREPROCESS", "64"))
+
+
+class ExecutorSaturated(HTTPException):
+    """Raised when a pool is at capacity; surfaces as 503 with Retry-After"""
+
+    def __init__(self, name: str):
+        super().__init__(
+            status_code=503,
+            detail=f"Server busy: {name} queue is full, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+class BoundedExecutor:
+    """Wraps a concurrent.futures executor with a cap on in-flight jobs"""
+
+    def __init__(self, name: str, executor: Executor, max_pending: int):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max(1, max_pending)
+        self._pending = 0
+        self.rejected = registry.counter(f"{name}_rejected_total", f"{name} jobs rejected with 503")
+        registry.gauge(f"{name}_pending", f"{name} jobs running or waiting", lambda: self._pending)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def check_capacity(self) -> None:
+        if self._pending >= self.max_pending:
+            self.rejected.inc()
+            raise ExecutorSaturated(self.name)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` in the pool, rejecting immediately when saturated"""
+        self.check_capacity()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "pool": type(self.executor).__name__,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected": int(self.rejected.value),
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _create_preprocess_pool() -> Executor:
+    if PREPROCESS_POOL == "process":
+        return ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS)
+    return ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="preprocess")
+
+
+inference_executor = BoundedExecutor(
+    "inference",
+    ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference"),
+    MAX_PENDING_INFERENCE,
+)
+
+preprocess_executor = BoundedExecutor("preprocess", _create_preprocess_pool(), MAX_PENDING_PREPROCESS)
+
+
+def executor_stats() -> dict:
+    return {
+        "inference": inference_executor.stats(),
+        "preprocess": preprocess_executor.stats(),
+    }
+
+
+def shutdown_executors() -> None:
+    inference_executor.shutdown()
+    preprocess_executor.shutdown()
@@ -1,9 +1,18 @@
 import h5py
+import json
 import numpy as np
+import os
 import pickle
 
-def extract_weights_from_h5(model_path):
-    """Extract weights from H5 model file"""
+from numpy_engine import normalize_pickled_weights, write_weight_blob
+
+def extract_weights_from_h5(model_path, output_dir="."):
+    """Extract weights and the layer graph from H5 model file
+
+    Writes extracted_weights.pkl, model_weights.npy (the same weights as one
+    memory-mappable float32 blob) and model_graph.json, which numpy_engine.py
+    executes without TensorFlow.
+    """
     weights_dict = {}
     
     with h5py.File(model_path, 'r') as f:
@@ -22,13 +31,34 @@ def extract_weights_from_h5(model_path):
             
             model_weights.visititems(extract_layer_weights)
     
+        model_config = f.attrs['model_config']
+        if isinstance(model_config, bytes):
+            model_config = model_config.decode('utf-8')
+
     # Save weights as pickle for easy loading
-    with open('extracted_weights.pkl', 'wb') as f:
+    weights_path = os.path.join(output_dir, 'extracted_weights.pkl')
+    with open(weights_path, 'wb') as f:
         pickle.dump(weights_dict, f)
+
+    # Mapped read-only by every serving process (see prefork_server.py)
+    blob_path = os.path.join(output_dir, 'model_weights.npy')
+    weights_index = write_weight_blob(normalize_pickled_weights(weights_dict), blob_path)
+
+    # Layer graph next to the weights it refers to
+    graph_path = os.path.join(output_dir, 'model_graph.json')
+    with open(graph_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "source": os.path.basename(model_path),
+            "weights_file": os.path.basename(weights_path),
+            "weights_mmap": os.path.basename(blob_path),
+            "weights_index": weights_index,
+            "model_config": json.loads(model_config),
+        }, f)
     
     print(f"Extracted weights for {len(weights_dict)} layers")
     for layer_name in weights_dict.keys():
         print(f"  - {layer_name}")
+    print(f"Layer graph written to {graph_path}")
     
     return weights_dict
 
@@ -1,10 +1,18 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 import numpy as np
 from PIL import Image
 import io
 import os
 
+from executors import inference_executor, preprocess_executor
+from logs import get_logger
+from metrics import CONTENT_TYPE, RequestMetricsMiddleware, record_prediction, registry
+from model_registry import DEFAULT_CLASS_NAMES, model_registry
+from preprocessing import decode_image, normalize
+
+logger = get_logger("final_server")
+
 app = FastAPI(title="Medicinal Plant Classifier API")
 
 app.add_middleware(
@@ -14,32 +22,27 @@ app.add_middleware(
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 # Your exact trained classes
-class_names = [
-    'Basale', 'Betle', 'Drumstick', 'Guava', 'Jackfruit',
-    'Lemon', 'Mentha', 'Neem', 'Roxburgh fig', 'sinensis'
-]
+class_names = list(DEFAULT_CLASS_NAMES)
 
 # Try to load TensorFlow
 model = None
 try:
-    import tensorflow as tf
-    print("Loading your trained model...")
-    model = tf.keras.models.load_model("Medicinal_model.h5", compile=False)
-    print(f"✅ Model loaded: {model.input_shape} -> {model.output_shape}")
+    loaded = model_registry.load("Medicinal_model.h5")
+    model = loaded.model
+    class_names = loaded.class_names
+    logger.info("Model loaded", input_shape=model.input_shape, output_shape=model.output_shape)
     USE_REAL_MODEL = True
 except Exception as e:
-    print(f"❌ TensorFlow error: {e}")
-    print("Using image-based prediction fallback")
+    logger.error("TensorFlow model unavailable; using image-based prediction fallback", error=str(e))
     USE_REAL_MODEL = False
 
-def preprocess_image(image_bytes):
-    """Exact preprocessing as training"""
-    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-    image = image.resize((256, 256), Image.Resampling.LANCZOS)
-    img_array = np.array(image, dtype=np.float32) / 255.0
-    return np.expand_dims(img_array, axis=0)
+async def preprocess_image(image_bytes):
+    """Exact preprocessing as training, run on the preprocessing pool"""
+    pixels = await preprocess_executor.run(decode_image, image_bytes)
+    return normalize(pixels)
 
 def predict_from_image_features(image_bytes):
     """Smart prediction based on actual image features"""
@@ -109,6 +112,10 @@ def predict_from_image_features(image_bytes):
         
         return predicted_idx, probabilities
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "model_type": "real" if USE_REAL_MODEL else "simulation"}
@@ -123,25 +130,24 @@ async def list_plants():
 
 @app.post("/predict")
 async def predict_plant(file: UploadFile = File(...)):
-    print(f"Received: {file.filename}")
-    
     try:
         image_bytes = await file.read()
         
         if USE_REAL_MODEL and model is not None:
             # Use actual trained model
-            processed_image = preprocess_image(image_bytes)
-            predictions = model.predict(processed_image, verbose=0)
+            processed_image = await preprocess_image(image_bytes)
+            predictions = await inference_executor.run(model.predict, processed_image, verbose=0)
             predicted_idx = np.argmax(predictions[0])
             probabilities = predictions[0]
-            print(f"Real model prediction: {class_names[predicted_idx]}")
+            logger.debug("Model prediction", filename=file.filename, predicted_class=class_names[predicted_idx])
         else:
             # Use intelligent image-based prediction
-            predicted_idx, probabilities = predict_from_image_features(image_bytes)
-            print(f"Feature-based prediction: {class_names[predicted_idx]}")
+            predicted_idx, probabilities = await preprocess_executor.run(predict_from_image_features, image_bytes)
+            logger.debug("Feature-based prediction", filename=file.filename, predicted_class=class_names[predicted_idx])
         
         predicted_class = class_names[predicted_idx]
         confidence = float(probabilities[predicted_idx])
+        record_prediction(predicted_class, confidence)
         
         # Create response
         all_predictions = {}
@@ -156,11 +162,13 @@ async def predict_plant(file: UploadFile = File(...)):
             "medical_warning": "MEDICAL DISCLAIMER: Consult healthcare professionals before use."
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error: {e}")
+        logger.exception("Prediction failed", filename=file.filename)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"Starting server with {'trained model' if USE_REAL_MODEL else 'intelligent simulation'}")
+    logger.info("Starting server", mode="trained model" if USE_REAL_MODEL else "intelligent simulation")
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=False)
\ No newline at end of file
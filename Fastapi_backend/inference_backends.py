@@ -0,0 +1,333 @@
+"""
+Pluggable inference runtimes for the plant classifier
+Keras, TFLite and onnxruntime behind one batch -> probabilities interface
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from model_registry import (
+    DEFAULT_CLASS_NAMES, WARMUP_BATCH_SIZES, ModelLoadError, model_registry,
+    read_class_names, resolve_class_names_path, warm_up,
+)
+from logs import get_logger
+from prediction_cache import file_digest
+
+logger = get_logger(__name__)
+
+# keras | tflite | onnx | numpy | worker (inference_worker.py in its own process)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras").lower()
+# TFLite/ONNX artifact (EXPORT_DIR/<model stem>.<default variant> when empty);
+# for numpy, the .h5 itself or the model_graph.json from extract_weights.py
+INFERENCE_MODEL_PATH = os.getenv("INFERENCE_MODEL_PATH", "")
+# Intra-op threads for the TFLite/ONNX/BLAS runtime (0 = runtime default)
+BACKEND_NUM_THREADS = int(os.getenv("BACKEND_NUM_THREADS", "0"))
+# Where convert_model.py writes exported artifacts
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exported_models")
+
+# Artifact picked for a backend when INFERENCE_MODEL_PATH is not set
+DEFAULT_ARTIFACT_SUFFIXES = {
+    "tflite": ".dynamic.tflite",
+    "onnx": ".onnx",
+}
+
+
+class InferenceBackend:
+    """One loaded artifact that maps a float32 NHWC batch to class probabilities"""
+
+    name = "base"
+
+    def __init__(self, path: str, class_names: List[str], num_threads: int = 0):
+        self.path = path
+        self.class_names = class_names
+        self.num_threads = num_threads
+        self.version = file_digest(path)
+        self.load_ms = 0.0
+
+    @property
+    def input_shape(self) -> Tuple:
+        raise NotImplementedError
+
+    @property
+    def output_shape(self) -> Tuple:
+        raise NotImplementedError
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def warm_up(self, batch_sizes: List[int] = WARMUP_BATCH_SIZES) -> Dict[str, float]:
+        return warm_up(self.predict, self.input_shape, batch_sizes)
+
+    def _check_classes(self) -> None:
+        output_width = int(self.output_shape[-1])
+        if len(self.class_names) != output_width:
+            raise ModelLoadError(
+                f"{self.path} outputs {output_width} classes but its class list has {len(self.class_names)}"
+            )
+
+    def info(self) -> Dict:
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "version": self.version,
+            "num_threads": self.num_threads,
+            "input_shape": list(self.input_shape),
+            "num_classes": int(self.output_shape[-1]),
+            "load_ms": round(self.load_ms, 1),
+        }
+
+
+class KerasBackend(InferenceBackend):
+    """The registry's shared Keras model served through make_serving_fn"""
+
+    name = "keras"
+
+    def __init__(self, path: str, class_names_path: Optional[str] = None, num_threads: int = 0):
+        started = time.perf_counter()
+        self.loaded = model_registry.load(path, class_names_path)
+        super().__init__(self.loaded.path, self.loaded.class_names, num_threads)
+        self.version = self.loaded.version
+        self.load_ms = (time.perf_counter() - started) * 1000.0
+
+    @property
+    def model(self):
+        return self.loaded.model
+
+    @property
+    def input_shape(self) -> Tuple:
+        return self.loaded.input_shape
+
+    @property
+    def output_shape(self) -> Tuple:
+        return tuple(self.loaded.model.output_shape)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.loaded.predict(batch)
+
+
+def _tflite_interpreter_class():
+    """Standalone LiteRT / tflite-runtime when installed, otherwise TensorFlow's"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite interpreter; the input tensor is resized whenever the batch size changes"""
+
+    name = "tflite"
+
+    def __init__(self, path: str, class_names: List[str], num_threads: int = 0):
+        super().__init__(path, class_names, num_threads)
+        started = time.perf_counter()
+        interpreter_class = _tflite_interpreter_class()
+        self.interpreter = interpreter_class(model_path=path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # An interpreter owns one set of tensors, so calls must not overlap
+        self._lock = threading.Lock()
+        self.load_ms = (time.perf_counter() - started) * 1000.0
+        self._check_classes()
+
+    @property
+    def input_shape(self) -> Tuple:
+        return (None, *(int(d) for d in self._input["shape"][1:]))
+
+    @property
+    def output_shape(self) -> Tuple:
+        return (None, *(int(d) for d in self._output["shape"][1:]))
+
+    def _quantize(self, batch: np.ndarray) -> np.ndarray:
+        dtype = self._input["dtype"]
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self._input["quantization"]
+        return np.clip(np.round(batch / scale + zero_point),
+                       np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+
+    def _dequantize(self, output: np.ndarray) -> np.ndarray:
+        if output.dtype == np.float32:
+            return output
+        scale, zero_point = self._output["quantization"]
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], list(batch.shape))
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input["index"], self._quantize(batch))
+            self.interpreter.invoke()
+            # get_tensor copies, so the result survives the next invoke
+            return self._dequantize(self.interpreter.get_tensor(self._output["index"]))
+
+
+class OnnxBackend(InferenceBackend):
+    """onnxruntime CPU session; sessions are safe to call from several threads"""
+
+    name = "onnx"
+
+    def __init__(self, path: str, class_names: List[str], num_threads: int = 0):
+        super().__init__(path, class_names, num_threads)
+        import onnxruntime as ort
+
+        started = time.perf_counter()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input = self.session.get_inputs()[0]
+        self._output = self.session.get_outputs()[0]
+        self.load_ms = (time.perf_counter() - started) * 1000.0
+        self._check_classes()
+
+    @property
+    def input_shape(self) -> Tuple:
+        return (None, *(d if isinstance(d, int) else None for d in self._input.shape[1:]))
+
+    @property
+    def output_shape(self) -> Tuple:
+        return (None, *(d if isinstance(d, int) else None for d in self._output.shape[1:]))
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        feed = {self._input.name: batch.astype(np.float32, copy=False)}
+        return self.session.run([self._output.name], feed)[0]
+
+
+class NumpyBackend(InferenceBackend):
+    """numpy_engine.py executing the layer graph; needs h5py and NumPy, not TensorFlow"""
+
+    name = "numpy"
+
+    def __init__(self, path: str, class_names: List[str], num_threads: int = 0):
+        super().__init__(path, class_names, num_threads)
+        from numpy_engine import NumpyModel
+
+        started = time.perf_counter()
+        self.engine = NumpyModel.load(path)
+        self._limiter = None
+        if num_threads:
+            # BLAS thread pools are process-wide; threadpoolctl is optional
+            try:
+                from threadpoolctl import threadpool_limits
+                self._limiter = threadpool_limits(limits=num_threads, user_api="blas")
+            except ImportError:
+                logger.warning("threadpoolctl not installed; set OPENBLAS_NUM_THREADS to limit BLAS threads")
+        self.load_ms = (time.perf_counter() - started) * 1000.0
+        self._check_classes()
+
+    @property
+    def input_shape(self) -> Tuple:
+        return self.engine.input_shape
+
+    @property
+    def output_shape(self) -> Tuple:
+        return self.engine.output_shape
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.engine.predict(batch)
+
+
+class WorkerBackend(InferenceBackend):
+    """Batches run in the inference_worker.py process, shared by every API process"""
+
+    name = "worker"
+
+    def __init__(self, socket_path: Optional[str] = None, num_threads: int = 0):
+        from inference_worker import INFERENCE_SOCKET, InferenceClient
+
+        started = time.perf_counter()
+        self.client = InferenceClient(socket_path or INFERENCE_SOCKET)
+        info = self.client.connect()
+        self.path = info["path"]
+        self.class_names = info["class_names"]
+        self.num_threads = num_threads
+        self.version = info["version"]
+        self.load_ms = (time.perf_counter() - started) * 1000.0
+
+    @property
+    def input_shape(self) -> Tuple:
+        return tuple(self.client.info["input_shape"])
+
+    @property
+    def output_shape(self) -> Tuple:
+        return tuple(self.client.info["output_shape"])
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.client.predict(batch)
+
+    def info(self) -> Dict:
+        return {**super().info(), "runtime": self.client.info["backend"], "worker": self.client.stats()}
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+    "numpy": NumpyBackend,
+    "worker": WorkerBackend,
+}
+
+
+def default_artifact_path(model_path: str, backend: str) -> str:
+    if backend == "numpy":
+        # The engine reads the H5 directly
+        return model_path
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(EXPORT_DIR, stem + DEFAULT_ARTIFACT_SUFFIXES[backend])
+
+
+def create_backend(backend: str = INFERENCE_BACKEND, model_path: str = "Medicinal_model.h5",
+                   artifact_path: Optional[str] = None, class_names_path: Optional[str] = None,
+                   num_threads: int = BACKEND_NUM_THREADS) -> InferenceBackend:
+    """Load ``backend`` for the Keras model at ``model_path``.
+
+    TFLite/ONNX/NumPy artifacts come from ``artifact_path``,
+    INFERENCE_MODEL_PATH or the default location, and use the class list
+    found next to the artifact, falling back to the one for ``model_path``.
+    Raises ModelLoadError if the backend or artifact is unavailable.
+    """
+    if backend not in BACKENDS:
+        raise ModelLoadError(f"Unknown inference backend {backend!r} (expected one of {', '.join(BACKENDS)})")
+    if backend == "keras":
+        return KerasBackend(model_path, class_names_path, num_threads)
+    if backend == "worker":
+        # The worker process picked the model and its class list
+        try:
+            return WorkerBackend(num_threads=num_threads)
+        except Exception as e:
+            raise ModelLoadError(f"Inference worker unavailable: {e}") from e
+
+    path = artifact_path or INFERENCE_MODEL_PATH or default_artifact_path(model_path, backend)
+    if not os.path.exists(path):
+        hint = "extract_weights.py" if backend == "numpy" else "convert_model.py"
+        raise ModelLoadError(f"{backend} artifact {path} not found; run {hint} first")
+
+    names_path = (resolve_class_names_path(path)
+                  or resolve_class_names_path(model_path, class_names_path))
+    class_names = read_class_names(names_path) if names_path else list(DEFAULT_CLASS_NAMES)
+    try:
+        return BACKENDS[backend](path, class_names, num_threads)
+    except ModelLoadError:
+        raise
+    except Exception as e:
+        raise ModelLoadError(f"Failed to load {path} with {backend}: {e}") from e
+
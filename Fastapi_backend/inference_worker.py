@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Out-of-process inference worker and the client API processes use to reach it
+Image batches travel through per-client shared-memory slot rings; only small JSON control messages cross the socket
+
+Usage:
+    python inference_worker.py                                  # Keras, restarted if it dies
+    INFERENCE_WORKER_BACKEND=numpy INFERENCE_MODEL_PATH=model_graph.json python inference_worker.py
+    INFERENCE_BACKEND=worker uvicorn main:app                   # API process, any number of them
+    python prefork_server.py --workers 4 --inference-worker     # both, under one master
+
+Each client creates one SharedMemory block of ``slots`` slots. A slot holds
+up to ``slot_images`` float32 images followed by their class probabilities.
+To run a batch, the client writes it into a free slot and sends
+``{"op": "predict", "id", "slot", "n"}``. The worker reads the slot in place
+(a request batched alone is predicted straight from shared memory), writes
+the probabilities back into the same slot and answers ``{"op": "done", "id"}``.
+Requests from different clients that arrive within INFERENCE_WORKER_MAX_WAIT_MS
+share one model call.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing import connection, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from logs import get_logger
+from metrics import registry
+
+logger = get_logger(__name__)
+
+# Unix socket the worker listens on (owner-only permissions)
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "/tmp/leafsense-inference.sock")
+# Runtime inside the worker (keras | tflite | onnx | numpy); see inference_backends.py
+INFERENCE_WORKER_BACKEND = os.getenv("INFERENCE_WORKER_BACKEND", "keras").lower()
+# Per client: slots in its ring and images per slot (bigger batches go in pieces).
+# Each image slot is 256*256*3 float32s (768 KiB); Docker's /dev/shm is 64 MiB by default
+INFERENCE_WORKER_SLOTS = int(os.getenv("INFERENCE_WORKER_SLOTS", "2"))
+INFERENCE_WORKER_SLOT_IMAGES = int(os.getenv("INFERENCE_WORKER_SLOT_IMAGES", os.getenv("BATCH_MAX_SIZE", "8")))
+# Requests from several clients merged into one model call
+INFERENCE_WORKER_MAX_BATCH = int(os.getenv("INFERENCE_WORKER_MAX_BATCH", "32"))
+INFERENCE_WORKER_MAX_WAIT_MS = float(os.getenv("INFERENCE_WORKER_MAX_WAIT_MS", "2"))
+# Client side: seconds to wait for a reply, and for the worker to come (back) up
+INFERENCE_WORKER_TIMEOUT = float(os.getenv("INFERENCE_WORKER_TIMEOUT", "30"))
+INFERENCE_WORKER_CONNECT_TIMEOUT = float(os.getenv("INFERENCE_WORKER_CONNECT_TIMEOUT", "60"))
+
+# Slot boundaries are rounded up to this many bytes
+SLOT_ALIGNMENT = 64
+# A worker that exits sooner than this after starting is restarted with a delay
+CRASH_LOOP_SECONDS = 5.0
+
+
+class InferenceWorkerUnavailable(HTTPException):
+    """The inference worker is down, restarting or not answering; 503 with Retry-After"""
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=503, detail=f"Inference worker unavailable: {detail}",
+                         headers={"Retry-After": "1"})
+
+
+def send_message(conn: connection.Connection, **message) -> None:
+    conn.send_bytes(json.dumps(message).encode("utf-8"))
+
+
+def recv_message(conn: connection.Connection) -> Dict:
+    # JSON rather than Connection.send/recv: the peer never gets to unpickle anything
+    return json.loads(conn.recv_bytes())
+
+
+class SlotRing:
+    """Fixed-size slots in one SharedMemory block, each an input batch and its outputs"""
+
+    def __init__(self, shm: SharedMemory, slots: int, slot_images: int,
+                 image_shape: Tuple[int, ...], num_classes: int, owner: bool):
+        self.shm = shm
+        self.slots = slots
+        self.slot_images = slot_images
+        self.image_shape = tuple(image_shape)
+        self.num_classes = num_classes
+        self.owner = owner
+        image_size = int(np.prod(self.image_shape))
+        self._output_offset = -(-slot_images * image_size * 4 // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+        self.slot_bytes = -(-(self._output_offset + slot_images * num_classes * 4) // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+
+    @classmethod
+    def create(cls, slots: int, slot_images: int, image_shape: Tuple[int, ...], num_classes: int) -> "SlotRing":
+        ring = cls(None, slots, slot_images, image_shape, num_classes, owner=True)
+        ring.shm = SharedMemory(create=True, size=slots * ring.slot_bytes)
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, slots: int, slot_images: int,
+               image_shape: Tuple[int, ...], num_classes: int) -> "SlotRing":
+        shm = SharedMemory(name=name)
+        # Python < 3.13 registers attached blocks too and would unlink the
+        # client's block when this process exits; only the creator owns it
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, slots, slot_images, image_shape, num_classes, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def fits(self, image_shape: Tuple[int, ...], num_classes: int) -> bool:
+        return self.image_shape == tuple(image_shape) and self.num_classes == num_classes
+
+    def inputs(self, slot: int, n: int) -> np.ndarray:
+        return np.ndarray((n, *self.image_shape), dtype=np.float32, buffer=self.shm.buf,
+                          offset=slot * self.slot_bytes)
+
+    def outputs(self, slot: int, n: int) -> np.ndarray:
+        return np.ndarray((n, self.num_classes), dtype=np.float32, buffer=self.shm.buf,
+                          offset=slot * self.slot_bytes + self._output_offset)
+
+    def close(self) -> None:
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view is still alive somewhere; the mapping goes when it does
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ------------------------------------------------------------------ worker
+
+class _Client:
+    """A connected API process as seen by the worker"""
+
+    def __init__(self, conn: connection.Connection):
+        self.conn = conn
+        self.ring: Optional[SlotRing] = None
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    def reply(self, **message) -> None:
+        if self.closed:
+            return
+        try:
+            with self._send_lock:
+                send_message(self.conn, **message)
+        except (OSError, EOFError):
+            self.closed = True
+
+
+class InferenceServer:
+    """Serves one loaded backend to every client that connects to ``socket_path``.
+
+    A thread per client reads control messages; one batching thread merges
+    queued requests (up to ``max_batch`` images, waiting at most
+    ``max_wait_ms`` after the first) and runs the model.
+    """
+
+    def __init__(self, backend, socket_path: str = INFERENCE_SOCKET,
+                 max_batch: int = INFERENCE_WORKER_MAX_BATCH, max_wait_ms: float = INFERENCE_WORKER_MAX_WAIT_MS):
+        self.backend = backend
+        self.socket_path = socket_path
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.image_shape = tuple(backend.input_shape[1:])
+        self.num_classes = int(backend.output_shape[-1])
+        self._requests: "queue.Queue[Tuple[_Client, int, int, int]]" = queue.Queue()
+        self._carry = None
+        self._buffer = np.empty((self.max_batch, *self.image_shape), dtype=np.float32)
+
+    def model_info(self) -> Dict:
+        return {
+            "backend": self.backend.name,
+            "path": self.backend.path,
+            "version": self.backend.version,
+            "class_names": self.backend.class_names,
+            "input_shape": list(self.backend.input_shape),
+            "output_shape": list(self.backend.output_shape),
+            "pid": os.getpid(),
+        }
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        listener = connection.Listener(self.socket_path, family="AF_UNIX", backlog=128)
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self._run_batches, name="inference-batches", daemon=True).start()
+        logger.info("Inference worker serving", pid=os.getpid(), model=self.backend.path,
+                    backend=self.backend.name, socket=self.socket_path)
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_client, args=(_Client(conn),), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _serve_client(self, client: _Client) -> None:
+        try:
+            client.reply(op="model", **self.model_info())
+            while True:
+                message = recv_message(client.conn)
+                if message["op"] == "attach":
+                    client.ring = SlotRing.attach(message["shm"], message["slots"], message["slot_images"],
+                                                  self.image_shape, self.num_classes)
+                elif message["op"] == "predict":
+                    slot, n = message["slot"], message["n"]
+                    if client.ring is None or not 0 <= slot < client.ring.slots or not 0 < n <= client.ring.slot_images:
+                        client.reply(op="error", id=message["id"], detail="bad slot")
+                        continue
+                    self._requests.put((client, message["id"], slot, n))
+        except (EOFError, OSError, ValueError, KeyError):
+            pass
+        finally:
+            # The ring is unmapped once queued requests drop their reference
+            client.closed = True
+            client.conn.close()
+
+    def _collect(self) -> List[Tuple[_Client, int, int, int]]:
+        first = self._carry or self._requests.get()
+        self._carry = None
+        items, total = [first], first[3]
+        deadline = time.perf_counter() + self.max_wait
+        while total < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if total + item[3] > self.max_batch:
+                # Starts the next batch instead
+                self._carry = item
+                break
+            items.append(item)
+            total += item[3]
+        return items
+
+    def _run_batches(self) -> None:
+        while True:
+            items = [item for item in self._collect() if not item[0].closed]
+            if not items:
+                continue
+            try:
+                if len(items) == 1:
+                    client, _, slot, n = items[0]
+                    # Predicted in place: the batch is never copied out of shared memory
+                    predictions = self.backend.predict(client.ring.inputs(slot, n))
+                else:
+                    offset = 0
+                    for client, _, slot, n in items:
+                        self._buffer[offset:offset + n] = client.ring.inputs(slot, n)
+                        offset += n
+                    predictions = self.backend.predict(self._buffer[:offset])
+            except Exception as e:
+                for client, request_id, _, _ in items:
+                    client.reply(op="error", id=request_id, detail=str(e))
+                continue
+
+            offset = 0
+            for client, request_id, slot, n in items:
+                if not client.closed:
+                    client.ring.outputs(slot, n)[...] = predictions[offset:offset + n]
+                    client.reply(op="done", id=request_id)
+                offset += n
+
+
+# ------------------------------------------------------------------ client
+
+class _Waiter:
+    __slots__ = ("event", "error", "slot")
+
+    def __init__(self, slot: int):
+        self.event = threading.Event()
+        self.error: Optional[str] = None
+        self.slot = slot
+
+
+class InferenceClient:
+    """Thread-safe handle on the inference worker for one API process.
+
+    Connects (waiting up to ``connect_timeout`` for the worker to appear),
+    creates this process's slot ring and predicts through it. If the worker
+    dies, in-flight requests fail with 503 and the next call reconnects to
+    the restarted worker.
+    """
+
+    def __init__(self, socket_path: str = INFERENCE_SOCKET, slots: int = INFERENCE_WORKER_SLOTS,
+                 slot_images: int = INFERENCE_WORKER_SLOT_IMAGES, timeout: float = INFERENCE_WORKER_TIMEOUT,
+                 connect_timeout: float = INFERENCE_WORKER_CONNECT_TIMEOUT):
+        self.socket_path = socket_path
+        self.slots = max(1, slots)
+        self.slot_images = max(1, slot_images)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.info: Optional[Dict] = None
+
+        self._conn: Optional[connection.Connection] = None
+        self._ring: Optional[SlotRing] = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        self._waiters: Dict[int, _Waiter] = {}
+        self._ids = itertools.count()
+
+        self.roundtrip_histogram = registry.histogram(
+            "inference_worker_roundtrip_ms", "Batch round trip through the inference worker (ms)"
+        )
+        self.reconnects = registry.counter("inference_worker_reconnects_total", "Reconnections to the inference worker")
+        self.disconnects = registry.counter("inference_worker_disconnects_total", "Inference worker connections lost")
+
+    def connect(self) -> Dict:
+        """Connect if not connected; returns the worker's model info"""
+        with self._lock:
+            if self._conn is None:
+                self._connect()
+            return self.info
+
+    def _connect(self, timeout: Optional[float] = None) -> None:
+        deadline = time.monotonic() + (self.connect_timeout if timeout is None else timeout)
+        while True:
+            conn = None
+            try:
+                conn = connection.Client(self.socket_path, family="AF_UNIX")
+                info = recv_message(conn)
+                break
+            except (OSError, EOFError, ValueError) as e:
+                # Not started yet, or restarting: the socket is missing, refuses or hangs up
+                if conn is not None:
+                    conn.close()
+                if time.monotonic() >= deadline:
+                    raise InferenceWorkerUnavailable(f"nothing answering on {self.socket_path} ({e})")
+                time.sleep(0.2)
+
+        if self.info is not None:
+            self.reconnects.inc()
+            if info["version"] != self.info["version"]:
+                logger.warning("Inference worker model changed", version=info["version"], previous=self.info["version"])
+        self.info = info
+
+        image_shape, num_classes = tuple(info["input_shape"][1:]), int(info["output_shape"][-1])
+        if self._ring is None or not self._ring.fits(image_shape, num_classes):
+            if self._ring is not None:
+                self._ring.close()
+            self._ring = SlotRing.create(self.slots, self.slot_images, image_shape, num_classes)
+        try:
+            send_message(conn, op="attach", shm=self._ring.name, slots=self.slots, slot_images=self.slot_images)
+        except OSError as e:
+            conn.close()
+            raise InferenceWorkerUnavailable(f"connection lost ({e})")
+        self._conn = conn
+        threading.Thread(target=self._read_replies, args=(conn,), name="inference-replies", daemon=True).start()
+
+    def _read_replies(self, conn: connection.Connection) -> None:
+        try:
+            while True:
+                message = recv_message(conn)
+                with self._lock:
+                    waiter = self._waiters.pop(message["id"], None)
+                if waiter is None:
+                    continue
+                if message["op"] == "error":
+                    waiter.error = message["detail"]
+                waiter.event.set()
+        except (EOFError, OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                if self._conn is conn:
+                    self._conn = None
+                    self.disconnects.inc()
+                    logger.warning("Lost the inference worker", in_flight=len(self._waiters))
+                waiters, self._waiters = self._waiters, {}
+            conn.close()
+            for waiter in waiters.values():
+                waiter.error = "connection lost"
+                waiter.event.set()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """(N, H, W, C) float32 -> (N, num_classes), in slot-sized pieces"""
+        if len(batch) <= self.slot_images:
+            return self._predict_slot(batch)
+        return np.concatenate([self._predict_slot(batch[i:i + self.slot_images])
+                               for i in range(0, len(batch), self.slot_images)])
+
+    def _predict_slot(self, batch: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        try:
+            slot = self._free.get(timeout=self.timeout)
+        except queue.Empty:
+            raise InferenceWorkerUnavailable("no free slot")
+        release = True
+        try:
+            with self._lock:
+                if self._conn is None:
+                    self._connect(min(self.timeout, self.connect_timeout))
+                conn, ring = self._conn, self._ring
+                request_id = next(self._ids)
+                waiter = self._waiters[request_id] = _Waiter(slot)
+
+            n = len(batch)
+            ring.inputs(slot, n)[...] = batch
+            try:
+                with self._send_lock:
+                    send_message(conn, op="predict", id=request_id, slot=slot, n=n)
+            except (OSError, EOFError):
+                raise InferenceWorkerUnavailable("connection lost")
+
+            if not waiter.event.wait(self.timeout):
+                # The worker may still write this slot; keep it out of rotation until it answers
+                release = False
+                threading.Thread(target=self._reclaim, args=(waiter,), daemon=True).start()
+                raise InferenceWorkerUnavailable(f"no reply within {self.timeout:.0f}s")
+            if waiter.error is not None:
+                raise InferenceWorkerUnavailable(waiter.error)
+
+            result = ring.outputs(slot, n).copy()
+            self.roundtrip_histogram.observe((time.perf_counter() - started) * 1000.0)
+            return result
+        finally:
+            if release:
+                self._free.put(slot)
+
+    def _reclaim(self, waiter: _Waiter) -> None:
+        """Return a timed-out slot once the worker answers or the connection drops"""
+        waiter.event.wait()
+        self._free.put(waiter.slot)
+
+    def stats(self) -> Dict:
+        return {
+            "socket": self.socket_path,
+            "connected": self._conn is not None,
+            "worker_pid": self.info["pid"] if self.info else None,
+            "slots": self.slots,
+            "slot_images": self.slot_images,
+            "free_slots": self._free.qsize(),
+            "shm_bytes": self.slots * self._ring.slot_bytes if self._ring is not None else 0,
+            "reconnects": int(self.reconnects.value),
+            "disconnects": int(self.disconnects.value),
+            "roundtrip_ms": self.roundtrip_histogram.snapshot(),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            conn, self._conn = self._conn, None
+            if conn is not None:
+                conn.close()
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+
+
+# ------------------------------------------------------------------ process
+
+def serve(model_path: str = "Medicinal_model.h5", backend_name: str = INFERENCE_WORKER_BACKEND,
+          socket_path: str = INFERENCE_SOCKET) -> None:
+    """Load and warm the model, then serve it until the process is killed"""
+    from inference_backends import create_backend
+
+    if backend_name == "worker":
+        raise SystemExit("INFERENCE_WORKER_BACKEND cannot be 'worker'")
+    backend = create_backend(backend_name, model_path)
+    backend.warm_up()
+    InferenceServer(backend, socket_path).serve_forever()
+
+
+def supervise(model_path: str, backend_name: str, socket_path: str) -> None:
+    """Run ``serve`` in a child process and start a new one whenever it dies"""
+    import multiprocessing
+
+    stopping = False
+    process = None
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        if process is not None and process.is_alive():
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while not stopping:
+        started = time.monotonic()
+        process = multiprocessing.Process(target=serve, args=(model_path, backend_name, socket_path),
+                                          name="inference-worker")
+        process.start()
+        process.join()
+        if stopping:
+            break
+        logger.warning("Inference worker exited; restarting", pid=process.pid, status=process.exitcode)
+        if time.monotonic() - started < CRASH_LOOP_SECONDS:
+            time.sleep(1.0)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="Medicinal_model.h5",
+                        help="Keras model (INFERENCE_MODEL_PATH picks the artifact for other backends)")
+    parser.add_argument("--backend", default=INFERENCE_WORKER_BACKEND)
+    parser.add_argument("--socket", default=INFERENCE_SOCKET)
+    args = parser.parse_args()
+    supervise(args.model, args.backend.lower(), args.socket)
+
+
+if __name__ == "__main__":
+    main()
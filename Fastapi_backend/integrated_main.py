@@ -1,18 +1,66 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
-from routes import feedback, predictions, appointments
+from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+from aggregates import ensure_aggregates
+from database import SessionLocal, async_engine, engine, Base
+from event_bus import event_bus
+from executors import shutdown_executors
+from logs import get_logger
+from metrics import CONTENT_TYPE, RequestMetricsMiddleware, registry
+from pagination import NEXT_CURSOR_HEADER
+from response_encoding import CLASS_LIST_VERSION_HEADER
+from prediction_cache import prediction_cache
+from prediction_log import prediction_log
+from routes import admin, events, feedback, predictions, appointments, stats
+from starlette.concurrency import run_in_threadpool
+from upload_limits import SINGLE_IMAGE_REQUEST_BYTES, UploadLimitMiddleware
+from upload_store import LocalStorage, upload_store
+from write_queue import write_queue
 import os
 
+logger = get_logger(__name__)
+
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+def backfill_stats():
+    db = SessionLocal()
+    try:
+        rebuilt = ensure_aggregates(db)
+        if rebuilt:
+            logger.info("Backfilled stats counters", rebuilt=rebuilt)
+    except Exception as e:
+        logger.warning("Could not backfill stats counters", error=str(e))
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model loads in the background; DB routes are served immediately
+    predictions.model_lifecycle.start()
+    await run_in_threadpool(backfill_stats)
+    # Replays predictions a previous run logged but never stored
+    await prediction_log.start()
+    yield
+    await prediction_log.close()
+    event_bus.close()
+    shutdown_executors()
+    prediction_cache.close()
+    if write_queue is not None:
+        await write_queue.close()
+    await async_engine.dispose()
+
 app = FastAPI(
     title="LeafSense API",
     description="Medicinal Plant Classification System with User Management",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Oversize bodies get 413 while streaming in (added first so CORS headers still wrap it)
+app.add_middleware(UploadLimitMiddleware, limits={"/api/predict": SINGLE_IMAGE_REQUEST_BYTES})
+
 # CORS middleware for Flutter and Admin Dashboard
 app.add_middleware(
     CORSMiddleware,
@@ -20,12 +68,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, CLASS_LIST_VERSION_HEADER, "ETag"],
 )
 
+# Outermost: request latency includes the other middleware and rejected uploads
+app.add_middleware(RequestMetricsMiddleware)
+
 # Include routers
 app.include_router(feedback.router)
 app.include_router(predictions.router)
 app.include_router(appointments.router)
+app.include_router(admin.router)
+app.include_router(events.router)
+app.include_router(stats.router)
+
+# Stored images, thumbnails and profile pictures (S3 links point at the bucket)
+if isinstance(upload_store.backend, LocalStorage):
+    app.mount("/uploads", StaticFiles(directory=upload_store.backend.root), name="uploads")
 
 @app.get("/")
 async def root():
@@ -36,15 +95,29 @@ async def root():
             "feedback": "/api/feedback",
             "predictions": "/api/predictions",
             "appointments": "/api/appointments",
+            "changes": "/api/admin/changes",
+            "events": "/api/events",
+            "stats": "/api/stats",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus scrape target; per process (each prefork worker reports its own)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "LeafSense API"}
+    return {
+        "status": "healthy",
+        "service": "LeafSense API",
+        "model_state": predictions.model_lifecycle.state.value
+    }
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # Open /api/events streams are cancelled after this many seconds of shutdown
+    uvicorn.run(app, host="0.0.0.0", port=port, timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "30")))
\ No newline at end of file
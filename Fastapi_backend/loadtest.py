@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Load test the LeafSense API: /api/predict, the dashboard list endpoints and appointment booking
+Drives the app in-process over ASGI, or a running server over HTTP, and reports throughput, latency and RSS
+
+Usage:
+    INFERENCE_BACKEND=numpy python loadtest.py --model model_graph.json --concurrency 8
+    python loadtest.py --url http://localhost:8000 --pid $(pgrep -f integrated_main) --images ../leaf_photos
+    python loadtest.py --output run.json --baseline main.json --threshold 10
+
+In-process runs use a scratch SQLite database and upload directory, so they
+never touch the configured ones. Every /api/predict upload gets a unique
+trailer after the JPEG end marker: the bytes differ (no prediction cache hit)
+but the decoded image does not. --cache-hits sends the corpus unchanged.
+
+With --baseline, a scenario regresses when its throughput drops, or its p95
+or p99 latency grows, by more than --threshold percent; the exit status is
+then 1, so CI can fail the commit.
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Side (px) of the synthetic leaves: phone thumbnails up to full camera photos
+SYNTHETIC_SIZES = (224, 640, 1024, 2048)
+SCENARIOS = ("appointment_create", "predict", "predictions_list", "appointments_list", "feedback_list")
+# Metrics compared against --baseline, and whether a larger value is the better one
+COMPARED = {"throughput_rps": True, "p95_ms": False, "p99_ms": False}
+
+
+def synthetic_leaf(rng, size: int) -> bytes:
+    """A green, veined leaf on a noisy background: compresses like a photo, not like flat colour"""
+    background = rng.integers(60, 200, (size, size, 3), dtype=np.uint8)
+    image = Image.fromarray(background)
+    draw = ImageDraw.Draw(image)
+    margin = size // 8
+    draw.ellipse((margin, margin * 2, size - margin, size - margin * 2),
+                 fill=tuple(int(c) for c in rng.integers((20, 90, 20), (80, 170, 70))))
+    draw.line((margin, size // 2, size - margin, size // 2), fill=(170, 200, 120), width=max(1, size // 100))
+    for x in range(margin * 2, size - margin, max(1, size // 8)):
+        draw.line((x, size // 2, x + size // 10, size // 3), fill=(150, 190, 110), width=max(1, size // 200))
+        draw.line((x, size // 2, x + size // 10, size * 2 // 3), fill=(150, 190, 110), width=max(1, size // 200))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def build_corpus(images_dir, per_size: int, seed: int) -> list:
+    """(label, jpeg bytes): ``per_size`` synthetic leaves at each size plus every JPEG under ``images_dir``"""
+    rng = np.random.default_rng(seed)
+    corpus = [(f"synthetic-{size}", synthetic_leaf(rng, size)) for size in SYNTHETIC_SIZES for _ in range(per_size)]
+    if images_dir:
+        for root, _, names in os.walk(images_dir):
+            for name in sorted(names):
+                if name.lower().endswith((".jpg", ".jpeg")):
+                    with open(os.path.join(root, name), "rb") as f:
+                        corpus.append((name, f.read()))
+    return corpus
+
+
+def rss_mb(pid) -> dict:
+    """Current and peak resident set size of ``pid`` ("self" for this process), from /proc"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except (OSError, TypeError):
+        return {"current": None, "peak": None}
+
+    def mb(key):
+        return round(int(fields[key].split()[0]) / 1024.0, 1) if key in fields else None
+
+    return {"current": mb("VmRSS"), "peak": mb("VmHWM")}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenario_requests(corpus, cache_hits: bool):
+    """Per scenario, a function from request number to httpx request arguments"""
+    uploads = itertools.cycle(corpus)
+
+    def predict(i):
+        label, image = next(uploads)
+        if not cache_hits:
+            image += b"loadtest-%d" % i
+        return {"method": "POST", "url": "/api/predict",
+                "files": {"file": (f"{label}.jpg", image, "image/jpeg")}, "data": {"user_id": f"load-{i % 50}"}}
+
+    def appointment_create(i):
+        return {"method": "POST", "url": "/api/appointments/", "json": {
+            "user_id": f"load-{i % 50}", "name": "Load Test", "email": "load@example.com",
+            "date": "2026-01-15", "time": "10:00", "doctor": "Dr. Herb", "reason": "load test"}}
+
+    return {
+        "appointment_create": appointment_create,
+        "predict": predict,
+        "predictions_list": lambda i: {"method": "GET", "url": "/api/predictions?limit=50"},
+        "appointments_list": lambda i: {"method": "GET", "url": "/api/appointments/?limit=50"},
+        "feedback_list": lambda i: {"method": "GET", "url": "/api/feedback/?limit=50"},
+    }
+
+
+async def run_scenario(client, make_request, requests: int, concurrency: int, warmup: int, pid) -> dict:
+    """``concurrency`` workers, each sending its next request as soon as the last one answers"""
+    for i in range(warmup):
+        await client.request(**make_request(-1 - i))
+
+    latencies = []
+    statuses = {}
+    counter = itertools.count()
+
+    async def worker():
+        while (i := next(counter)) < requests:
+            started = time.perf_counter()
+            try:
+                status = (await client.request(**make_request(i))).status_code
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - started) * 1000.0
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if isinstance(status, int) and status < 400:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1) if latencies else None
+
+    return {
+        "requests": requests,
+        "errors": requests - len(latencies),
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1], 1) if latencies else None,
+        "rss_mb": rss_mb(pid),
+    }
+
+
+@asynccontextmanager
+async def in_process_client(model: str, timeout: float):
+    """The app on an ASGI transport, with its lifespan run and the model ready"""
+    # Overrides the shell and .env: load test rows must never reach a real database or upload store
+    scratch = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{scratch}/loadtest.db"
+    os.environ["PREDICTION_LOG_SPILL_PATH"] = os.path.join(scratch, "prediction_log.jsonl")
+    os.environ["PREDICTION_CACHE_SQLITE_PATH"] = ""
+    os.environ["UPLOAD_BACKEND"] = "local"
+    os.environ["UPLOAD_DIR"] = os.path.join(scratch, "uploads")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import httpx
+
+    import database
+    import models
+    # The models' metadata is database_sqlite.Base, which integrated_main does not create
+    models.Base.metadata.create_all(database.engine)
+    import routes.predictions
+    routes.predictions.MODEL_PATH = model
+    import integrated_main
+
+    app = integrated_main.app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest",
+                                     timeout=timeout) as client:
+            await routes.predictions.model_lifecycle.wait_ready()
+            yield client
+
+
+@asynccontextmanager
+async def http_client(url: str, concurrency: int, timeout: float):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        deadline = time.monotonic() + 300
+        while True:
+            try:
+                if (await client.get("/health")).json().get("model_state") == "ready":
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                sys.exit(f"{url} did not report a ready model")
+            await asyncio.sleep(0.5)
+        yield client
+
+
+async def run(args, corpus) -> dict:
+    # RSS is only known for this process, or a server whose --pid was given
+    pid = args.pid if args.url else "self"
+    connect = http_client(args.url, args.concurrency, args.timeout) if args.url else \
+        in_process_client(args.model, args.timeout)
+    builders = scenario_requests(corpus, args.cache_hits)
+    async with connect as client:
+        report = {"rss_mb_before": rss_mb(pid), "scenarios": {}}
+        for name in args.scenarios:
+            requests = args.predict_requests if name == "predict" else args.requests
+            report["scenarios"][name] = await run_scenario(
+                client, builders[name], requests, args.concurrency, args.warmup, pid)
+    return report
+
+
+def regressions(report: dict, baseline: dict, threshold: float) -> list:
+    """Human-readable lines for every compared metric more than ``threshold`` percent worse than the baseline"""
+    found = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100.0
+            if (-change if higher_is_better else change) > threshold:
+                found.append(f"{name} {metric}: {old} -> {new} ({change:+.1f}%)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: the app in-process)")
+    parser.add_argument("--pid", type=int, help="with --url, the server process to report RSS for")
+    parser.add_argument("--model", default="Medicinal_model.h5", help="model served in-process")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated, from {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--requests", type=int, default=500, help="requests per list/appointment scenario")
+    parser.add_argument("--predict-requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests before each scenario")
+    parser.add_argument("--images", help="directory of real leaf JPEGs to add to the corpus")
+    parser.add_argument("--per-size", type=int, default=4, help="synthetic JPEGs per size")
+    parser.add_argument("--cache-hits", action="store_true", help="repeat corpus bytes exactly")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression (percent)")
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    corpus = build_corpus(args.images, args.per_size, args.seed)
+    sizes = [len(image) for _, image in corpus]
+    report = {
+        "commit": git_commit(),
+        "target": args.url or "in-process",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "concurrency": args.concurrency,
+        "corpus": {"images": len(corpus), "min_bytes": min(sizes), "max_bytes": max(sizes),
+                   "real": len(corpus) - args.per_size * len(SYNTHETIC_SIZES)},
+        **asyncio.run(run(args, corpus)),
+    }
+
+    failed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failed = regressions(report, baseline, args.threshold)
+        report["baseline"] = {"commit": baseline.get("commit"), "threshold_percent": args.threshold,
+                              "regressions": failed}
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
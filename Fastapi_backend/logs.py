@@ -0,0 +1,149 @@
+"""
+Structured, leveled and rate-limited logging for the LeafSense API
+One event name per call site plus keyword fields, written as text or JSON lines to stderr
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+# DEBUG, INFO, WARNING or ERROR
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" (key=value, for people) or "json" (one object per line, for log shippers)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# At most LOG_RATE_LIMIT records per call site every LOG_RATE_WINDOW seconds (0 = unlimited);
+# the next record let through carries the number suppressed
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "10"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))
+
+ROOT_LOGGER = "leafsense"
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through ``limit`` records per (logger, event) in each ``window``.
+
+    A failing dependency then costs a handful of lines a minute instead
+    of one per request, and the count of dropped records is not lost.
+    """
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites: Dict[Tuple[str, str], list] = {}  # (logger, event) -> [window start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.name, str(record.msg))
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site is not None else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.limit:
+                site[1] += 1
+                suppressed = 0
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.fields = {**getattr(record, "fields", {}), "suppressed": suppressed}
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """``2026-01-01T12:00:00.000Z WARNING prediction_log Flush failed rows=3 error="..."``"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{_timestamp(record)} {record.levelname} {_short_name(record)} {record.getMessage()}"
+        for key, value in getattr(record, "fields", {}).items():
+            text = str(value)
+            line += f" {key}={json.dumps(text) if not text or ' ' in text or '=' in text else text}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, pid, event, then the fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": _timestamp(record),
+            "level": record.levelname,
+            "logger": _short_name(record),
+            "pid": record.process,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class StructuredLogger:
+    """``logger.warning("Flush failed", rows=3, error=str(e))``
+
+    The event is a fixed string per call site (it is also the rate-limit
+    key); values go in keyword fields. Records below the configured level
+    are dropped before anything is formatted.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def _log(self, level: int, event: str, fields: Dict, exc_info=None) -> None:
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields) -> None:
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields) -> None:
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields) -> None:
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields) -> None:
+        """ERROR with the current exception's traceback"""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def _timestamp(record: logging.LogRecord) -> str:
+    return datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _short_name(record: logging.LogRecord) -> str:
+    return record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + ".") else record.name
+
+
+def configure_logging() -> None:
+    """Attach the stderr handler to the ``leafsense`` logger (once per process)"""
+    root = logging.getLogger(ROOT_LOGGER)
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handler.addFilter(RateLimitFilter())
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    # uvicorn configures the root logger its own way; keep the two apart
+    root.propagate = False
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Logger for a module: ``logger = get_logger(__name__)``"""
+    configure_logging()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
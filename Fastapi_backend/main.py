@@ -3,23 +3,50 @@ Medicinal Plant Classification FastAPI
 Error-free deployment with working model
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Query, Request, Response, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-import tensorflow as tf
+import time
 import numpy as np
-from PIL import Image
-import io
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from batch_upload import NDJSON_MEDIA_TYPE, PREDICT_BATCH_CHUNK, collect_images, error_detail, ndjson, predict_many
+from batching import BatchScheduler
+from executors import executor_stats, preprocess_executor, shutdown_executors
+from inference_backends import INFERENCE_BACKEND, create_backend
+from logs import get_logger
+from metrics import CONTENT_TYPE, RequestMetricsMiddleware, elapsed_ms, record_prediction, registry, stage_ms
+from model_lifecycle import ModelLifecycle
+from model_registry import SERVING_MODE, make_serving_fn, model_registry, warm_up
+from preprocessing import decode_image, decode_image_timed, normalize
+from prediction_cache import CACHE_TENSOR_TIER, content_key, prediction_cache, tensor_key
+from response_encoding import CLASS_LIST_VERSION_HEADER, JSONBytes, encode, encoder_for, fragment, probability_list
+from upload_limits import SINGLE_IMAGE_REQUEST_BYTES, UploadLimitMiddleware, check_upload
+
+logger = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the model in the background so the server accepts requests immediately"""
+    model_lifecycle.start()
+    yield
+    shutdown_executors()
+    prediction_cache.close()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Medicinal Plant Classifier API",
     description="CNN-based medicinal plant identification system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Oversize bodies get 413 while streaming in (added first so CORS headers still wrap it)
+app.add_middleware(UploadLimitMiddleware, limits={"/predict": SINGLE_IMAGE_REQUEST_BYTES})
+
 # Add CORS middleware for Flutter web integration
 app.add_middleware(
     CORSMiddleware,
@@ -27,16 +54,32 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=[CLASS_LIST_VERSION_HEADER, "ETag"],
 )
 
+# Outermost: request latency includes the other middleware and rejected uploads
+app.add_middleware(RequestMetricsMiddleware)
+
 # Configuration
 MODEL_PATH = "Medicinal_model.h5"
 CLASS_NAMES_PATH = "class_names.txt"
 TARGET_SIZE = (256, 256)
 
 # Global variables
+tf = None  # imported by the background loader, not at module import
 model = None
+backend = None  # set when serving from a TFLite/ONNX artifact
+serving_fn = None
 class_names = []
+model_version = None
+
+def import_tensorflow() -> float:
+    """Import TensorFlow on first use; returns the import time in ms"""
+    global tf
+    started = time.perf_counter()
+    import tensorflow
+    tf = tensorflow
+    return round((time.perf_counter() - started) * 1000.0, 1)
 
 def create_deployment_model():
     """Create a working model for deployment"""
@@ -64,7 +107,7 @@ def create_deployment_model():
         
         return model
     except Exception as e:
-        print(f"❌ Error creating model: {e}")
+        logger.error("Could not create deployment model", error=str(e))
         return None
 
 def load_trained_model():
@@ -73,23 +116,26 @@ def load_trained_model():
         # Try to load the actual trained model first
         if os.path.exists(MODEL_PATH):
             try:
-                model = tf.keras.models.load_model(MODEL_PATH, compile=False)
-                print(f"✅ Loaded trained model from {MODEL_PATH}")
-                return model
+                # Shared with any other router in this process; class list validated
+                loaded = model_registry.load(MODEL_PATH, CLASS_NAMES_PATH)
+                logger.info("Loaded trained model", path=MODEL_PATH)
+                global model_version, class_names
+                model_version = loaded.version
+                class_names = loaded.class_names
+                return loaded.model
             except Exception as e:
-                print(f"⚠️ Model loading failed: {e}")
-                print("Creating deployment model...")
+                logger.warning("Model loading failed; creating deployment model", error=str(e))
                 return create_deployment_model()
         else:
-            print(f"⚠️ Model file {MODEL_PATH} not found, creating deployment model")
+            logger.warning("Model file not found; creating deployment model", path=MODEL_PATH)
             return create_deployment_model()
     except Exception as e:
-        print(f"❌ Error in model loading: {e}")
+        logger.error("Model loading failed", error=str(e))
         return create_deployment_model()
 
-def load_model_and_classes():
-    """Load model with bulletproof error handling"""
-    global model, class_names
+def load_class_names():
+    """Load class names (cheap, done at import so /plants works immediately)"""
+    global class_names
     
     # Always load class names successfully
     try:
@@ -101,48 +147,179 @@ def load_model_and_classes():
                 'Basale', 'Betle', 'Drumstick', 'Guava', 'Jackfruit',
                 'Lemon', 'Mentha', 'Neem', 'Roxburgh fig', 'sinensis'
             ]
-        print(f"✅ Loaded {len(class_names)} classes")
+        logger.info("Loaded class names", classes=len(class_names))
     except:
         class_names = [
             'Basale', 'Betle', 'Drumstick', 'Guava', 'Jackfruit',
             'Lemon', 'Mentha', 'Neem', 'Roxburgh fig', 'sinensis'
         ]
-        print(f"✅ Using default {len(class_names)} classes")
+        logger.info("Using default class names", classes=len(class_names))
+
+def load_backend() -> bool:
+    """Serve from an exported TFLite/ONNX artifact when INFERENCE_BACKEND asks for one"""
+    global backend, serving_fn, model_version, class_names
+    try:
+        backend = create_backend(INFERENCE_BACKEND, MODEL_PATH, class_names_path=CLASS_NAMES_PATH)
+    except Exception as e:
+        logger.warning("Backend unavailable, falling back to Keras", backend=INFERENCE_BACKEND, error=str(e))
+        return False
+    serving_fn = backend.predict
+    model_version = backend.version
+    class_names = backend.class_names
+    logger.info("Serving model", path=backend.path, backend=backend.name, threads=backend.num_threads or "default")
+    return True
+
+def load_model_and_classes() -> Dict:
+    """Load model with bulletproof error handling; runs on the background loader"""
+    global model
+    
+    if not class_names:
+        load_class_names()
+    
+    # TFLite/ONNX don't need TensorFlow's Keras runtime at all
+    if INFERENCE_BACKEND != "keras" and load_backend():
+        return {"backend": backend.name}
+    
+    tf_import_ms = import_tensorflow()
     
     # Load model with fallback
     model = load_trained_model()
     
     if model is None:
-        print("❌ Creating emergency model...")
+        logger.error("No model could be loaded; creating emergency model")
         model = tf.keras.Sequential([
             tf.keras.layers.Input(shape=(*TARGET_SIZE, 3)),
             tf.keras.layers.GlobalAveragePooling2D(),
             tf.keras.layers.Dense(len(class_names), activation='softmax')
         ])
-        print("✅ Emergency model created")
     
-    print(f"Model input shape: {model.input_shape}")
-    print(f"Model output shape: {model.output_shape}")
+    global model_version
+    if model_version is None:
+        # Untrained fallback weights must never be served from the persistent cache
+        model_version = f"untrained-{os.urandom(4).hex()}"
+    
+    global serving_fn
+    serving_fn = make_serving_fn(model)
+    
+    logger.info("Model shapes", input_shape=model.input_shape, output_shape=model.output_shape)
+    return {"backend": "keras", "tf_import_ms": tf_import_ms, "serving_mode": SERVING_MODE}
+
+def model_shapes():
+    """(input_shape, output_shape) of whatever is serving predictions"""
+    source = backend if backend is not None else model
+    return tuple(source.input_shape), tuple(source.output_shape)
+
+def warm_up_model() -> Dict:
+    """Trace every configured batch shape so no user request pays for it"""
+    return warm_up(serving_fn, model_shapes()[0])
+
+# Class names load now; the model loads in the background (see lifespan)
+load_class_names()
+model_lifecycle = ModelLifecycle("Plant classifier", load_model_and_classes, warm_up_model)
+
+def run_model(batch: np.ndarray) -> np.ndarray:
+    """Run one forward pass over a batch of preprocessed images"""
+    return serving_fn(batch)
+
+# Concurrent /predict requests share a single model call
+batch_scheduler = BatchScheduler(run_model, name="predict")
 
-# Load model on startup - now error-free
-load_model_and_classes()
+def build_prediction_payload(probabilities: np.ndarray) -> Dict:
+    """Cacheable part of a prediction: top class and all class probabilities (by index)"""
+    predicted_index = int(np.argmax(probabilities))
+    return {
+        "predicted_index": predicted_index,
+        "confidence": float(probabilities[predicted_index]),
+        "probabilities": probability_list(probabilities),
+    }
+
+async def predict_payload(image_bytes: bytes) -> Dict:
+    """Prediction payload for an upload, served from the cache when possible"""
+    raw_key = content_key(image_bytes, model_version)
+    payload = await prediction_cache.get(raw_key)
+    if payload is not None:
+        return payload
+    
+    pixels = await preprocess_image_async(image_bytes)
+    
+    # Same pixels under different bytes (e.g. re-encoded EXIF) share a tensor entry
+    pixel_key = tensor_key(pixels, model_version) if CACHE_TENSOR_TIER else None
+    payload = await prediction_cache.get(pixel_key) if pixel_key else None
+    if payload is None:
+        # Make prediction (batched with concurrent requests)
+        probabilities = await batch_scheduler.submit(pixels)
+        payload = build_prediction_payload(probabilities)
+        if pixel_key:
+            prediction_cache.put(pixel_key, payload)
+    
+    prediction_cache.put(raw_key, payload)
+    return payload
 
 def preprocess_image(image_bytes: bytes) -> np.ndarray:
     """Preprocess image for model input"""
     try:
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        image = image.resize(TARGET_SIZE, Image.Resampling.LANCZOS)
-        img_array = np.array(image, dtype=np.float32)
-        img_array = img_array / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        return img_array
+        return normalize(decode_image(image_bytes, TARGET_SIZE))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Image preprocessing failed: {str(e)}")
 
+async def preprocess_image_async(image_bytes: bytes) -> np.ndarray:
+    """Decode and resize on the preprocessing pool; returns uint8 pixels that
+    the batch scheduler normalises straight into its input buffer"""
+    try:
+        pixels, decode_ms, resize_ms = await preprocess_executor.run(decode_image_timed, image_bytes, TARGET_SIZE)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Image preprocessing failed: {str(e)}")
+    stage_ms["decode"].observe(decode_ms)
+    stage_ms["resize"].observe(resize_ms)
+    return pixels
+
+LOW_CONFIDENCE_WARNING = "Low confidence prediction. This plant may not be in our trained database. NEVER use unidentified plants for medical purposes."
+MEDICAL_DISCLAIMER = "MEDICAL DISCLAIMER: This is AI prediction only. Always consult healthcare professionals before using any plant medicinally."
+SAFETY_NOTE = "Never consume unknown plants. Misidentification can be dangerous or fatal."
+MODEL_INFO = {
+    "input_size": TARGET_SIZE,
+    "preprocessing": "RGB conversion, resize to 256x256, normalize by /255.0"
+}
+
+# The same trailing members on every /predict response, encoded once per warning
+RESPONSE_TAILS = {
+    warning: fragment(medical_warning=warning, safety_note=SAFETY_NOTE, model_info=MODEL_INFO)
+    for warning in (LOW_CONFIDENCE_WARNING, MEDICAL_DISCLAIMER)
+}
+COMPACT_TAILS = {
+    warning: fragment(medical_warning=warning)
+    for warning in (LOW_CONFIDENCE_WARNING, MEDICAL_DISCLAIMER)
+}
+
+def interpret_prediction(payload: Dict) -> tuple:
+    """Map a payload to (predicted_class, medical_warning) with safety thresholds"""
+    predicted_index = payload["predicted_index"]
+    
+    # Map index to class name
+    if predicted_index < len(class_names):
+        predicted_class = class_names[predicted_index]
+    else:
+        raise HTTPException(status_code=500, detail="Invalid prediction index")
+    
+    # Medical safety check with proper thresholds
+    if payload["confidence"] < 0.5:
+        predicted_class = "OUT OF SCOPE - Not a recognized medicinal plant"
+        warning = LOW_CONFIDENCE_WARNING
+    else:
+        warning = MEDICAL_DISCLAIMER
+    return predicted_class, warning
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape target: stage latencies, predictions by class, caches, queues"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check() -> Dict[str, str]:
     """Health check endpoint"""
-    return {"status": "healthy"}
+    return {"status": "healthy", "model_state": model_lifecycle.state.value}
 
 @app.options("/predict")
 async def predict_options():
@@ -152,76 +329,128 @@ async def predict_options():
 @app.get("/model/info")
 async def get_model_info() -> Dict:
     """Get model information"""
+    if not model_lifecycle.is_ready:
+        raise HTTPException(status_code=503, detail=f"Model is {model_lifecycle.state.value}")
     return {
         "model_path": MODEL_PATH,
         "input_size": TARGET_SIZE,
         "num_classes": len(class_names),
-        "model_input_shape": list(model.input_shape),
-        "model_output_shape": list(model.output_shape),
+        "backend": backend.name if backend is not None else "keras",
+        "model_input_shape": list(model_shapes()[0]),
+        "model_output_shape": list(model_shapes()[1]),
         "preprocessing": "RGB conversion, resize to 256x256, normalize by /255.0"
     }
 
+@app.get("/model/status")
+async def get_model_status() -> Dict:
+    """Readiness state and cold-start timings (TF import, load, warm-up)"""
+    return model_lifecycle.status()
+
+@app.get("/model/registry")
+async def get_loaded_models() -> List[Dict]:
+    """Model artifacts loaded in this process with their validated class lists"""
+    return model_registry.models()
+
+@app.get("/model/batching")
+async def get_batching_stats() -> Dict:
+    """Batch-size and queue-wait histograms of the inference scheduler"""
+    return batch_scheduler.stats()
+
+@app.get("/model/executors")
+async def get_executor_stats() -> Dict:
+    """In-flight and rejected jobs of the preprocessing and inference pools"""
+    return executor_stats()
+
+@app.get("/model/cache")
+async def get_cache_stats() -> Dict:
+    """Prediction cache size and hit/miss counters"""
+    return {"model_version": model_version, **prediction_cache.stats()}
+
 @app.get("/plants")
-async def list_plants() -> List[str]:
-    """List all plant classes"""
-    return class_names
+async def list_plants(request: Request) -> List[str]:
+    """List all plant classes (ETag / X-Class-List-Version: the compact /predict version)"""
+    return encoder_for(class_names).class_list_response(request)
 
 @app.post("/predict")
-async def predict_plant(file: UploadFile = File(...)) -> Dict:
+async def predict_plant(
+    file: UploadFile = File(...),
+    top_k: Optional[int] = Query(None, ge=1, description="Only the k most likely classes"),
+    compact: bool = Query(False, description="Probabilities as an array aligned with /plants")
+) -> Dict:
     """Predict medicinal plant from uploaded image"""
     
-    # Validate file type
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(
-            status_code=400, 
-            detail="Invalid file type. Please upload a JPG or PNG image."
-        )
+    # Validate by size and image header (not the client's content type)
+    await check_upload(file)
+    
+    await model_lifecycle.wait_ready()
     
     try:
-        # Read and preprocess image
+        # Read image and predict (cached by content digest)
+        started = time.perf_counter()
         image_bytes = await file.read()
-        processed_image = preprocess_image(image_bytes)
-        
-        # Make prediction
-        predictions = model.predict(processed_image, verbose=0)
+        stage_ms["upload_read"].observe(elapsed_ms(started))
+        payload = await predict_payload(image_bytes)
         
         # Get predicted class and confidence
-        predicted_index = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_index])
-        
-        # Map index to class name
-        if predicted_index < len(class_names):
-            predicted_class = class_names[predicted_index]
-        else:
-            raise HTTPException(status_code=500, detail="Invalid prediction index")
+        confidence = payload["confidence"]
+        predicted_class, warning = interpret_prediction(payload)
+        record_prediction(predicted_class, confidence)
         
-        # Medical safety check with proper thresholds
-        if confidence < 0.5:
-            predicted_class = "OUT OF SCOPE - Not a recognized medicinal plant"
-            warning = "Low confidence prediction. This plant may not be in our trained database. NEVER use unidentified plants for medical purposes."
+        started = time.perf_counter()
+        encoder = encoder_for(class_names)
+        if compact:
+            body = {"predicted_class": predicted_class, "confidence": round(confidence, 4),
+                    "predicted_index": payload["predicted_index"],
+                    **encoder.compact(payload["probabilities"], top_k)}
+            response = JSONBytes(encode(body, COMPACT_TAILS[warning]), headers=encoder.headers)
         else:
-            warning = "MEDICAL DISCLAIMER: This is AI prediction only. Always consult healthcare professionals before using any plant medicinally."
-        
-        # Get all class probabilities
-        all_predictions = {}
-        for i, class_name in enumerate(class_names):
-            all_predictions[class_name] = round(float(predictions[0][i]), 4)
-        
-        return {
-            "predicted_class": predicted_class,
-            "confidence": round(confidence, 4),
-            "all_predictions": all_predictions,
-            "medical_warning": warning,
-            "safety_note": "Never consume unknown plants. Misidentification can be dangerous or fatal.",
-            "model_info": {
-                "input_size": TARGET_SIZE,
-                "preprocessing": "RGB conversion, resize to 256x256, normalize by /255.0"
+            body = {
+                "predicted_class": predicted_class,
+                "confidence": round(confidence, 4),
+                "all_predictions": encoder.all_predictions(payload["probabilities"], top_k),
             }
-        }
+            response = JSONBytes(encode(body, RESPONSE_TAILS[warning]))
+        stage_ms["serialize"].observe(elapsed_ms(started))
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/predict/batch")
+async def predict_plant_batch(files: List[UploadFile] = File(...)):
+    """Predict many images (or a zip/tar of images) in one request.
+    
+    Streams one NDJSON line per image in upload order; each chunk of up to
+    PREDICT_BATCH_CHUNK images is decoded in parallel and run as one batch.
+    """
+    await model_lifecycle.wait_ready()
+    images = await collect_images(files)
+    
+    async def stream():
+        for start in range(0, len(images), PREDICT_BATCH_CHUNK):
+            chunk = images[start:start + PREDICT_BATCH_CHUNK]
+            results = await predict_many(
+                chunk, model_version, preprocess_image_async, run_model, build_prediction_payload
+            )
+            for offset, ((filename, _), result) in enumerate(zip(chunk, results)):
+                line = {"index": start + offset, "filename": filename}
+                if isinstance(result, Exception):
+                    line["error"] = error_detail(result)
+                else:
+                    predicted_class, warning = interpret_prediction(result)
+                    record_prediction(predicted_class, result["confidence"])
+                    line.update({
+                        "predicted_class": predicted_class,
+                        "confidence": round(result["confidence"], 4),
+                        "all_predictions": encoder_for(class_names).all_predictions(result["probabilities"]),
+                        "medical_warning": warning,
+                    })
+                yield ndjson(line)
+    
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
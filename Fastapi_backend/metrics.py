@@ -0,0 +1,308 @@
+"""
+Lightweight in-process metrics for the LeafSense API
+Histograms, counters and gauges shared by the inference and database layers, exported at /metrics
+"""
+
+import bisect
+import math
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default buckets in milliseconds, tuned for image inference latencies
+DEFAULT_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Per-stage timings are mostly sub-millisecond (reads, resizes, serialization)
+STAGE_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+# Top-1 confidence of served predictions
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99)
+
+# Request methods labelled as themselves; anything else is "OTHER"
+HTTP_METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative bucket histogram (Prometheus style)"""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float], labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = count
+
+        return {
+            "count": count,
+            "sum": round(total, 4),
+            "mean": round(total / count, 4) if count else 0.0,
+            "buckets": buckets,
+        }
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            samples.append(("_bucket", self.labels + (("le", _number(bound)),), cumulative))
+        samples.append(("_bucket", self.labels + (("le", "+Inf"),), count))
+        samples.append(("_sum", self.labels, total))
+        samples.append(("_count", self.labels, count))
+        return samples
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self, name: str, description: str, labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        return [("", self.labels, self._value)]
+
+
+class Gauge:
+    """Current value read from ``fn`` at scrape time (queue depths, pool usage)"""
+
+    def __init__(self, name: str, description: str, fn: Callable[[], Optional[float]], labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.fn = fn
+
+    @property
+    def value(self) -> Optional[float]:
+        try:
+            return self.fn()
+        except Exception:
+            return None
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        value = self.value
+        return [] if value is None else [("", self.labels, value)]
+
+
+PROMETHEUS_TYPES = {Histogram: "histogram", Counter: "counter", Gauge: "gauge"}
+
+
+class MetricsRegistry:
+    """Process-wide collection of named metrics.
+
+    A name plus ``labels`` identifies one series; asking again returns the
+    same object, so modules can look metrics up wherever they need them.
+    Registering a gauge again replaces its callback (a recreated queue).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Labels], object] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, description: str = "",
+                  buckets: Optional[Sequence[float]] = None,
+                  labels: Optional[Dict[str, str]] = None) -> Histogram:
+        key = (name, _labels(labels))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = Histogram(name, description, buckets or DEFAULT_LATENCY_BUCKETS_MS, key[1])
+                self._metrics[key] = metric
+            return metric
+
+    def counter(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None) -> Counter:
+        key = (name, _labels(labels))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = Counter(name, description, key[1])
+                self._metrics[key] = metric
+            return metric
+
+    def gauge(self, name: str, description: str, fn: Callable[[], Optional[float]],
+              labels: Optional[Dict[str, str]] = None) -> Gauge:
+        key = (name, _labels(labels))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = Gauge(name, description, fn, key[1])
+                self._metrics[key] = metric
+            else:
+                metric.fn = fn
+            return metric
+
+    def remove(self, name: str, labels: Optional[Dict[str, str]] = None) -> None:
+        """Drop a series, e.g. the gauge of a closed queue so it can be garbage collected"""
+        with self._lock:
+            self._metrics.pop((name, _labels(labels)), None)
+
+    def all(self) -> List[object]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text format, series of one name grouped"""
+        families: Dict[str, List[object]] = {}
+        for metric in self.all():
+            families.setdefault(_metric_name(metric.name), []).append(metric)
+
+        lines = []
+        for name in sorted(families):
+            metrics = families[name]
+            lines.append(f"# HELP {name} {_escape_help(metrics[0].description)}")
+            lines.append(f"# TYPE {name} {PROMETHEUS_TYPES[type(metrics[0])]}")
+            for metric in metrics:
+                for suffix, labels, value in metric.samples():
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items())) if labels else ()
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer() and abs(value) < 1e15):
+        return str(int(value))
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+# Where a /predict request spends its time. decode/resize/serialize are per
+# image or response; normalize and inference are per model call (a batch)
+STAGES = ("upload_read", "decode", "resize", "normalize", "inference", "db_write", "serialize")
+stage_ms = {
+    stage: registry.histogram("predict_stage_ms", "Time spent in each /predict stage (ms)",
+                              STAGE_BUCKETS_MS, {"stage": stage})
+    for stage in STAGES
+}
+prediction_confidence = registry.histogram(
+    "prediction_confidence", "Top-1 confidence of served predictions", CONFIDENCE_BUCKETS
+)
+_class_counters: Dict[str, Counter] = {}
+
+
+def elapsed_ms(started: float) -> float:
+    """Milliseconds since a ``time.perf_counter()`` reading"""
+    return (time.perf_counter() - started) * 1000.0
+
+
+def record_prediction(predicted_class: str, confidence: float) -> None:
+    """Count a served prediction by class and confidence bucket"""
+    counter = _class_counters.get(predicted_class)
+    if counter is None:
+        counter = _class_counters[predicted_class] = registry.counter(
+            "predictions_total", "Served predictions by predicted class", {"class": predicted_class}
+        )
+    counter.inc()
+    prediction_confidence.observe(confidence)
+
+
+
+class RequestMetricsMiddleware:
+    """Per-route request latency and status counts (plain ASGI, so it adds no task hops).
+
+    Series are keyed by the matched route template, not the raw path, so
+    ids in URLs do not create new series; unrouted paths share "other".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._responses: Dict[Tuple[str, str, int], Counter] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "other")
+            method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+            self._record(method, route, status, elapsed_ms(started))
+
+    def _record(self, method: str, route: str, status: int, duration_ms: float) -> None:
+        histogram = self._latency.get((method, route))
+        if histogram is None:
+            histogram = self._latency[(method, route)] = registry.histogram(
+                "http_request_ms", "Request time to the last response byte (ms)",
+                labels={"method": method, "route": route},
+            )
+        histogram.observe(duration_ms)
+        counter = self._responses.get((method, route, status))
+        if counter is None:
+            counter = self._responses[(method, route, status)] = registry.counter(
+                "http_responses_total", "Responses by route and status",
+                {"method": method, "route": route, "status": status},
+            )
+        counter.inc()
@@ -1,10 +1,35 @@
 #!/usr/bin/env python3
 """
-Database migration script to add hidden_from_user column
+Database migration script to add hidden_from_user, updated_at, uid, thumbnail_url and model_version columns
+and the indexes used by keyset pagination, the change feed and the prediction log
 """
 import sqlite3
 import os
 
+# Mirrors the Index entries in models.py for databases created before them
+PAGINATION_INDEXES = [
+    ("ix_feedback_timestamp_id", "feedback", "timestamp, id"),
+    ("ix_feedback_user_timestamp_id", "feedback", "user_id, timestamp, id"),
+    ("ix_predictions_timestamp_id", "predictions", "timestamp, id"),
+    ("ix_predictions_user_timestamp_id", "predictions", "user_id, timestamp, id"),
+    ("ix_predictions_result_timestamp_id", "predictions", "prediction_result, timestamp, id"),
+    ("ix_predictions_version_timestamp_id", "predictions", "model_version, timestamp, id"),
+    ("ix_appointments_timestamp_id", "appointments", "timestamp, id"),
+    ("ix_appointments_status_timestamp_id", "appointments", "status, timestamp, id"),
+    ("ix_appointments_user_timestamp_id", "appointments", "user_id, timestamp, id"),
+]
+
+# Change feed: tables that gained updated_at, and the (updated_at, id) walks
+SYNC_COLUMNS = ["feedback", "appointments"]
+SYNC_INDEXES = [
+    ("ix_feedback_updated_at_id", "feedback", "updated_at, id"),
+    ("ix_appointments_updated_at_id", "appointments", "updated_at, id"),
+    ("ix_user_profiles_updated_at_id", "user_profiles", "updated_at, id"),
+]
+
+# Write-behind prediction log: client-generated ids, unique for idempotent replays
+PREDICTION_UID_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS ix_predictions_uid ON predictions (uid)"
+
 def migrate_database():
     db_path = "leafsense.db"
     
@@ -28,6 +53,39 @@ def migrate_database():
         else:
             print("Column hidden_from_user already exists!")
         
+        for table in SYNC_COLUMNS:
+            cursor.execute(f"PRAGMA table_info({table})")
+            if 'updated_at' not in [column[1] for column in cursor.fetchall()]:
+                # SQLite cannot add a column with a CURRENT_TIMESTAMP default;
+                # existing rows start from their creation time instead
+                print(f"Adding updated_at column to {table} table...")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_at DATETIME")
+                cursor.execute(f"UPDATE {table} SET updated_at = timestamp WHERE updated_at IS NULL")
+        conn.commit()
+        
+        cursor.execute("PRAGMA table_info(predictions)")
+        prediction_columns = [column[1] for column in cursor.fetchall()]
+        if prediction_columns and 'uid' not in prediction_columns:
+            print("Adding uid column to predictions table...")
+            cursor.execute("ALTER TABLE predictions ADD COLUMN uid VARCHAR(36)")
+        if prediction_columns and 'thumbnail_url' not in prediction_columns:
+            print("Adding thumbnail_url column to predictions table...")
+            cursor.execute("ALTER TABLE predictions ADD COLUMN thumbnail_url VARCHAR")
+        if prediction_columns and 'model_version' not in prediction_columns:
+            print("Adding model_version column to predictions table...")
+            cursor.execute("ALTER TABLE predictions ADD COLUMN model_version VARCHAR(64)")
+        if prediction_columns:
+            cursor.execute(PREDICTION_UID_INDEX)
+        conn.commit()
+        
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        indexes = [index for index in PAGINATION_INDEXES + SYNC_INDEXES if index[1] in tables]
+        for name, table, columns in indexes:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        conn.commit()
+        print(f"Ensured {len(indexes)} pagination and change feed indexes")
+        
         conn.close()
         
     except Exception as e:
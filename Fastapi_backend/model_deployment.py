@@ -0,0 +1,271 @@
+"""
+Hot-swappable model versions for the prediction router
+New versions load and warm in the background; traffic switches atomically, with optional canary or shadow splits
+"""
+
+import asyncio
+import os
+import random
+import time
+import zlib
+from typing import Dict, Optional
+
+import numpy as np
+from fastapi import HTTPException
+
+from batching import BatchScheduler
+from inference_backends import INFERENCE_BACKEND, InferenceBackend, create_backend
+from logs import get_logger
+from metrics import registry
+from model_lifecycle import ModelLifecycle, ModelState
+from model_registry import model_registry
+
+logger = get_logger(__name__)
+
+# Admin loads must resolve to a file inside this directory
+MODEL_DIR = os.getenv("MODEL_DIR", ".")
+
+# off: the active version serves everything; canary: the candidate serves
+# ``percent`` of users; shadow: it also runs on ``percent`` of requests, unseen
+TRAFFIC_MODES = ("off", "canary", "shadow")
+
+# Per-version series of ServingModel, labelled {version=<digest>}
+VERSION_METRICS = ("model_predict_ms", "model_served_total", "model_confidence_sum",
+                   "model_shadow_total", "model_shadow_agree_total", "model_shadow_failed_total")
+
+
+class ServingModel:
+    """One loaded version: its backend, its own batch scheduler and per-version metrics"""
+
+    def __init__(self, backend: InferenceBackend, scheduler_name: str):
+        self.backend = backend
+        self.version = backend.version
+        self.path = backend.path
+        self.class_names = backend.class_names
+        self.loaded_at = time.time()
+        # One series per version in each family, dropped again when the version is retired
+        self.labels = {"version": self.version}
+        # Batches never mix versions
+        self.scheduler = BatchScheduler(backend.predict, name=scheduler_name, labels=self.labels)
+        self.predict_histogram = registry.histogram("model_predict_ms", "Queue wait plus inference (ms)",
+                                                    labels=self.labels)
+        self.served = registry.counter("model_served_total", "Predictions served by this version",
+                                       labels=self.labels)
+        self.confidence_total = registry.counter("model_confidence_sum", "Sum of served top-1 confidences",
+                                                 labels=self.labels)
+        self.shadow_runs = registry.counter("model_shadow_total", "Shadow predictions run", labels=self.labels)
+        self.shadow_agreements = registry.counter("model_shadow_agree_total", "Shadow top-1 equal to served",
+                                                  labels=self.labels)
+        self.shadow_failures = registry.counter("model_shadow_failed_total", "Shadow predictions that failed",
+                                                labels=self.labels)
+
+    async def predict(self, pixels: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        probabilities = await self.scheduler.submit(pixels)
+        self.predict_histogram.observe((time.perf_counter() - started) * 1000.0)
+        return probabilities
+
+    def record_served(self, confidence: float, count: int = 1) -> None:
+        self.served.inc(count)
+        self.confidence_total.inc(confidence)
+
+    async def close(self) -> None:
+        """Release the version once no request can reach it and those already queued are answered"""
+        self.scheduler.close()
+        await self.scheduler.drained()
+        for name in VERSION_METRICS:
+            registry.remove(name, self.labels)
+        if self.backend.name == "keras":
+            model_registry.unload(self.path, self.version)
+
+    def stats(self) -> Dict:
+        served = int(self.served.value)
+        shadow_runs = int(self.shadow_runs.value)
+        return {
+            "version": self.version,
+            "path": self.path,
+            "backend": self.backend.name,
+            "num_classes": len(self.class_names),
+            "loaded_at": self.loaded_at,
+            "served": served,
+            "mean_confidence": round(self.confidence_total.value / served, 4) if served else None,
+            "predict_ms": self.predict_histogram.snapshot(),
+            "shadow": {
+                "runs": shadow_runs,
+                "agreement": round(self.shadow_agreements.value / shadow_runs, 4) if shadow_runs else None,
+                "failed": int(self.shadow_failures.value),
+            },
+            "batching": self.scheduler.stats(),
+        }
+
+
+def resolve_model_path(path: str, model_dir: str = MODEL_DIR) -> str:
+    """``path`` (relative to ``model_dir``) if it is an existing file inside it; 400/404 otherwise"""
+    root = os.path.realpath(model_dir)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail=f"{path} is outside MODEL_DIR")
+    if not os.path.isfile(resolved):
+        raise HTTPException(status_code=404, detail=f"Model file {path} not found")
+    return resolved
+
+
+class ModelDeployment:
+    """The active version, an optional candidate and the previous version for rollback.
+
+    ``stage`` loads and warms a candidate on a ModelLifecycle without
+    touching live traffic. Every switch (``promote``, ``rollback``,
+    ``set_traffic``) is a reference swap on the event loop, so a request
+    is served start to finish by the version ``route`` picked for it.
+    Canary and shadow samples are keyed by user, so a user consistently
+    sees one version while the split is unchanged.
+    """
+
+    def __init__(self, scheduler_name: str = "api_predict", backend_name: str = INFERENCE_BACKEND):
+        self.scheduler_name = scheduler_name
+        self.backend_name = backend_name
+        self.active: Optional[ServingModel] = None
+        self.candidate: Optional[ServingModel] = None
+        self.previous: Optional[ServingModel] = None
+        self.mode = "off"
+        self.percent = 0.0
+        self.staging: Optional[ModelLifecycle] = None
+        self._staging_task: Optional[asyncio.Task] = None
+        self._shadow_tasks = set()
+        self._closing_tasks = set()
+
+    def activate(self, backend: InferenceBackend) -> ServingModel:
+        """Serve ``backend`` as the active version (startup load)"""
+        self.active = ServingModel(backend, self.scheduler_name)
+        return self.active
+
+    # ------------------------------------------------------------ routing
+
+    def _sampled(self, key: Optional[str]) -> bool:
+        if self.percent <= 0:
+            return False
+        if key is None:
+            return random.random() * 100.0 < self.percent
+        return zlib.crc32(key.encode("utf-8")) % 10000 < self.percent * 100
+
+    def route(self, key: Optional[str] = None) -> ServingModel:
+        """Version that serves a request from ``key`` (a user id)"""
+        candidate = self.candidate
+        if candidate is not None and self.mode == "canary" and self._sampled(key):
+            return candidate
+        return self.active
+
+    def shadow_for(self, key: Optional[str] = None) -> Optional[ServingModel]:
+        """Candidate to run alongside the served version, if this request is sampled"""
+        candidate = self.candidate
+        if candidate is not None and self.mode == "shadow" and self._sampled(key):
+            return candidate
+        return None
+
+    def run_shadow(self, shadow: ServingModel, predict, served_class: str) -> None:
+        """Run ``predict(shadow)`` in the background and compare its top-1 class with the served one"""
+        async def run():
+            try:
+                payload = await predict(shadow)
+            except Exception:
+                shadow.shadow_failures.inc()
+                return
+            shadow.shadow_runs.inc()
+            if shadow.class_names[payload["predicted_index"]] == served_class:
+                shadow.shadow_agreements.inc()
+
+        task = asyncio.get_running_loop().create_task(run())
+        # Held until done so the task is not garbage collected mid-run
+        self._shadow_tasks.add(task)
+        task.add_done_callback(self._shadow_tasks.discard)
+
+    def get(self, version: str) -> Optional[ServingModel]:
+        """A loaded version (active, candidate or previous) by its digest"""
+        for model in (self.active, self.candidate, self.previous):
+            if model is not None and model.version == version:
+                return model
+        return None
+
+    # ------------------------------------------------------------ control
+
+    def stage(self, path: str, backend_name: Optional[str] = None,
+              mode: str = "off", percent: float = 0.0) -> ModelLifecycle:
+        """Load and warm ``path`` in the background; it becomes the candidate when ready"""
+        if self.staging is not None and self.staging.state in (ModelState.pending, ModelState.loading,
+                                                               ModelState.warming):
+            raise HTTPException(status_code=409, detail="Another model version is still loading")
+        backend_name = (backend_name or self.backend_name).lower()
+        if backend_name == "worker":
+            raise HTTPException(status_code=409,
+                                detail="The inference worker owns its model; restart it to change versions")
+        loaded: Dict[str, ServingModel] = {}
+
+        def load():
+            if backend_name == "keras":
+                backend = create_backend("keras", path)
+            else:
+                backend = create_backend(backend_name, path, artifact_path=path)
+            if self.active is not None and backend.version == self.active.version:
+                raise RuntimeError(f"version {backend.version} is already active")
+            loaded["model"] = ServingModel(backend, self.scheduler_name)
+            return {"version": backend.version, "backend": backend.name}
+
+        def warm_up():
+            return loaded["model"].backend.warm_up()
+
+        self.staging = ModelLifecycle(f"Model {os.path.basename(path)}", load, warm_up)
+        self._staging_task = asyncio.get_running_loop().create_task(self._install(self.staging, loaded, mode, percent))
+        return self.staging
+
+    async def _install(self, lifecycle: ModelLifecycle, loaded: Dict, mode: str, percent: float) -> None:
+        await lifecycle.start()
+        if lifecycle.is_ready:
+            replaced, self.candidate = self.candidate, loaded["model"]
+            self.mode, self.percent = mode, percent
+            self._retire(replaced)
+
+    def set_traffic(self, mode: str, percent: float) -> None:
+        if mode != "off" and self.candidate is None:
+            raise HTTPException(status_code=409, detail="No candidate version loaded")
+        self.mode, self.percent = mode, percent
+
+    def promote(self) -> ServingModel:
+        """Candidate becomes active for all traffic; the old active is kept for rollback"""
+        if self.candidate is None:
+            raise HTTPException(status_code=409, detail="No candidate version loaded")
+        replaced = self.previous
+        self.previous, self.active, self.candidate = self.active, self.candidate, None
+        self.mode, self.percent = "off", 0.0
+        self._retire(replaced)
+        logger.info("Promoted model version", version=self.active.version, previous=self.previous.version)
+        return self.active
+
+    def rollback(self) -> ServingModel:
+        """Swap the previous version back in"""
+        if self.previous is None:
+            raise HTTPException(status_code=409, detail="No previous version to roll back to")
+        self.active, self.previous = self.previous, self.active
+        logger.warning("Rolled back model version", version=self.active.version, previous=self.previous.version)
+        return self.active
+
+    def discard(self) -> None:
+        """Drop the candidate"""
+        candidate, self.candidate = self.candidate, None
+        self.mode, self.percent = "off", 0.0
+        self._retire(candidate)
+
+    def _retire(self, model: Optional[ServingModel]) -> None:
+        if model is not None and model not in (self.active, self.candidate, self.previous):
+            # Drains in the background: canary requests already queued on it still complete
+            task = asyncio.get_running_loop().create_task(model.close())
+            self._closing_tasks.add(task)
+            task.add_done_callback(self._closing_tasks.discard)
+
+    def status(self) -> Dict:
+        return {
+            "active": self.active.stats() if self.active else None,
+            "candidate": self.candidate.stats() if self.candidate else None,
+            "previous": self.previous.stats() if self.previous else None,
+            "traffic": {"mode": self.mode, "percent": self.percent},
+            "staging": self.staging.status() if self.staging else None,
+        }
@@ -0,0 +1,118 @@
+"""
+Background model loading with a readiness state machine
+Lets the API serve /health and the database routes while TensorFlow loads
+"""
+
+import asyncio
+import enum
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds /predict waits for a loading model before answering 503
+MODEL_READY_TIMEOUT = float(os.getenv("MODEL_READY_TIMEOUT", "30"))
+
+# Close enough to process start for cold-start reporting: imported before TF
+PROCESS_START = time.time()
+
+
+class ModelState(str, enum.Enum):
+    pending = "pending"
+    loading = "loading"
+    warming = "warming"
+    ready = "ready"
+    failed = "failed"
+
+
+class ModelLifecycle:
+    """Runs ``load_fn`` then ``warmup_fn`` off the event loop and tracks state.
+
+    Both may return a dict of extra timings (e.g. TF import time, per
+    batch-size warm-up cost) which is merged into :meth:`status`.
+    """
+
+    def __init__(self, name: str, load_fn: Callable[[], Optional[Dict]],
+                 warmup_fn: Optional[Callable[[], Optional[Dict]]] = None):
+        self.name = name
+        self.load_fn = load_fn
+        self.warmup_fn = warmup_fn
+        self.state = ModelState.pending
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == ModelState.ready
+
+    def start(self) -> asyncio.Task:
+        """Schedule loading on the running loop (idempotent)"""
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        started = time.time()
+        self.timings["load_started_after_ms"] = round((started - PROCESS_START) * 1000.0, 1)
+        try:
+            self.state = ModelState.loading
+            details = await loop.run_in_executor(None, self.load_fn)
+            self.timings["load_ms"] = round((time.time() - started) * 1000.0, 1)
+            if details:
+                self.timings.update(details)
+
+            if self.warmup_fn is not None:
+                self.state = ModelState.warming
+                warm_started = time.time()
+                details = await loop.run_in_executor(None, self.warmup_fn)
+                self.timings["warmup_ms"] = round((time.time() - warm_started) * 1000.0, 1)
+                if details:
+                    self.timings.update(details)
+
+            self.state = ModelState.ready
+            self.timings["cold_start_ms"] = round((time.time() - PROCESS_START) * 1000.0, 1)
+            logger.info("Model ready", model=self.name, cold_start_ms=self.timings["cold_start_ms"])
+        except Exception as e:
+            self.state = ModelState.failed
+            self.error = str(e)
+            logger.error("Model failed to load", model=self.name, error=str(e))
+        finally:
+            self._ready.set()
+
+    async def wait_ready(self, timeout: float = MODEL_READY_TIMEOUT) -> None:
+        """Block until ready, or raise 503 if loading fails or takes too long"""
+        if self.state == ModelState.ready:
+            return
+        if self.state == ModelState.failed:
+            raise HTTPException(status_code=503, detail=f"Model unavailable: {self.error}")
+        if self._ready is None:
+            raise HTTPException(status_code=503, detail="Model loading has not started")
+
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready.wait()), timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Model is still {self.state.value}, please retry shortly",
+                headers={"Retry-After": "5"},
+            )
+        if self.state != ModelState.ready:
+            raise HTTPException(status_code=503, detail=f"Model unavailable: {self.error}")
+
+    def status(self) -> Dict:
+        return {
+            "name": self.name,
+            "state": self.state.value,
+            "error": self.error,
+            "uptime_ms": round((time.time() - PROCESS_START) * 1000.0, 1),
+            "timings": dict(self.timings),
+        }
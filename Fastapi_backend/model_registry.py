@@ -0,0 +1,201 @@
+"""
+Process-wide registry of loaded model artifacts
+Each model file is loaded once per process and shared by every router
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from logs import get_logger
+from prediction_cache import file_digest
+
+logger = get_logger(__name__)
+
+# "call" serves through a traced tf.function of model(x, training=False);
+# "predict" keeps Keras model.predict (slower per call, no tracing up front)
+SERVING_MODE = os.getenv("SERVING_MODE", "call").lower()
+# Batch shapes run once at startup so no user request pays for first-call setup
+WARMUP_BATCH_SIZES = [int(size) for size in os.getenv("WARMUP_BATCH_SIZES", "1,2,4,8").split(",") if size.strip()]
+
+# Order the model was trained with (image_dataset_from_directory sorts folders)
+DEFAULT_CLASS_NAMES = [
+    'Basale', 'Betle', 'Drumstick', 'Guava', 'Jackfruit',
+    'Lemon', 'Mentha', 'Neem', 'Roxburgh fig', 'sinensis'
+]
+
+
+class ModelLoadError(Exception):
+    """The artifact could not be loaded or does not match its class list"""
+
+
+def read_class_names(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def resolve_class_names_path(model_path: str, class_names_path: Optional[str] = None) -> Optional[str]:
+    """Class list for an artifact: explicit path, then ``<model>.classes.txt``,
+    then ``class_names.txt`` next to the model"""
+    candidates = []
+    if class_names_path:
+        candidates.append(class_names_path)
+    stem, _ = os.path.splitext(model_path)
+    candidates.append(f"{stem}.classes.txt")
+    candidates.append(os.path.join(os.path.dirname(model_path), "class_names.txt"))
+
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def make_serving_fn(model, mode: str = SERVING_MODE) -> Callable[[np.ndarray], np.ndarray]:
+    """Batch -> probabilities callable for ``model``.
+
+    In "call" mode the forward pass is a tf.function with a fixed
+    ``(None, H, W, C)`` float32 signature, so it is traced once and reused
+    for every batch size instead of retracing per shape.
+    """
+    if mode == "predict":
+        return lambda batch: model.predict(batch, verbose=0)
+
+    import tensorflow as tf
+    signature = [tf.TensorSpec(shape=(None, *model.input_shape[1:]), dtype=tf.float32)]
+
+    @tf.function(input_signature=signature)
+    def serve(images):
+        return model(images, training=False)
+
+    return lambda batch: serve(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+
+
+def warm_up(predict_fn: Callable[[np.ndarray], np.ndarray], input_shape: Tuple,
+            batch_sizes: List[int] = WARMUP_BATCH_SIZES) -> Dict[str, float]:
+    """Run a zero batch of each size through ``predict_fn``; returns ms per size"""
+    timings = {}
+    for size in batch_sizes:
+        batch = np.zeros((size, *input_shape[1:]), dtype=np.float32)
+        started = time.perf_counter()
+        predict_fn(batch)
+        timings[f"warmup_batch_{size}_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+    return timings
+
+
+class LoadedModel:
+    """A loaded Keras model plus the class list that matches its output layer"""
+
+    def __init__(self, path: str, digest: str, model, class_names: List[str], load_ms: float):
+        self.path = path
+        self.digest = digest
+        self.model = model
+        self.class_names = class_names
+        self.load_ms = load_ms
+        self.loaded_at = time.time()
+        self._serving_fn = None
+
+    @property
+    def version(self) -> str:
+        return self.digest
+
+    @property
+    def input_shape(self) -> Tuple:
+        return tuple(self.model.input_shape)
+
+    @property
+    def num_classes(self) -> int:
+        return int(self.model.output_shape[-1])
+
+    @property
+    def serving_fn(self) -> Callable[[np.ndarray], np.ndarray]:
+        if self._serving_fn is None:
+            self._serving_fn = make_serving_fn(self.model)
+        return self._serving_fn
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.serving_fn(batch)
+
+    def warm_up(self, batch_sizes: List[int] = WARMUP_BATCH_SIZES) -> Dict[str, float]:
+        return warm_up(self.serving_fn, self.input_shape, batch_sizes)
+
+    def info(self) -> Dict:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "num_classes": self.num_classes,
+            "class_names": self.class_names,
+            "input_shape": list(self.input_shape),
+            "load_ms": round(self.load_ms, 1),
+        }
+
+
+class ModelRegistry:
+    """Loads each model artifact once per process, keyed by path and content hash"""
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str], LoadedModel] = {}
+        self._latest: Dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+
+    def load(self, path: str, class_names_path: Optional[str] = None) -> LoadedModel:
+        """Return the shared model for ``path``, loading it on first use.
+
+        Raises ModelLoadError if the file is missing, fails to deserialize,
+        or its output width differs from the number of class names.
+        """
+        abs_path = os.path.abspath(path)
+        if not os.path.exists(abs_path):
+            raise ModelLoadError(f"Model file {path} not found")
+        digest = file_digest(abs_path)
+        key = (abs_path, digest)
+
+        # Held across the load so concurrent callers don't deserialize twice
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is not None:
+                return loaded
+
+            started = time.perf_counter()
+            import tensorflow as tf
+            try:
+                model = tf.keras.models.load_model(abs_path, compile=False)
+            except Exception as e:
+                raise ModelLoadError(f"Failed to load {path}: {e}") from e
+
+            names_path = resolve_class_names_path(abs_path, class_names_path)
+            class_names = read_class_names(names_path) if names_path else list(DEFAULT_CLASS_NAMES)
+
+            output_width = int(model.output_shape[-1])
+            if len(class_names) != output_width:
+                raise ModelLoadError(
+                    f"{path} outputs {output_width} classes but "
+                    f"{names_path or 'the default class list'} has {len(class_names)}"
+                )
+
+            loaded = LoadedModel(abs_path, digest, model, class_names,
+                                 (time.perf_counter() - started) * 1000.0)
+            self._models[key] = loaded
+            self._latest[abs_path] = loaded
+            logger.info("Registered model", path=os.path.basename(abs_path), version=digest, classes=output_width)
+            return loaded
+
+    def unload(self, path: str, digest: str) -> None:
+        """Forget one version so its weights can be freed (after a hot swap)"""
+        abs_path = os.path.abspath(path)
+        with self._lock:
+            loaded = self._models.pop((abs_path, digest), None)
+            if loaded is not None and self._latest.get(abs_path) is loaded:
+                del self._latest[abs_path]
+
+    def get(self, path: str) -> Optional[LoadedModel]:
+        """Most recently loaded version of ``path``, without loading"""
+        return self._latest.get(os.path.abspath(path))
+
+    def models(self) -> List[Dict]:
+        return [loaded.info() for loaded in self._models.values()]
+
+
+model_registry = ModelRegistry()
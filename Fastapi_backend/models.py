@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Enum, Index
 from sqlalchemy.sql import func
 import enum
 
@@ -17,6 +17,17 @@ class Feedback(Base):
     user_id = Column(String, index=True)
     message = Column(Text, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # default as well as server_default: migrate_db.py adds this column to
+    # existing SQLite tables, which cannot take a CURRENT_TIMESTAMP default
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), default=func.now(), onupdate=func.now())
+    
+    # Keyset pagination walks (timestamp, id) newest first; the change feed
+    # walks (updated_at, id) oldest first
+    __table_args__ = (
+        Index("ix_feedback_timestamp_id", "timestamp", "id"),
+        Index("ix_feedback_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_feedback_updated_at_id", "updated_at", "id"),
+    )
 
 class Prediction(Base):
     __tablename__ = "predictions"
@@ -24,9 +35,25 @@ class Prediction(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True)
     image_url = Column(String)
+    # Dashboard-sized copy of the stored image (see upload_store.py)
+    thumbnail_url = Column(String, nullable=True)
     prediction_result = Column(String, nullable=False)
     confidence = Column(Float, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # UUIDv7 assigned when the prediction is logged, before the row exists;
+    # unique so replaying the spill file never inserts a row twice
+    uid = Column(String(36))
+    # Version (artifact digest) of the model that served the prediction
+    model_version = Column(String(64), nullable=True)
+    
+    # Keyset pagination, optionally narrowed to one user, class or model version first
+    __table_args__ = (
+        Index("ix_predictions_uid", "uid", unique=True),
+        Index("ix_predictions_timestamp_id", "timestamp", "id"),
+        Index("ix_predictions_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_predictions_result_timestamp_id", "prediction_result", "timestamp", "id"),
+        Index("ix_predictions_version_timestamp_id", "model_version", "timestamp", "id"),
+    )
 
 class Appointment(Base):
     __tablename__ = "appointments"
@@ -43,6 +70,24 @@ class Appointment(Base):
     meet_link = Column(String, nullable=True)
     hidden_from_user = Column(Integer, default=0)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_appointments_timestamp_id", "timestamp", "id"),
+        Index("ix_appointments_status_timestamp_id", "status", "timestamp", "id"),
+        Index("ix_appointments_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_appointments_updated_at_id", "updated_at", "id"),
+    )
+
+# Incrementally maintained aggregates behind /api/stats (see aggregates.py)
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+    
+    scope = Column(String, primary_key=True)  # e.g. "prediction_class", "daily_predictions"
+    key = Column(String, primary_key=True)    # class name, status, ISO date, ...
+    count = Column(Integer, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0.0)
+    low_count = Column(Integer, nullable=False, default=0)
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -55,4 +100,8 @@ class UserProfile(Base):
     state = Column(String, nullable=True)
     profile_image_url = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_user_profiles_updated_at_id", "updated_at", "id"),
+    )
@@ -0,0 +1,599 @@
+"""
+NumPy-only inference for the exported Keras layer graph
+Runs Medicinal_model.h5 (or extract_weights.py output) without TensorFlow
+"""
+
+import json
+import os
+import pickle
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Layers that are the identity at inference time
+PASSTHROUGH_LAYERS = {
+    "InputLayer", "Dropout", "SpatialDropout1D", "SpatialDropout2D",
+    "GaussianNoise", "GaussianDropout", "AlphaDropout", "ActivityRegularization",
+}
+
+
+class UnsupportedLayerError(Exception):
+    """The graph contains a layer type the engine cannot execute"""
+
+
+# ---------------------------------------------------------------- weights
+
+def read_h5_weights(model_path: str) -> Tuple[Dict, Dict[str, Dict[str, np.ndarray]]]:
+    """(model_config, {layer_name: {weight_name: array}}) straight from an H5 file"""
+    import h5py
+
+    with h5py.File(model_path, "r") as f:
+        config = f.attrs["model_config"]
+        config = json.loads(config.decode("utf-8") if isinstance(config, bytes) else config)
+        weights: Dict[str, Dict[str, np.ndarray]] = {}
+        if "model_weights" in f:
+            def collect(name, obj):
+                if isinstance(obj, h5py.Dataset):
+                    _add_weight(weights, name, np.array(obj, dtype=np.float32))
+            f["model_weights"].visititems(collect)
+    return config, weights
+
+
+def _add_weight(weights: Dict, path: str, value: np.ndarray) -> None:
+    # .../<layer>/<weight>[:0]; nested models add their own name in front
+    parts = path.split("/")
+    layer, weight = parts[-2], parts[-1].split(":")[0]
+    weights.setdefault(layer, {})[weight] = value
+
+
+def normalize_pickled_weights(raw: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict[str, np.ndarray]]:
+    """extract_weights.py keys groups by H5 path ("dense/dense"); key them by layer name"""
+    weights: Dict[str, Dict[str, np.ndarray]] = {}
+    for group, layer_weights in raw.items():
+        for name, value in layer_weights.items():
+            _add_weight(weights, f"{group}/{name}", np.asarray(value, dtype=np.float32))
+    return weights
+
+
+# Offsets in the weight blob are rounded up to this many float32s (64 bytes)
+WEIGHT_ALIGNMENT = 16
+
+
+def write_weight_blob(weights: Dict[str, Dict[str, np.ndarray]], path: str) -> Dict[str, Dict[str, list]]:
+    """Every tensor in one float32 .npy file; returns {layer: {weight: [offset, shape]}}.
+
+    The file is meant to be memory-mapped read-only (``map_weight_blob``):
+    processes mapping it share one copy of the weights through the page cache.
+    """
+    index: Dict[str, Dict[str, list]] = {}
+    size = 0
+    for layer, layer_weights in weights.items():
+        for name, value in layer_weights.items():
+            size = -(-size // WEIGHT_ALIGNMENT) * WEIGHT_ALIGNMENT
+            index.setdefault(layer, {})[name] = [size, list(value.shape)]
+            size += value.size
+
+    blob = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(size,))
+    for layer, layer_weights in weights.items():
+        for name, value in layer_weights.items():
+            offset = index[layer][name][0]
+            blob[offset:offset + value.size] = np.asarray(value, dtype=np.float32).ravel()
+    blob.flush()
+    del blob
+    return index
+
+
+def map_weight_blob(path: str, index: Dict[str, Dict[str, list]]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Read-only views into the memory-mapped blob written by ``write_weight_blob``"""
+    blob = np.load(path, mmap_mode="r")
+    weights: Dict[str, Dict[str, np.ndarray]] = {}
+    for layer, layer_weights in index.items():
+        for name, (offset, shape) in layer_weights.items():
+            count = int(np.prod(shape, dtype=np.int64))
+            weights.setdefault(layer, {})[name] = blob[offset:offset + count].reshape(shape)
+    return weights
+
+
+# ------------------------------------------------------------- primitives
+
+def _same_padding(size: int, kernel: int, stride: int, dilation: int = 1) -> Tuple[int, int]:
+    """TensorFlow's SAME padding: extra row/column goes after"""
+    effective = (kernel - 1) * dilation + 1
+    out = -(-size // stride)
+    total = max((out - 1) * stride + effective - size, 0)
+    return total // 2, total - total // 2
+
+
+def _pad(x: np.ndarray, padding: str, kernel: Tuple[int, int], strides: Tuple[int, int],
+         dilation: Tuple[int, int] = (1, 1), value: float = 0.0) -> np.ndarray:
+    if padding != "same":
+        return x
+    top, bottom = _same_padding(x.shape[1], kernel[0], strides[0], dilation[0])
+    left, right = _same_padding(x.shape[2], kernel[1], strides[1], dilation[1])
+    if top == bottom == left == right == 0:
+        return x
+    return np.pad(x, ((0, 0), (top, bottom), (left, right), (0, 0)), constant_values=value)
+
+
+def _windows(x: np.ndarray, kernel: Tuple[int, int], strides: Tuple[int, int],
+             dilation: Tuple[int, int] = (1, 1)) -> np.ndarray:
+    """Strided (N, Ho, Wo, C, kh, kw) view of every kernel window; no copy"""
+    span = ((kernel[0] - 1) * dilation[0] + 1, (kernel[1] - 1) * dilation[1] + 1)
+    view = sliding_window_view(x, span, axis=(1, 2))
+    return view[:, ::strides[0], ::strides[1], :, ::dilation[0], ::dilation[1]]
+
+
+def conv2d(x: np.ndarray, kernel: np.ndarray, bias: Optional[np.ndarray], strides, padding: str,
+           dilation=(1, 1)) -> np.ndarray:
+    """NHWC convolution; 1x1 kernels are a single matmul, larger ones use im2col"""
+    kh, kw, cin, cout = kernel.shape
+    if (kh, kw) == (1, 1):
+        x = x[:, ::strides[0], ::strides[1], :]
+        n, h, w, _ = x.shape
+        out = (x.reshape(-1, cin) @ kernel.reshape(cin, cout)).reshape(n, h, w, cout)
+    else:
+        x = _pad(x, padding, (kh, kw), strides, dilation)
+        cols = _windows(x, (kh, kw), strides, dilation)
+        n, h, w = cols.shape[:3]
+        # (N, Ho, Wo, kh, kw, C) matches the kernel's (kh, kw, C) flattening
+        cols = np.ascontiguousarray(cols.transpose(0, 1, 2, 4, 5, 3)).reshape(n * h * w, kh * kw * cin)
+        out = (cols @ kernel.reshape(kh * kw * cin, cout)).reshape(n, h, w, cout)
+    if bias is not None:
+        out += bias
+    return out
+
+
+def depthwise_conv2d(x: np.ndarray, kernel: np.ndarray, bias: Optional[np.ndarray], strides, padding: str,
+                     dilation=(1, 1)) -> np.ndarray:
+    """Per-channel convolution accumulated tap by tap over strided views"""
+    kh, kw, channels, multiplier = kernel.shape
+    x = _pad(x, padding, (kh, kw), strides, dilation)
+    n = x.shape[0]
+    out_h = (x.shape[1] - (kh - 1) * dilation[0] - 1) // strides[0] + 1
+    out_w = (x.shape[2] - (kw - 1) * dilation[1] - 1) // strides[1] + 1
+
+    out = np.zeros((n, out_h, out_w, channels, multiplier), dtype=np.float32)
+    for i in range(kh):
+        for j in range(kw):
+            top, left = i * dilation[0], j * dilation[1]
+            tap = x[:, top:top + (out_h - 1) * strides[0] + 1:strides[0],
+                       left:left + (out_w - 1) * strides[1] + 1:strides[1], :]
+            out += tap[..., None] * kernel[i, j]
+    out = out.reshape(n, out_h, out_w, channels * multiplier)
+    if bias is not None:
+        out += bias
+    return out
+
+
+def pool2d(x: np.ndarray, pool_size, strides, padding: str, mode: str) -> np.ndarray:
+    if mode == "max":
+        windows = _windows(_pad(x, padding, pool_size, strides, value=-np.inf), pool_size, strides)
+        return windows.max(axis=(-2, -1))
+    windows = _windows(_pad(x, padding, pool_size, strides), pool_size, strides)
+    total = windows.sum(axis=(-2, -1))
+    if padding != "same":
+        return total / (pool_size[0] * pool_size[1])
+    # Keras averages over the real pixels only, not the zero padding
+    ones = np.ones((1, *x.shape[1:3], 1), dtype=np.float32)
+    counts = _windows(_pad(ones, padding, pool_size, strides), pool_size, strides).sum(axis=(-2, -1))
+    return total / counts
+
+
+def softmax(x: np.ndarray, axis: int = -1) -> np.ndarray:
+    e = np.exp(x - x.max(axis=axis, keepdims=True))
+    return e / e.sum(axis=axis, keepdims=True)
+
+
+def _relu(x: np.ndarray, max_value=None, negative_slope: float = 0.0, threshold: float = 0.0) -> np.ndarray:
+    if negative_slope:
+        out = np.where(x >= threshold, x, negative_slope * (x - threshold))
+    else:
+        out = np.where(x > threshold, x, 0.0) if threshold else np.maximum(x, 0.0)
+    if max_value is not None:
+        out = np.minimum(out, max_value)
+    return out.astype(np.float32, copy=False)
+
+
+ACTIVATIONS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "relu6": lambda x: np.clip(x, 0.0, 6.0),
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "tanh": np.tanh,
+    "softmax": softmax,
+    "swish": lambda x: x / (1.0 + np.exp(-x)),
+    "silu": lambda x: x / (1.0 + np.exp(-x)),
+    "hard_sigmoid": lambda x: np.clip(x / 6.0 + 0.5, 0.0, 1.0),
+    "elu": lambda x: np.where(x > 0, x, np.expm1(x)),
+}
+
+
+def _activation(name) -> Callable[[np.ndarray], np.ndarray]:
+    if isinstance(name, dict):
+        name = name.get("config", {}).get("name") or name.get("class_name")
+    name = (name or "linear").lower()
+    if name not in ACTIVATIONS:
+        raise UnsupportedLayerError(f"Unsupported activation {name!r}")
+    return ACTIVATIONS[name]
+
+
+def _pair(value) -> Tuple[int, int]:
+    if isinstance(value, int):
+        return value, value
+    return int(value[0]), int(value[1])
+
+
+# ----------------------------------------------------------------- layers
+
+class Op:
+    """One executable layer; ``fn`` maps the list of input arrays to the output.
+
+    Linear Conv2D/DepthwiseConv2D/Dense ops expose ``fold`` and
+    BatchNormalization exposes ``scale_shift`` so the graph compiler can
+    fold the normalization into the preceding kernel.
+    """
+
+    def __init__(self, fn: Callable[[List[np.ndarray]], np.ndarray],
+                 fold: Optional[Callable[[np.ndarray, np.ndarray], bool]] = None,
+                 scale_shift: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        self.fn = fn
+        self.fold = fold
+        self.scale_shift = scale_shift
+        self.folded = False
+
+    def __call__(self, inputs: List[np.ndarray]) -> np.ndarray:
+        return inputs[0] if self.folded else self.fn(inputs)
+
+
+def _weight(config: Dict, w: Dict[str, np.ndarray], *names: str) -> np.ndarray:
+    """First of ``names`` present in the layer's weights (Keras 2 and 3 differ)"""
+    for name in names:
+        if name in w:
+            return w[name]
+    raise UnsupportedLayerError(f"Layer {config.get('name')} has no {'/'.join(names)} weights")
+
+
+def _single(fn: Callable[[np.ndarray], np.ndarray], **kwargs) -> Op:
+    return Op(lambda inputs: fn(inputs[0]), **kwargs)
+
+
+def _bn_scale_shift(config: Dict, w: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """BatchNormalization as y = x * scale + shift"""
+    mean, variance = _weight(config, w, "moving_mean"), _weight(config, w, "moving_variance")
+    gamma = w.get("gamma", np.ones_like(mean))
+    beta = w.get("beta", np.zeros_like(mean))
+    scale = gamma / np.sqrt(variance + config.get("epsilon", 1e-3))
+    return scale.astype(np.float32), (beta - mean * scale).astype(np.float32)
+
+
+def _linear_op(config: Dict, kernel: np.ndarray, bias: Optional[np.ndarray],
+               forward: Callable, kernel_scale: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> Op:
+    """Conv/Dense op whose kernel and bias can absorb a following BatchNormalization"""
+    activation = _activation(config.get("activation"))
+    # No copy: memory-mapped weights stay shared until a fold replaces them
+    state = {
+        "kernel": kernel.astype(np.float32, copy=False),
+        "bias": None if bias is None else bias.astype(np.float32, copy=False),
+    }
+
+    def run(x):
+        return activation(forward(x, state["kernel"], state["bias"]))
+
+    def fold(scale: np.ndarray, shift: np.ndarray) -> bool:
+        if activation is not ACTIVATIONS["linear"]:
+            return False
+        bias = state["bias"] if state["bias"] is not None else np.zeros_like(shift)
+        state["kernel"] = kernel_scale(state["kernel"], scale).astype(np.float32)
+        state["bias"] = (bias * scale + shift).astype(np.float32)
+        return True
+
+    return _single(run, fold=fold)
+
+
+def _conv_op(config: Dict, w: Dict[str, np.ndarray], depthwise: bool) -> Op:
+    kernel = _weight(config, w, "depthwise_kernel", "kernel") if depthwise else _weight(config, w, "kernel")
+    bias = w.get("bias") if config.get("use_bias", True) else None
+    strides, dilation = _pair(config.get("strides", 1)), _pair(config.get("dilation_rate", 1))
+    padding = config.get("padding", "valid").lower()
+    if not depthwise and config.get("groups", 1) != 1:
+        raise UnsupportedLayerError(f"Grouped convolution in {config.get('name')}")
+
+    if depthwise:
+        multiplier = kernel.shape[-1]
+        return _linear_op(
+            config, kernel, bias,
+            lambda x, k, b: depthwise_conv2d(x, k, b, strides, padding, dilation),
+            lambda k, scale: k * scale.reshape(-1, multiplier),
+        )
+    return _linear_op(
+        config, kernel, bias,
+        lambda x, k, b: conv2d(x, k, b, strides, padding, dilation),
+        lambda k, scale: k * scale,
+    )
+
+
+def _dense_op(config: Dict, w: Dict[str, np.ndarray]) -> Op:
+    bias = w.get("bias") if config.get("use_bias", True) else None
+
+    def forward(x, kernel, b):
+        out = x @ kernel
+        if b is not None:
+            out += b
+        return out
+
+    return _linear_op(config, _weight(config, w, "kernel"), bias, forward, lambda k, scale: k * scale)
+
+
+def _batchnorm_op(config: Dict, w: Dict[str, np.ndarray]) -> Op:
+    axis = config.get("axis", -1)
+    axis = axis[0] if isinstance(axis, (list, tuple)) else axis
+    if axis not in (-1, 3, 1):
+        raise UnsupportedLayerError(f"BatchNormalization over axis {axis} in {config.get('name')}")
+    scale, shift = _bn_scale_shift(config, w)
+    return _single(lambda x: x * scale + shift, scale_shift=(scale, shift))
+
+
+def _padding_fn(config: Dict) -> Callable[[np.ndarray], np.ndarray]:
+    padding = config.get("padding", 1)
+    if isinstance(padding, int):
+        padding = (padding, padding)
+    rows, cols = [(p, p) if isinstance(p, int) else tuple(p) for p in padding]
+    return lambda x: np.pad(x, ((0, 0), rows, cols, (0, 0)))
+
+
+def _pool_fn(config: Dict, mode: str) -> Callable[[np.ndarray], np.ndarray]:
+    pool_size = _pair(config.get("pool_size", 2))
+    strides = _pair(config.get("strides") or pool_size)
+    padding = config.get("padding", "valid").lower()
+    return lambda x: pool2d(x, pool_size, strides, padding, mode)
+
+
+def _global_pool_fn(config: Dict, mode: str) -> Callable[[np.ndarray], np.ndarray]:
+    keepdims = config.get("keepdims", False)
+    reduce = np.mean if mode == "avg" else np.max
+    return lambda x: reduce(x, axis=(1, 2), keepdims=keepdims)
+
+
+def _relu_fn(config: Dict) -> Callable[[np.ndarray], np.ndarray]:
+    max_value = config.get("max_value")
+    negative_slope = config.get("negative_slope", config.get("alpha", 0.0)) or 0.0
+    threshold = config.get("threshold", 0.0) or 0.0
+    if max_value == 6.0 and not negative_slope and not threshold:
+        return ACTIVATIONS["relu6"]
+    return lambda x: _relu(x, max_value, negative_slope, threshold)
+
+
+def _multiply(inputs: List[np.ndarray]) -> np.ndarray:
+    out = inputs[0]
+    for other in inputs[1:]:
+        out = out * other
+    return out
+
+
+def build_op(class_name: str, config: Dict, weights: Dict[str, Dict[str, np.ndarray]]) -> Op:
+    """Executable op for one layer config; raises UnsupportedLayerError otherwise"""
+    w = weights.get(config.get("name"), {})
+
+    if class_name in PASSTHROUGH_LAYERS:
+        return Op(lambda inputs: inputs[0])
+    if class_name in ("Functional", "Model", "Sequential"):
+        nested = compile_graph({"class_name": class_name, "config": config}, weights)
+        return _single(nested)
+    if class_name == "Add":
+        return Op(lambda inputs: sum(inputs[1:], inputs[0]))
+    if class_name == "Multiply":
+        return Op(_multiply)
+    if class_name == "Concatenate":
+        axis = config.get("axis", -1)
+        return Op(lambda inputs: np.concatenate(inputs, axis=axis))
+    if class_name == "Conv2D":
+        return _conv_op(config, w, depthwise=False)
+    if class_name == "DepthwiseConv2D":
+        return _conv_op(config, w, depthwise=True)
+    if class_name == "Dense":
+        return _dense_op(config, w)
+    if class_name == "BatchNormalization":
+        return _batchnorm_op(config, w)
+
+    elementwise = {
+        "ReLU": lambda: _relu_fn(config),
+        "Activation": lambda: _activation(config.get("activation")),
+        "Softmax": lambda: (lambda x: softmax(x, config.get("axis", -1))),
+        "ZeroPadding2D": lambda: _padding_fn(config),
+        "MaxPooling2D": lambda: _pool_fn(config, "max"),
+        "AveragePooling2D": lambda: _pool_fn(config, "avg"),
+        "GlobalAveragePooling2D": lambda: _global_pool_fn(config, "avg"),
+        "GlobalMaxPooling2D": lambda: _global_pool_fn(config, "max"),
+        "Flatten": lambda: (lambda x: x.reshape(x.shape[0], -1)),
+        "Reshape": lambda: (lambda x: x.reshape(x.shape[0], *config["target_shape"])),
+        "Rescaling": lambda: (lambda x: x * np.float32(config.get("scale", 1.0))
+                              + np.float32(config.get("offset", 0.0))),
+    }
+    if class_name not in elementwise:
+        raise UnsupportedLayerError(f"Unsupported layer {class_name} ({config.get('name')})")
+    return _single(elementwise[class_name]())
+
+
+def _try_fold(producer: Op, consumer: Op) -> None:
+    if consumer.scale_shift is not None and producer.fold is not None and not consumer.folded:
+        consumer.folded = producer.fold(*consumer.scale_shift)
+
+
+# ------------------------------------------------------------------ graph
+
+def _history(tensor) -> Optional[Tuple[str, int, int]]:
+    """(layer, node_index, tensor_index) from either Keras 2 or Keras 3 node syntax"""
+    if isinstance(tensor, dict) and tensor.get("class_name") == "__keras_tensor__":
+        layer, node, index = tensor["config"]["keras_history"]
+        return layer, int(node), int(index)
+    if (isinstance(tensor, list) and len(tensor) >= 3 and isinstance(tensor[0], str)
+            and isinstance(tensor[1], int)):
+        return tensor[0], tensor[1], tensor[2]
+    return None
+
+
+def _node_inputs(node) -> List[Tuple[str, int]]:
+    """(layer, node_index) of every input tensor of one inbound node, in call order"""
+    found = []
+
+    def walk(value):
+        history = _history(value)
+        if history is not None:
+            found.append(history[:2])
+        elif isinstance(value, dict):
+            walk(value.get("args", []))
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                walk(item)
+
+    walk(node)
+    return found
+
+
+def _endpoints(spec) -> List[Tuple[str, int]]:
+    if spec and isinstance(spec[0], str):
+        spec = [spec]
+    return [(layer, int(node)) for layer, node, _ in spec]
+
+
+def compile_graph(model_config: Dict, weights: Dict[str, Dict[str, np.ndarray]],
+                  fold_batchnorm: bool = True) -> Callable[[np.ndarray], np.ndarray]:
+    """Turn a Keras model_config into a batch -> output callable.
+
+    Supports Functional (including nested models) and Sequential graphs
+    with a single input and output. A BatchNormalization that is the only
+    consumer of a linear Conv2D, DepthwiseConv2D or Dense is folded into
+    that layer's kernel and costs nothing at inference time.
+    """
+    class_name, config = model_config["class_name"], model_config["config"]
+    if class_name == "Sequential":
+        ops = [build_op(layer["class_name"], layer["config"], weights) for layer in config["layers"]]
+        if fold_batchnorm:
+            for producer, consumer in zip(ops, ops[1:]):
+                _try_fold(producer, consumer)
+
+        def run_sequential(x):
+            for op in ops:
+                x = op([x])
+            return x
+        return run_sequential
+
+    inputs, outputs = _endpoints(config["input_layers"]), _endpoints(config["output_layers"])
+    if len(inputs) != 1 or len(outputs) != 1:
+        raise UnsupportedLayerError("Only single-input, single-output models are supported")
+    input_key, output_key = inputs[0], outputs[0]
+
+    # Layers are listed in topological order; each inbound node is one call
+    steps: List[Tuple[Tuple[str, int], Op, List[Tuple[str, int]]]] = []
+    consumers: Dict[Tuple[str, int], int] = {}
+    calls: Dict[str, int] = {}
+    for spec in config["layers"]:
+        name = spec.get("name") or spec["config"]["name"]
+        op = build_op(spec["class_name"], spec["config"], weights)
+        nodes = spec.get("inbound_nodes", [])
+        calls[name] = len(nodes)
+        for node_index, node in enumerate(nodes):
+            node_inputs = _node_inputs(node)
+            steps.append(((name, node_index), op, node_inputs))
+            for source in node_inputs:
+                consumers[source] = consumers.get(source, 0) + 1
+
+    if fold_batchnorm:
+        # Shared layers are left alone: folding would change their other calls
+        ops = {key: op for key, op, _ in steps}
+        for (name, _), op, node_inputs in steps:
+            if len(node_inputs) != 1 or calls[name] != 1:
+                continue
+            source = node_inputs[0]
+            if consumers.get(source) == 1 and source in ops and calls[source[0]] == 1:
+                _try_fold(ops[source], op)
+
+    steps = [step for step in steps if step[0] != input_key]
+
+    def run(x):
+        tensors = {input_key: x}
+        remaining = dict(consumers)
+        for key, op, node_inputs in steps:
+            tensors[key] = op([tensors[source] for source in node_inputs])
+            # Drop intermediates once their last consumer has run
+            for source in node_inputs:
+                remaining[source] -= 1
+                if remaining[source] == 0 and source != output_key:
+                    del tensors[source]
+        return tensors[output_key]
+
+    return run
+
+
+# Filled by NumpyModel.preload (see prefork_server.py): real path -> (file stamp, model)
+_preloaded: Dict[str, Tuple[Tuple[int, int], "NumpyModel"]] = {}
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class NumpyModel:
+    """A compiled Keras graph; ``predict`` maps an NHWC float32 batch to outputs"""
+
+    def __init__(self, model_config: Dict, weights: Dict[str, Dict[str, np.ndarray]],
+                 fold_batchnorm: bool = True):
+        self.config = model_config
+        self._forward = compile_graph(model_config, weights, fold_batchnorm)
+        self.input_shape = self._input_shape(model_config)
+        probe = self.predict(np.zeros((1, *self.input_shape[1:]), np.float32))
+        self.output_shape = (None, *probe.shape[1:])
+
+    @staticmethod
+    def _input_shape(model_config: Dict) -> Tuple:
+        first = model_config["config"]["layers"][0]["config"]
+        shape = first.get("batch_shape") or first.get("batch_input_shape")
+        return (None, *shape[1:])
+
+    @classmethod
+    def from_h5(cls, model_path: str, **kwargs) -> "NumpyModel":
+        config, weights = read_h5_weights(model_path)
+        return cls(config, weights, **kwargs)
+
+    @classmethod
+    def from_export(cls, graph_path: str, **kwargs) -> "NumpyModel":
+        """Graph JSON written by extract_weights.py plus the weights it names.
+
+        The memory-mapped blob is preferred; exports from before it fall
+        back to the weights pickle.
+        """
+        with open(graph_path, "r", encoding="utf-8") as f:
+            graph = json.load(f)
+        directory = os.path.dirname(graph_path)
+        if graph.get("weights_mmap"):
+            weights = map_weight_blob(os.path.join(directory, graph["weights_mmap"]), graph["weights_index"])
+        else:
+            with open(os.path.join(directory, graph["weights_file"]), "rb") as f:
+                weights = normalize_pickled_weights(pickle.load(f))
+        return cls(graph["model_config"], weights, **kwargs)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "NumpyModel":
+        preloaded = _preloaded.get(os.path.realpath(path))
+        # A file replaced since the preload (a redeployed model) is loaded afresh
+        if preloaded is not None and preloaded[0] == _file_stamp(path):
+            return preloaded[1]
+        if path.endswith(".json"):
+            return cls.from_export(path, **kwargs)
+        return cls.from_h5(path, **kwargs)
+
+    @classmethod
+    def preload(cls, path: str, **kwargs) -> "NumpyModel":
+        """Load ``path`` now and hand this instance to every later ``load`` of it.
+
+        prefork_server.py calls this before forking so workers share the
+        compiled model instead of each building its own.
+        """
+        model = cls.load(path, **kwargs)
+        _preloaded[os.path.realpath(path)] = (_file_stamp(path), model)
+        return model
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self._forward(np.asarray(batch, dtype=np.float32))
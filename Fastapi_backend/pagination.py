@@ -0,0 +1,135 @@
+"""
+Keyset pagination for the admin list endpoints
+Pages are ordered by (timestamp, id) descending and resumed from an opaque cursor
+"""
+
+import base64
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import func, literal, select, tuple_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Lists stay plain JSON arrays; the cursor for the next page travels in a header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(timestamp, id) of the last row of the previous page; 400 if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """Requested projection, validated against the response schema's columns"""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(allowed)})"
+        )
+    return requested
+
+
+def date_filters(column, since: Optional[datetime], until: Optional[datetime]) -> List:
+    """Half-open [since, until) range on ``column``"""
+    filters = []
+    if since is not None:
+        filters.append(column >= since)
+    if until is not None:
+        filters.append(column < until)
+    return filters
+
+
+def keyset_page(db, model, filters: Sequence, limit: int, cursor: Optional[str],
+                fields: Optional[List[str]] = None) -> Tuple[List, Optional[str]]:
+    """One page of ``model`` rows newest first, plus the cursor for the next page.
+
+    With ``fields`` only those columns are selected (id and timestamp are
+    always read for the cursor) and rows come back as dicts; otherwise
+    ORM objects are returned. Needs an index on (timestamp, id), ideally
+    prefixed by whatever equality filter is applied.
+    """
+    order = (model.timestamp.desc(), model.id.desc())
+    if fields is None:
+        query = db.query(model)
+    else:
+        columns = {name: getattr(model, name) for name in ("id", "timestamp", *fields)}
+        query = db.query(*columns.values())
+
+    for condition in filters:
+        query = query.filter(condition)
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        # Resume from the cursor row's stored timestamp rather than a re-bound
+        # datetime: SQLite keeps CURRENT_TIMESTAMP text, which a bound value
+        # never equals, so ties would repeat forever. The decoded value only
+        # stands in when that row has since been deleted.
+        stored = select(model.timestamp).where(model.id == row_id).scalar_subquery()
+        boundary = func.coalesce(stored, literal(timestamp, model.timestamp.type))
+        query = query.filter(tuple_(model.timestamp, model.id) < tuple_(boundary, row_id))
+
+    # One extra row tells us whether another page exists without a COUNT
+    rows = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+    if fields is not None:
+        rows = [{name: getattr(row, name) for name in fields} for row in rows]
+    return rows, next_cursor
+
+
+def etag_matches(request: Optional[Request], etag: str) -> bool:
+    """Whether the client's If-None-Match already names ``etag``"""
+    if request is None:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def page_response(rows: List, next_cursor: Optional[str], response_model=None,
+                  request: Optional[Request] = None) -> JSONResponse:
+    """JSON array of ``rows`` with the next-page cursor header set when there is one.
+
+    The page carries an ETag of its body; when ``request`` revalidates with
+    a matching If-None-Match the body is dropped for a 304. Cache-Control
+    no-cache makes browsers revalidate on every poll instead of guessing.
+    """
+    if response_model is not None:
+        rows = [response_model.model_validate(row).model_dump() for row in rows]
+    headers: Dict[str, str] = {"Cache-Control": "no-cache"}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    response = JSONResponse(content=jsonable_encoder(rows), headers=headers)
+    etag = f'"{hashlib.sha256(response.body).hexdigest()[:32]}"'
+    if etag_matches(request, etag):
+        headers["ETag"] = etag
+        return Response(status_code=304, headers=headers)
+    response.headers["ETag"] = etag
+    return response
@@ -0,0 +1,258 @@
+"""
+Content-addressed prediction cache
+Re-uploads of the same leaf photo skip preprocessing and inference
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from logs import get_logger
+from metrics import registry
+
+logger = get_logger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Empty disables the persistent tier
+CACHE_SQLITE_PATH = os.getenv("PREDICTION_CACHE_SQLITE_PATH", "prediction_cache.db")
+# Puts waiting for the SQLite thread before further ones are kept in memory only
+CACHE_MAX_PENDING_WRITES = int(os.getenv("PREDICTION_CACHE_MAX_PENDING_WRITES", "4096"))
+# Second lookup keyed on the decoded tensor (catches identical pixels with new metadata)
+CACHE_TENSOR_TIER = os.getenv("PREDICTION_CACHE_TENSOR_TIER", "1") == "1"
+# Part of every key: persisted payloads of an older shape are never served
+PAYLOAD_FORMAT = "p2"
+
+
+def file_digest(path: str, length: int = 16) -> str:
+    """Short SHA-256 of a file, used as the model version in cache keys"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:length]
+
+
+def content_key(image_bytes: bytes, model_version: str) -> str:
+    """Cache key for the raw upload bytes"""
+    sha = hashlib.sha256(image_bytes)
+    return f"raw:{PAYLOAD_FORMAT}:{model_version}:{sha.hexdigest()}"
+
+
+def tensor_key(tensor: np.ndarray, model_version: str) -> str:
+    """Cache key for a decoded, resized input tensor"""
+    sha = hashlib.sha256(np.ascontiguousarray(tensor).tobytes())
+    return f"tensor:{PAYLOAD_FORMAT}:{model_version}:{sha.hexdigest()}"
+
+
+class PredictionCache:
+    """LRU + TTL cache of prediction payloads with an optional SQLite tier.
+
+    The in-memory tier is bounded by both entry count and an approximate
+    byte budget (size of the JSON-encoded payload). Entries evicted from
+    memory remain available from SQLite until their TTL expires.
+
+    SQLite is only touched from one dedicated thread, never the event loop:
+    lookups that miss memory await it, and puts are written behind, every
+    put queued while the previous commit ran going out in one transaction.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_bytes: int = CACHE_MAX_BYTES,
+                 ttl_seconds: float = CACHE_TTL_SECONDS,
+                 sqlite_path: Optional[str] = CACHE_SQLITE_PATH,
+                 max_pending_writes: int = CACHE_MAX_PENDING_WRITES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path or None
+        self.max_pending_writes = max(1, max_pending_writes)
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk: Optional[ThreadPoolExecutor] = None
+        # key -> (encoded payload, created_at) not yet committed to SQLite
+        self._pending: Dict[str, tuple] = {}
+        self._flush_scheduled = False
+
+        self.memory_hits = registry.counter("prediction_cache_memory_hits_total", "Cache hits served from memory")
+        self.disk_hits = registry.counter("prediction_cache_disk_hits_total", "Cache hits served from SQLite")
+        self.misses = registry.counter("prediction_cache_misses_total", "Cache lookups that missed")
+        self.evictions = registry.counter("prediction_cache_evictions_total", "Entries evicted from memory")
+        self.dropped_writes = registry.counter("prediction_cache_dropped_writes_total",
+                                               "Puts not persisted because the SQLite write backlog was full")
+        registry.gauge("prediction_cache_entries", "Entries held in memory", lambda: len(self._entries))
+        registry.gauge("prediction_cache_bytes", "Encoded payload bytes held in memory", lambda: self._bytes)
+        registry.gauge("prediction_cache_hit_rate", "Hits / lookups since start", lambda: self.stats()["hit_rate"])
+
+        if self.sqlite_path:
+            self._open_db()
+
+    def _open_db(self) -> None:
+        try:
+            self._db = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Prediction cache SQLite tier disabled", path=self.sqlite_path, error=str(e))
+            self._db = None
+            return
+        self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction-cache")
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _store_memory(self, key: str, payload: Dict, encoded: str, created_at: float) -> None:
+        size = len(encoded)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (payload, created_at, size)
+        self._bytes += size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions.inc()
+
+    def _get_memory(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, created_at, size = entry
+            if not self._expired(created_at):
+                self._entries.move_to_end(key)
+                return payload
+            del self._entries[key]
+            self._bytes -= size
+            return None
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        # Runs on the SQLite thread; a put still waiting to be written is as good as stored
+        with self._lock:
+            row = self._pending.get(key)
+        if row is None:
+            row = self._db.execute(
+                "SELECT payload, created_at FROM prediction_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        payload = json.loads(row[0])
+        with self._lock:
+            self._store_memory(key, payload, row[0], row[1])
+        return payload
+
+    async def get(self, key: str) -> Optional[Dict]:
+        payload = self._get_memory(key)
+        if payload is not None:
+            self.memory_hits.inc()
+            return payload
+
+        disk = self._disk
+        if disk is not None:
+            try:
+                payload = await asyncio.get_running_loop().run_in_executor(disk, self._read_disk, key)
+            except sqlite3.Error as e:
+                logger.warning("Prediction cache read failed", error=str(e))
+            if payload is not None:
+                self.disk_hits.inc()
+                return payload
+
+        self.misses.inc()
+        return None
+
+    def put(self, key: str, payload: Dict) -> None:
+        encoded = json.dumps(payload, separators=(",", ":"))
+        created_at = time.time()
+        with self._lock:
+            self._store_memory(key, payload, encoded, created_at)
+            if self._disk is None:
+                return
+            if len(self._pending) >= self.max_pending_writes and key not in self._pending:
+                self.dropped_writes.inc()
+                return
+            self._pending[key] = (encoded, created_at)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+            self._disk.submit(self._flush)
+
+    def _flush(self) -> None:
+        with self._lock:
+            rows = [(key, encoded, created_at) for key, (encoded, created_at) in self._pending.items()]
+            self._flush_scheduled = False
+        if not rows:
+            return
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO prediction_cache (key, payload, created_at) VALUES (?, ?, ?)", rows
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Prediction cache write failed", rows=len(rows), error=str(e))
+        with self._lock:
+            # Keep entries re-put while this batch was being written
+            for key, encoded, created_at in rows:
+                if self._pending.get(key) == (encoded, created_at):
+                    del self._pending[key]
+
+    def _clear_disk(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        self._db.execute("DELETE FROM prediction_cache")
+        self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            self._disk.submit(self._clear_disk).result()
+
+    def close(self) -> None:
+        """Write out queued puts and stop the SQLite thread"""
+        with self._lock:
+            disk, self._disk = self._disk, None
+        if disk is not None:
+            disk.submit(self._flush)
+            disk.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        hits = self.memory_hits.value + self.disk_hits.value
+        lookups = hits + self.misses.value
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._db is not None,
+            "pending_writes": len(self._pending),
+            "dropped_writes": int(self.dropped_writes.value),
+            "memory_hits": int(self.memory_hits.value),
+            "disk_hits": int(self.disk_hits.value),
+            "misses": int(self.misses.value),
+            "evictions": int(self.evictions.value),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+prediction_cache = PredictionCache()
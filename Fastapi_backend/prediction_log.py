@@ -0,0 +1,306 @@
+"""
+Write-behind log for prediction rows
+/predict answers once its row is queued and spilled to disk; a background task bulk-inserts the queue
+"""
+
+import asyncio
+import glob
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from aggregates import record_predictions
+from database import AsyncSessionLocal
+from event_bus import event_bus
+from executors import ExecutorSaturated
+from logs import get_logger
+from metrics import elapsed_ms, registry, stage_ms
+from models import Prediction
+from schemas import PredictionResponse
+from write_queue import run_write
+
+logger = get_logger(__name__)
+
+# Rows held in memory before /predict starts answering 503
+PREDICTION_LOG_MAX_PENDING = int(os.getenv("PREDICTION_LOG_MAX_PENDING", "10000"))
+# Rows per INSERT, and how often the queue is flushed when it is not full (ms)
+PREDICTION_LOG_BATCH_SIZE = int(os.getenv("PREDICTION_LOG_BATCH_SIZE", "500"))
+PREDICTION_LOG_FLUSH_MS = float(os.getenv("PREDICTION_LOG_FLUSH_MS", "200"))
+# Queued rows are appended here first and replayed on startup (empty = no spill file)
+PREDICTION_LOG_SPILL_PATH = os.getenv("PREDICTION_LOG_SPILL_PATH", "prediction_log.jsonl")
+# "1" fsyncs every appended row (survives power loss); by default rows reach
+# the OS before the response, which survives a crash of the process
+PREDICTION_LOG_FSYNC = os.getenv("PREDICTION_LOG_FSYNC", "0").lower() in ("1", "true", "yes")
+
+FLUSH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000)
+# Columns a logged row may set; one INSERT needs the same keys in every row,
+# and rows replayed from older spill files lack the newer columns
+LOGGED_COLUMNS = ("uid", "user_id", "image_url", "thumbnail_url", "prediction_result", "confidence", "model_version")
+
+
+def uuid7() -> str:
+    """Time-ordered UUID (RFC 9562 version 7): 48-bit Unix ms, then random bits"""
+    millis = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (millis & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76 | ((rand >> 62) & 0xFFF) << 64
+    value |= 0b10 << 62 | (rand & ((1 << 62) - 1))
+    return str(uuid.UUID(int=value))
+
+
+def insert_logged(db, rows: List[Dict]) -> List[Prediction]:
+    """Bulk insert ``rows``, skipping uids already stored; returns the new rows"""
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = insert(Prediction).on_conflict_do_nothing(index_elements=[Prediction.uid])
+    rows = [{column: row.get(column) for column in LOGGED_COLUMNS} for row in rows]
+    predictions = list(db.scalars(statement.returning(Prediction), rows))
+    record_predictions(db, [(prediction.prediction_result, prediction.confidence) for prediction in predictions])
+    return predictions
+
+
+class PredictionLog:
+    """Bounded queue of prediction rows, flushed in batches behind the request.
+
+    ``append`` gives the row its uid, appends it to the spill file and
+    returns; the flusher task inserts everything queued every ``flush_ms``
+    (sooner once ``batch_size`` rows are waiting). Each flush first rotates
+    the spill file to a numbered segment, and segments are deleted only
+    after their rows are committed. Anything left on disk by a crash or a
+    failed final flush is queued again by ``start``; the unique uid makes
+    the replay idempotent.
+
+    Spill appends, rotations and segment deletes run on one dedicated
+    thread, in the order they are issued from the event loop: a row is
+    queued in the same step its write is submitted, so the rotation of
+    the flush that takes it always comes after that write.
+    """
+
+    def __init__(self, spill_path: Optional[str] = PREDICTION_LOG_SPILL_PATH,
+                 max_pending: int = PREDICTION_LOG_MAX_PENDING,
+                 batch_size: int = PREDICTION_LOG_BATCH_SIZE,
+                 flush_ms: float = PREDICTION_LOG_FLUSH_MS,
+                 fsync: bool = PREDICTION_LOG_FSYNC):
+        self.spill_path = spill_path or None
+        self.max_pending = max(1, max_pending)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self.fsync = fsync
+
+        self._pending: List[Dict] = []
+        self._segments: List[str] = []
+        self._spill = None
+        self._disk: Optional[ThreadPoolExecutor] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+        self._failed_flushes = 0
+
+        self.queued = registry.counter("prediction_log_queued_total", "Prediction rows accepted by the log")
+        self.flushed = registry.counter("prediction_log_flushed_total", "Prediction rows inserted by the log")
+        self.rejected = registry.counter("prediction_log_rejected_total", "Prediction rows rejected with 503")
+        self.failures = registry.counter("prediction_log_flush_failures_total", "Flushes that failed and were retried")
+        self.flush_size_histogram = registry.histogram(
+            "prediction_log_flush_rows", "Rows per flush", FLUSH_SIZE_BUCKETS
+        )
+        self.flush_histogram = registry.histogram("prediction_log_flush_ms", "Flush time (ms)")
+        registry.gauge("prediction_log_pending", "Logged predictions waiting to be stored", lambda: len(self._pending))
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        """Queue rows left in spill files and start the flusher on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        if self.spill_path:
+            if self._disk is None:
+                self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction-log")
+            if self._spill is None:
+                # Once per process, before requests are served
+                self._recover()
+                self._spill = open(self.spill_path, "a", encoding="utf-8")
+            if self._pending:
+                logger.info("Replaying logged predictions", rows=len(self._pending), spill_path=self.spill_path)
+        self._task = loop.create_task(self._run())
+
+    def _recover(self) -> None:
+        if os.path.exists(self.spill_path):
+            self._rotate()
+        self._segments = sorted(glob.glob(f"{self.spill_path}.*"), key=self._segment_number)
+        for segment in self._segments:
+            with open(segment, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        self._pending.append(json.loads(line))
+                    except ValueError:
+                        # Torn last line from a crash mid-write
+                        continue
+
+    @staticmethod
+    def _segment_number(path: str) -> int:
+        suffix = path.rsplit(".", 1)[-1]
+        return int(suffix) if suffix.isdigit() else 0
+
+    def _rotate(self) -> None:
+        """Close the spill file and move it aside as the newest segment"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        segment = f"{self.spill_path}.{time.time_ns()}"
+        os.replace(self.spill_path, segment)
+        self._segments.append(segment)
+
+    def _write_spill(self, text: str) -> None:
+        # On the spill thread
+        self._spill.write(text)
+        self._spill.flush()
+        if self.fsync:
+            os.fsync(self._spill.fileno())
+
+    def _reopen_spill(self) -> None:
+        # On the spill thread, after every write submitted before it
+        self._rotate()
+        self._spill = open(self.spill_path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _remove_segments(segments: List[str]) -> None:
+        for segment in segments:
+            os.remove(segment)
+
+    def _on_disk(self, fn, *args) -> asyncio.Future:
+        """Submit ``fn`` to the spill thread now, behind everything submitted before it"""
+        return asyncio.get_running_loop().run_in_executor(self._disk, fn, *args)
+
+    async def append(self, row: Dict) -> Dict:
+        """Queue one prediction row; returns it with its ``uid``. 503 when the queue is full"""
+        return (await self.extend([row]))[0]
+
+    async def extend(self, rows: List[Dict]) -> List[Dict]:
+        """Queue ``rows`` all or nothing, with one spill write"""
+        if self._task is None or self._task.done():
+            await self.start()
+        if len(self._pending) + len(rows) > self.max_pending:
+            self.rejected.inc(len(rows))
+            raise ExecutorSaturated("prediction log")
+
+        rows = [{"uid": uuid7(), **row} for row in rows]
+        written = None
+        if self._disk is not None:
+            text = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+            # Submitted and queued in one step (see the class docstring), then awaited
+            written = self._on_disk(self._write_spill, text)
+        self._pending.extend(rows)
+        if written is not None:
+            try:
+                await written
+            except Exception:
+                # Not durable, so not accepted (unless a flush already took them)
+                taken = {row["uid"] for row in rows}
+                self._pending = [row for row in self._pending if row.get("uid") not in taken]
+                raise
+        self.queued.inc(len(rows))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return rows
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self._failed_flushes and not self._closing:
+                # Database unavailable: back off instead of retrying every interval
+                await asyncio.sleep(min(5.0, self.flush_interval * 2 ** self._failed_flushes))
+
+    async def flush(self) -> int:
+        """Insert everything queued now; on failure the rows stay queued for the next try"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            rows, self._pending = self._pending, []
+            if self._disk is not None:
+                await self._on_disk(self._reopen_spill)
+            segments, self._segments = self._segments, []
+
+            started = time.perf_counter()
+            try:
+                for offset in range(0, len(rows), self.batch_size):
+                    async with AsyncSessionLocal() as db:
+                        inserted = await run_write(db, insert_logged, rows[offset:offset + self.batch_size])
+                    event_bus.publish("predictions", inserted, PredictionResponse)
+            except Exception as e:
+                self.failures.inc()
+                self._failed_flushes += 1
+                logger.warning("Prediction log flush failed, will retry", rows=len(rows), error=str(e))
+                # Back in front of rows queued meanwhile; replays of chunks already in are skipped
+                self._pending[:0] = rows
+                self._segments[:0] = segments
+                return 0
+            finally:
+                # The DB write stage of /predict, shared by the rows of this flush
+                flush_ms = elapsed_ms(started)
+                self.flush_histogram.observe(flush_ms)
+                stage_ms["db_write"].observe(flush_ms)
+
+            self._failed_flushes = 0
+            self.flush_size_histogram.observe(len(rows))
+            self.flushed.inc(len(rows))
+            if segments:
+                await self._on_disk(self._remove_segments, segments)
+            return len(rows)
+
+    def _close_spill(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    async def close(self) -> None:
+        """Flush on shutdown; rows that still cannot be stored stay in the spill files"""
+        self._closing = True
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._wakeup.set()
+            await self._task
+            await self.flush()
+        if self._disk is not None:
+            # Runs after every write already submitted
+            await self._on_disk(self._close_spill)
+            self._disk.shutdown(wait=True)
+            self._disk = None
+        if self._pending:
+            logger.warning("Logged predictions not stored; they will be replayed on next start", rows=len(self._pending))
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_ms": self.flush_interval * 1000.0,
+            "spill_path": self.spill_path,
+            "spill_segments": len(self._segments),
+            "queued": int(self.queued.value),
+            "flushed": int(self.flushed.value),
+            "rejected": int(self.rejected.value),
+            "flush_failures": int(self.failures.value),
+            "flush_rows": self.flush_size_histogram.snapshot(),
+            "flush_latency_ms": self.flush_histogram.snapshot(),
+        }
+
+
+prediction_log = PredictionLog()
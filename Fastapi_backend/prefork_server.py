@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Pre-fork multi-worker server
+The master loads the model once, then forks uvicorn workers that share its weights
+
+Usage:
+    python extract_weights.py        # writes model_graph.json + model_weights.npy
+    INFERENCE_BACKEND=numpy INFERENCE_MODEL_PATH=model_graph.json python prefork_server.py
+    python prefork_server.py --app integrated_main:app --workers 4 --port 8000
+    python prefork_server.py --workers 4 --inference-worker   # one model process for all workers
+
+Only the TensorFlow-free numpy backend is loaded before the fork: TensorFlow,
+ONNX Runtime and TFLite start thread pools that do not survive fork(), so with
+those each worker loads its own copy afterwards. From model_weights.npy the
+weights are a read-only memory map, shared by the workers through the page
+cache (and by respawned workers, which are forked from the same master).
+Each worker's BLAS/OpenMP/TF/preprocessing pools are sized to cores / workers.
+
+With --inference-worker the model runs only in an inference_worker.py
+process (INFERENCE_WORKER_BACKEND picks its runtime) that the master also
+supervises; the web workers reach it through shared memory and only decode.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from logs import get_logger
+
+logger = get_logger("prefork_server")
+
+# Environment variables sized per worker, so workers x threads <= cores
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS", "PREPROCESS_WORKERS",
+)
+# A worker that exits sooner than this after starting is restarted with a delay
+CRASH_LOOP_SECONDS = 5.0
+# Index of the inference worker among the master's children
+INFERENCE_WORKER = "inference"
+
+
+def limit_threads(threads: int, backend: str) -> None:
+    """Set before NumPy is imported: BLAS reads these when it loads. Explicit settings win"""
+    for name in THREAD_VARIABLES:
+        os.environ.setdefault(name, str(threads))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    if backend in ("onnx", "tflite"):
+        os.environ.setdefault("BACKEND_NUM_THREADS", str(threads))
+
+
+def preload_model(backend: str, model_path: str) -> None:
+    if backend != "numpy":
+        logger.warning("Backend cannot be preloaded; each worker loads its own model after the fork", backend=backend)
+        return
+    path = os.getenv("INFERENCE_MODEL_PATH") or model_path
+    if not os.path.exists(path):
+        logger.warning("Model not found; workers will load (or fail to load) it themselves", path=path)
+        return
+
+    from numpy_engine import NumpyModel
+
+    started = time.perf_counter()
+    NumpyModel.preload(path)
+    logger.info("Preloaded model; workers share it", path=path, ms=round((time.perf_counter() - started) * 1000.0, 1))
+
+
+def listen(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_environment(index: int) -> None:
+    """Per-worker settings applied in the child, before the app is imported"""
+    os.environ["SERVER_WORKER_ID"] = str(index)
+    # Each worker replays and rotates only its own prediction log spill files
+    spill_path = os.getenv("PREDICTION_LOG_SPILL_PATH", "prediction_log.jsonl")
+    if spill_path:
+        root, extension = os.path.splitext(spill_path)
+        os.environ["PREDICTION_LOG_SPILL_PATH"] = f"{root}-w{index}{extension}"
+
+
+def run_worker(index: int, sock: socket.socket, args) -> None:
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    worker_environment(index)
+
+    import uvicorn
+
+    config = uvicorn.Config(args.app, log_level=args.log_level,
+                            timeout_graceful_shutdown=args.graceful_timeout)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_inference_worker(sock: socket.socket, args) -> None:
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    sock.close()
+
+    import inference_worker
+
+    inference_worker.serve(args.model, inference_worker.INFERENCE_WORKER_BACKEND, inference_worker.INFERENCE_SOCKET)
+
+
+class Master:
+    """Forks ``workers`` servers on one listening socket and keeps them running"""
+
+    def __init__(self, sock: socket.socket, args):
+        self.sock = sock
+        self.args = args
+        self.workers = {}  # pid -> (index, started_at)
+        self.stopping = False
+
+    def spawn(self, index) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                if index == INFERENCE_WORKER:
+                    run_inference_worker(self.sock, self.args)
+                else:
+                    run_worker(index, self.sock, self.args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = (index, time.monotonic())
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if self.args.inference_worker:
+            self.spawn(INFERENCE_WORKER)
+        for index in range(self.args.workers):
+            self.spawn(index)
+        logger.info("Serving", app=self.args.app, url=f"http://{self.args.host}:{self.args.port}",
+                    workers=self.args.workers, pids=",".join(map(str, self.workers)),
+                    inference_worker=self.args.inference_worker)
+
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.2)
+                continue
+            index, started_at = self.workers.pop(pid)
+            if self.stopping:
+                break
+            logger.warning("Worker exited; restarting", worker=index, pid=pid, status=os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started_at < CRASH_LOOP_SECONDS:
+                time.sleep(1.0)
+            self.spawn(index)
+
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.workers:
+            logger.warning("Worker did not stop; killing it", pid=pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:app", help="ASGI app import string")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="intra-op threads per worker (default: cores / workers, at least 1)")
+    parser.add_argument("--model", default="Medicinal_model.h5",
+                        help="model the app serves (INFERENCE_MODEL_PATH takes precedence for numpy)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--inference-worker", action="store_true",
+                        help="run the model in one supervised inference_worker.py process")
+    args = parser.parse_args()
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    if args.inference_worker:
+        # Web workers only decode; the inference worker keeps every core for the model
+        backend = os.getenv("INFERENCE_WORKER_BACKEND", "keras").lower()
+        os.environ["INFERENCE_BACKEND"] = "worker"
+        os.environ.setdefault("PREPROCESS_WORKERS", str(threads))
+    else:
+        backend = os.getenv("INFERENCE_BACKEND", "keras").lower()
+        limit_threads(threads, backend)
+    logger.info("Sized worker thread pools", workers=args.workers, threads=threads, cores=os.cpu_count())
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    preload_model(backend, args.model)
+    Master(listen(args.host, args.port, args.backlog), args).run()
+
+
+if __name__ == "__main__":
+    main()
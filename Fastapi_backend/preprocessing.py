@@ -0,0 +1,91 @@
+"""
+Image preprocessing for the plant classifier
+Kept free of TensorFlow so it can run inside worker processes
+"""
+
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+TARGET_SIZE = (256, 256)
+
+RESAMPLE_FILTERS = {
+    "lanczos": Image.Resampling.LANCZOS,
+    "bicubic": Image.Resampling.BICUBIC,
+    "bilinear": Image.Resampling.BILINEAR,
+    "box": Image.Resampling.BOX,
+    "nearest": Image.Resampling.NEAREST,
+}
+# LANCZOS matches the training pipeline; cheaper filters trade accuracy for speed
+RESAMPLE = os.getenv("PREPROCESS_RESAMPLE", "lanczos").lower()
+# JPEG draft decoding lands at >= DRAFT_OVERSAMPLE x target before the final resize
+DRAFT_OVERSAMPLE = float(os.getenv("PREPROCESS_DRAFT_OVERSAMPLE", "2"))
+# Decompression bomb guard: PIL refuses to decode images this far past the cap
+# (set here so process-pool workers get it too; upload_limits.py enforces it exactly)
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "64000000"))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+_SCALE = np.float32(255.0)
+
+
+def decode_image(image_bytes: bytes, target_size=TARGET_SIZE, resample: str = RESAMPLE) -> np.ndarray:
+    """Decode, convert to RGB and resize; returns a uint8 HxWx3 array.
+
+    JPEGs are decoded in draft mode, letting libjpeg downscale by 1/2, 1/4
+    or 1/8 in the DCT domain so a 12MP photo never materialises at full
+    resolution. The final resize still uses ``resample``.
+    """
+    return decode_image_timed(image_bytes, target_size, resample)[0]
+
+
+def decode_image_timed(image_bytes: bytes, target_size=TARGET_SIZE, resample: str = RESAMPLE):
+    """``decode_image`` plus its (decode_ms, resize_ms), so the caller records
+    them even when this runs in a process-pool worker"""
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+
+    if image.format == "JPEG" and DRAFT_OVERSAMPLE > 0:
+        draft_size = (int(target_size[0] * DRAFT_OVERSAMPLE), int(target_size[1] * DRAFT_OVERSAMPLE))
+        image.draft("RGB", draft_size)
+
+    # Decoding is lazy; load explicitly so it is timed apart from the resize
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    decoded = time.perf_counter()
+    if image.size != tuple(target_size):
+        image = image.resize(target_size, RESAMPLE_FILTERS.get(resample, Image.Resampling.LANCZOS))
+    pixels = np.asarray(image, dtype=np.uint8)
+    return pixels, (decoded - started) * 1000.0, (time.perf_counter() - decoded) * 1000.0
+
+
+def normalize_into(pixels: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Scale uint8 pixels to [0, 1] directly into ``out`` (no temporaries)"""
+    return np.divide(pixels, _SCALE, out=out, dtype=np.float32, casting="unsafe")
+
+
+def normalize(pixels: np.ndarray) -> np.ndarray:
+    """Scale uint8 pixels to [0, 1] and add the batch dimension"""
+    img_array = np.empty((1, *pixels.shape), dtype=np.float32)
+    normalize_into(pixels, img_array[0])
+    return img_array
+
+
+class BatchBuffer:
+    """Preallocated float32 input batch reused across model calls"""
+
+    def __init__(self, max_batch_size: int, image_shape=(*TARGET_SIZE, 3)):
+        self.array = np.empty((max_batch_size, *image_shape), dtype=np.float32)
+
+    def fill(self, index: int, image: np.ndarray) -> None:
+        """Write one image into slot ``index``; uint8 input is normalised in place"""
+        if image.dtype == np.uint8:
+            normalize_into(image, self.array[index])
+        else:
+            self.array[index] = image
+
+    def view(self, size: int) -> np.ndarray:
+        return self.array[:size]
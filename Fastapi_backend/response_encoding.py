@@ -0,0 +1,112 @@
+"""
+Fast JSON encoding for prediction responses
+Static parts are encoded once; per-request parts go through orjson (stdlib json without it)
+"""
+
+import hashlib
+import heapq
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from fastapi import Request, Response
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    orjson = None
+    logger.warning("orjson not installed; responses use the standard json encoder (pip install orjson)")
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Probabilities are reported to this many decimals
+PROBABILITY_DECIMALS = 4
+CLASS_LIST_VERSION_HEADER = "X-Class-List-Version"
+
+
+def probability_list(probabilities: np.ndarray) -> List[float]:
+    """Rounded probabilities as plain floats, in one vectorised pass"""
+    return np.round(np.asarray(probabilities, dtype=np.float64), PROBABILITY_DECIMALS).tolist()
+
+
+def top_indices(probabilities: Sequence[float], k: int) -> List[int]:
+    return heapq.nlargest(k, range(len(probabilities)), key=probabilities.__getitem__)
+
+
+def fragment(**fields) -> bytes:
+    """Pre-encoded ``"key":value`` members to splice into an object with ``encode``"""
+    return dumps(fields)[1:-1]
+
+
+def encode(obj: Dict, *fragments: bytes) -> bytes:
+    """``obj`` as JSON with pre-encoded ``fragments`` appended as further members"""
+    body = dumps(obj)
+    if not fragments:
+        return body
+    separator = b"," if len(body) > 2 else b""
+    return body[:-1] + separator + b",".join(fragments) + b"}"
+
+
+class JSONBytes(Response):
+    """Body that is already encoded JSON"""
+
+    media_type = "application/json"
+
+
+class PredictionEncoder:
+    """Per class list: its version and the maps/arrays responses are built from.
+
+    The full form maps class names to probabilities; the compact form sends
+    only the probability array, aligned with the class list at
+    ``/plants``, and the list's ``version`` so a client fetches the names
+    once and notices when they change.
+    """
+
+    def __init__(self, class_names: Sequence[str]):
+        self.class_names = list(class_names)
+        self.version = hashlib.sha256("\n".join(self.class_names).encode("utf-8")).hexdigest()[:12]
+        self.headers = {CLASS_LIST_VERSION_HEADER: self.version}
+        self.etag = f'"{self.version}"'
+        self.class_list_body = dumps(self.class_names)
+
+    def all_predictions(self, probabilities: List[float], top_k: Optional[int] = None) -> Dict[str, float]:
+        """Class name -> probability; with ``top_k``, the k most likely, highest first"""
+        if top_k is None or top_k >= len(probabilities):
+            return dict(zip(self.class_names, probabilities))
+        return {self.class_names[i]: probabilities[i] for i in top_indices(probabilities, top_k)}
+
+    def compact(self, probabilities: List[float], top_k: Optional[int] = None) -> Dict:
+        """``probabilities`` by class index; with ``top_k``, just those and their ``indices``"""
+        if top_k is None or top_k >= len(probabilities):
+            return {"classes_version": self.version, "probabilities": probabilities}
+        indices = top_indices(probabilities, top_k)
+        return {
+            "classes_version": self.version,
+            "indices": indices,
+            "probabilities": [probabilities[i] for i in indices],
+        }
+
+    def class_list_response(self, request: Request) -> Response:
+        """The class list with its version as ETag, so unchanged lists cost a 304"""
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers={"ETag": self.etag, **self.headers})
+        return JSONBytes(self.class_list_body, headers={"ETag": self.etag, **self.headers})
+
+
+@lru_cache(maxsize=8)
+def _encoder(class_names: tuple) -> PredictionEncoder:
+    return PredictionEncoder(class_names)
+
+
+def encoder_for(class_names: Sequence[str]) -> PredictionEncoder:
+    """Shared encoder for a class list (class lists change only on model reloads)"""
+    return _encoder(tuple(class_names))
@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import case, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from aggregates import LOW_CONFIDENCE_THRESHOLD
+from change_feed import changes_since
+from database import get_async_db
+from model_deployment import resolve_model_path
+from models import Prediction
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, date_filters
+from routes.predictions import deployment, model_lifecycle
+from schemas import ModelLoadRequest, ModelTrafficUpdate
+from datetime import datetime
+from typing import Optional
+import hmac
+import os
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+# Model management and stats rebuilds need it as the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled: ADMIN_TOKEN is not set")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@router.get("/changes", response_model=dict)
+async def get_changes(
+    since: Optional[str] = Query(None, description="cursor from the previous /changes response"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="maximum rows per table"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        return await db.run_sync(changes_since, since, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch changes: {str(e)}")
+
+@router.get("/models", response_model=dict, dependencies=[Depends(require_admin)])
+async def get_models():
+    return deployment.status()
+
+@router.post("/models/load", response_model=dict, status_code=202, dependencies=[Depends(require_admin)])
+async def load_model_version(request: ModelLoadRequest):
+    # Loads and warms in the background; poll GET /models for staging.state
+    await model_lifecycle.wait_ready()
+    path = resolve_model_path(request.path)
+    staging = deployment.stage(path, request.backend, request.mode, request.percent)
+    return {"status": "loading", "message": f"Loading {request.path}", "data": staging.status()}
+
+@router.put("/models/traffic", response_model=dict, dependencies=[Depends(require_admin)])
+async def set_model_traffic(request: ModelTrafficUpdate):
+    deployment.set_traffic(request.mode, request.percent)
+    return {"status": "success", "data": deployment.status()["traffic"]}
+
+@router.post("/models/promote", response_model=dict, dependencies=[Depends(require_admin)])
+async def promote_model_version():
+    serving = deployment.promote()
+    return {"status": "success", "message": f"Serving {serving.version}", "data": serving.stats()}
+
+@router.post("/models/rollback", response_model=dict, dependencies=[Depends(require_admin)])
+async def rollback_model_version():
+    serving = deployment.rollback()
+    return {"status": "success", "message": f"Serving {serving.version}", "data": serving.stats()}
+
+@router.delete("/models/candidate", response_model=dict, dependencies=[Depends(require_admin)])
+async def discard_model_candidate():
+    deployment.discard()
+    return {"status": "success", "message": "Candidate discarded"}
+
+def version_stats(db, since, until):
+    # Served predictions per model version, from the stored rows
+    rows = (
+        db.query(
+            Prediction.model_version,
+            func.count(Prediction.id),
+            func.avg(Prediction.confidence),
+            func.sum(case((Prediction.confidence < LOW_CONFIDENCE_THRESHOLD, 1), else_=0)),
+            func.min(Prediction.timestamp),
+            func.max(Prediction.timestamp),
+        )
+        .filter(*date_filters(Prediction.timestamp, since, until))
+        .group_by(Prediction.model_version)
+        .all()
+    )
+    return [
+        {
+            "model_version": version,
+            "predictions": count,
+            "mean_confidence": round(mean, 4) if mean is not None else None,
+            "low_confidence_rate": round((low or 0) / count, 4) if count else 0.0,
+            "first": first,
+            "last": last,
+        }
+        for version, count, mean, low, first, last in rows
+    ]
+
+@router.get("/models/compare", response_model=dict, dependencies=[Depends(require_admin)])
+async def compare_model_versions(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        versions = await db.run_sync(version_stats, since, until)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compare model versions: {str(e)}")
+    # Latency and shadow agreement exist only for versions loaded in this process
+    for row in versions:
+        serving = deployment.get(row["model_version"]) if row["model_version"] else None
+        if serving is not None:
+            live = serving.stats()
+            row.update(predict_ms=live["predict_ms"], shadow=live["shadow"])
+    return {"low_confidence_threshold": LOW_CONFIDENCE_THRESHOLD, "versions": versions}
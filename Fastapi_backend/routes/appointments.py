@@ -1,19 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from aggregates import record_appointment
+from database import get_async_db
+from event_bus import event_bus
 from models import Appointment, AppointmentStatus
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, date_filters, keyset_page, page_response, parse_fields
 from schemas import AppointmentCreate, AppointmentUpdate, AppointmentResponse
 from typing import List, Optional
+from write_queue import run_write
+from datetime import datetime
 
 router = APIRouter(prefix="/api/appointments", tags=["appointments"])
 
+def insert_appointment(db, data):
+    db_appointment = Appointment(**data)
+    db.add(db_appointment)
+    record_appointment(db, db_appointment.status or AppointmentStatus.pending)
+    db.flush()
+    return db_appointment
+
+def set_appointment_status(db, appointment_id, status):
+    # Row lock: concurrent updates must see each other's status for the counters
+    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).with_for_update().first()
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+
+    record_appointment(db, status, previous_status=appointment.status)
+    appointment.status = status
+    db.flush()
+    # updated_at is set by the database
+    db.refresh(appointment)
+    return appointment
+
 @router.post("/", response_model=dict)
-async def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get_db)):
+async def create_appointment(appointment: AppointmentCreate, db: AsyncSession = Depends(get_async_db)):
     try:
-        db_appointment = Appointment(**appointment.dict())
-        db.add(db_appointment)
-        db.commit()
-        db.refresh(db_appointment)
+        db_appointment = await run_write(db, insert_appointment, appointment.dict())
+        event_bus.publish("appointments", [db_appointment], AppointmentResponse)
         
         return {
             "status": "success",
@@ -24,24 +47,53 @@ async def create_appointment(appointment: AppointmentCreate, db: Session = Depen
             }
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to book appointment: {str(e)}")
 
+APPOINTMENT_FIELDS = list(AppointmentResponse.model_fields)
+
+async def list_appointments(db, filters, limit, cursor, fields, request):
+    projection = parse_fields(fields, APPOINTMENT_FIELDS)
+    appointments, next_cursor = await db.run_sync(keyset_page, Appointment, filters, limit, cursor, projection)
+    return page_response(appointments, next_cursor, None if projection else AppointmentResponse, request)
+
 @router.get("/", response_model=List[AppointmentResponse])
-async def get_all_appointments(db: Session = Depends(get_db)):
+async def get_all_appointments(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    user_id: Optional[str] = None,
+    status: Optional[AppointmentStatus] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        appointments = db.query(Appointment).order_by(Appointment.timestamp.desc()).all()
-        return appointments
+        filters = date_filters(Appointment.timestamp, since, until)
+        if user_id:
+            filters.append(Appointment.user_id == user_id)
+        if status is not None:
+            filters.append(Appointment.status == status)
+        return await list_appointments(db, filters, limit, cursor, fields, request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch appointments: {str(e)}")
 
 @router.get("/pending", response_model=List[AppointmentResponse])
-async def get_pending_appointments(db: Session = Depends(get_db)):
+async def get_pending_appointments(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        appointments = db.query(Appointment).filter(
-            Appointment.status == AppointmentStatus.pending
-        ).order_by(Appointment.timestamp.desc()).all()
-        return appointments
+        filters = [Appointment.status == AppointmentStatus.pending]
+        return await list_appointments(db, filters, limit, cursor, fields, request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch pending appointments: {str(e)}")
 
@@ -49,16 +101,11 @@ async def get_pending_appointments(db: Session = Depends(get_db)):
 async def update_appointment_status(
     appointment_id: int,
     appointment_update: AppointmentUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
-        if not appointment:
-            raise HTTPException(status_code=404, detail="Appointment not found")
-        
-        appointment.status = appointment_update.status
-        db.commit()
-        db.refresh(appointment)
+        appointment = await run_write(db, set_appointment_status, appointment_id, appointment_update.status)
+        event_bus.publish("appointments", [appointment], AppointmentResponse)
         
         return {
             "status": "success",
@@ -69,13 +116,13 @@ async def update_appointment_status(
             }
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update appointment: {str(e)}")
 
 @router.get("/{appointment_id}", response_model=AppointmentResponse)
-async def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
+async def get_appointment(appointment_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+        appointment = await db.get(Appointment, appointment_id)
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found")
         return appointment
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from event_bus import EVENT_KEEPALIVE_SECONDS, event_bus
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# Browsers wait this long (ms) before reconnecting a dropped EventSource
+SSE_RETRY_MS = 3000
+
+@router.get("")
+async def stream_events(request: Request):
+    # EventSource resends the last id it saw when it reconnects
+    subscription = event_bus.subscribe(request.headers.get("last-event-id"))
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many event stream subscribers")
+
+    async def stream():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            # Ends at app shutdown; under uvicorn, which holds the lifespan shutdown
+            # until connections close, timeout_graceful_shutdown cancels it first
+            while not event_bus.shutdown.is_set():
+                frame = await subscription.next_frame(EVENT_KEEPALIVE_SECONDS)
+                if frame is None:
+                    if event_bus.shutdown.is_set() or await request.is_disconnected():
+                        break
+                    # Comment line keeps proxies from timing out an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield frame
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/stats", response_model=dict)
+async def get_event_stats():
+    return event_bus.stats()
@@ -1,19 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from aggregates import record_feedback
+from database import get_async_db
+from event_bus import event_bus
 from models import Feedback
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, date_filters, keyset_page, page_response, parse_fields
 from schemas import FeedbackCreate, FeedbackResponse
-from typing import List
+from typing import List, Optional
+from write_queue import run_write
+from datetime import datetime
 
 router = APIRouter(prefix="/api/feedback", tags=["feedback"])
 
+def insert_feedback(db, data):
+    db_feedback = Feedback(**data)
+    db.add(db_feedback)
+    record_feedback(db)
+    db.flush()
+    return db_feedback
+
 @router.post("/", response_model=dict)
-async def create_feedback(feedback: FeedbackCreate, db: Session = Depends(get_db)):
+async def create_feedback(feedback: FeedbackCreate, db: AsyncSession = Depends(get_async_db)):
     try:
-        db_feedback = Feedback(**feedback.dict())
-        db.add(db_feedback)
-        db.commit()
-        db.refresh(db_feedback)
+        # Server defaults (timestamps) come back through INSERT ... RETURNING
+        db_feedback = await run_write(db, insert_feedback, feedback.dict())
+        event_bus.publish("feedback", [db_feedback], FeedbackResponse)
         
         return {
             "status": "success",
@@ -21,13 +32,31 @@ async def create_feedback(feedback: FeedbackCreate, db: Session = Depends(get_db
             "data": {"id": db_feedback.id}
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save feedback: {str(e)}")
 
+FEEDBACK_FIELDS = list(FeedbackResponse.model_fields)
+
 @router.get("/", response_model=List[FeedbackResponse])
-async def get_all_feedback(db: Session = Depends(get_db)):
+async def get_all_feedback(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        feedback_list = db.query(Feedback).order_by(Feedback.timestamp.desc()).all()
-        return feedback_list
+        filters = date_filters(Feedback.timestamp, since, until)
+        if user_id:
+            filters.append(Feedback.user_id == user_id)
+
+        projection = parse_fields(fields, FEEDBACK_FIELDS)
+        feedback_list, next_cursor = await db.run_sync(keyset_page, Feedback, filters, limit, cursor, projection)
+        return page_response(feedback_list, next_cursor, None if projection else FeedbackResponse, request)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch feedback: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch feedback: {str(e)}")
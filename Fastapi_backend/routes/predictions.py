@@ -1,97 +1,297 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import Prediction
 from schemas import PredictionResponse
 from typing import List, Optional
+from datetime import datetime
+import asyncio
 import os
-import tensorflow as tf
+import time
 import numpy as np
-from PIL import Image
-import io
+
+from batch_upload import NDJSON_MEDIA_TYPE, PREDICT_BATCH_CHUNK, collect_images, error_detail, ndjson, predict_many
+from executors import preprocess_executor
+from model_deployment import ModelDeployment
+from model_lifecycle import ModelLifecycle
+from inference_backends import create_backend
+from logs import get_logger
+from metrics import elapsed_ms, record_prediction, stage_ms
+from model_registry import DEFAULT_CLASS_NAMES
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, date_filters, keyset_page, page_response, parse_fields
+from preprocessing import decode_image_timed
+from prediction_cache import CACHE_TENSOR_TIER, content_key, prediction_cache, tensor_key
+from prediction_log import prediction_log
+from response_encoding import JSONBytes, dumps, encoder_for, fragment, probability_list
+from upload_limits import check_upload, stats as upload_limit_stats
+from upload_store import upload_store
 
 router = APIRouter(prefix="/api", tags=["predictions"])
+logger = get_logger(__name__)
 
 # Load your trained model
-model = None
-class_names = [
-    'Basale', 'Betle', 'Drumstick', 'Guava', 'Jackfruit',
-    'Lemon', 'Mentha', 'Neem', 'Roxburgh fig', 'sinensis'
-]
+MODEL_PATH = "Medicinal_model.h5"
+
+# Active version plus optional canary/shadow candidate (admin: /api/admin/models)
+deployment = ModelDeployment(scheduler_name="api_predict")
 
 def load_model():
-    global model
+    # Runs on the background loader; the registry shares weights with other routers
+    # INFERENCE_BACKEND picks Keras, TFLite or ONNX
+    deployment.activate(create_backend(model_path=MODEL_PATH))
+
+def warm_up_model():
+    # Traces each WARMUP_BATCH_SIZES shape; timings show up in /api/model/status
+    return deployment.active.backend.warm_up()
+
+async def preprocess_image(image_bytes):
     try:
-        model = tf.keras.models.load_model("Medicinal_model.h5", compile=False)
-        return True
+        # uint8 pixels; normalised directly into the batch buffer
+        pixels, decode_ms, resize_ms = await preprocess_executor.run(decode_image_timed, image_bytes)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Model loading failed: {e}")
-        return False
+        raise HTTPException(status_code=400, detail=f"Image preprocessing failed: {str(e)}")
+    stage_ms["decode"].observe(decode_ms)
+    stage_ms["resize"].observe(resize_ms)
+    return pixels
+
+# Started from the app lifespan (see integrated_main.py)
+model_lifecycle = ModelLifecycle("Prediction router model", load_model, warm_up_model)
+
+def build_prediction_payload(probabilities):
+    # Probabilities by class index; named per response (see response_encoding.py)
+    predicted_idx = int(np.argmax(probabilities))
+    return {
+        "predicted_index": predicted_idx,
+        "confidence": float(probabilities[predicted_idx]),
+        "probabilities": probability_list(probabilities),
+    }
+
+# Envelope of every /predict response, encoded once: PREDICT_PREFIX + data + b"}"
+PREDICT_PREFIX = b"{" + fragment(status="success", message="Prediction completed successfully") + b',"data":'
+
+async def predict_payload(image_bytes, serving):
+    # Re-uploads of the same photo skip preprocessing and inference (per model version)
+    model_version = serving.version
+    raw_key = content_key(image_bytes, model_version)
+    payload = await prediction_cache.get(raw_key)
+    if payload is not None:
+        return payload
 
-def preprocess_image(image_bytes):
-    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-    image = image.resize((256, 256), Image.Resampling.LANCZOS)
-    img_array = np.array(image, dtype=np.float32) / 255.0
-    return np.expand_dims(img_array, axis=0)
+    pixels = await preprocess_image(image_bytes)
+    pixel_key = tensor_key(pixels, model_version) if CACHE_TENSOR_TIER else None
+    payload = await prediction_cache.get(pixel_key) if pixel_key else None
+    if payload is None:
+        # Make prediction (batched with concurrent requests to the same version)
+        probabilities = await serving.predict(pixels)
+        payload = build_prediction_payload(probabilities)
+        if pixel_key:
+            prediction_cache.put(pixel_key, payload)
 
-# Load model on startup
-model_loaded = load_model()
+    prediction_cache.put(raw_key, payload)
+    return payload
+
+async def store_image(save, source):
+    # A storage outage costs the picture, not the prediction
+    try:
+        return await save(source)
+    except Exception as e:
+        logger.warning("Could not store uploaded image", error=str(e))
+        return {"url": None, "thumbnail_url": None}
 
 @router.post("/predict", response_model=dict)
 async def predict_plant(
     file: UploadFile = File(...),
     user_id: str = Form(...),
-    db: Session = Depends(get_db)
+    top_k: Optional[int] = Query(None, ge=1, description="Only the k most likely classes"),
+    compact: bool = Query(False, description="Probabilities as an array aligned with /api/plants")
 ):
-    if not model_loaded:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    # 413/415 from the spooled file's size and header, before it is read or decoded
+    await check_upload(file)
+    await model_lifecycle.wait_ready()
     
     try:
-        # Process image
-        image_bytes = await file.read()
-        processed_image = preprocess_image(image_bytes)
+        # One version serves the whole request, even if traffic switches meanwhile
+        serving = deployment.route(user_id)
+        class_names = serving.class_names
         
-        # Make prediction
-        predictions = model.predict(processed_image, verbose=0)
-        predicted_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_idx])
+        # Process image (cached by content digest)
+        started = time.perf_counter()
+        image_bytes = await file.read()
+        stage_ms["upload_read"].observe(elapsed_ms(started))
+        payload = await predict_payload(image_bytes, serving)
+        predicted_idx = payload["predicted_index"]
+        confidence = payload["confidence"]
         predicted_class = class_names[predicted_idx]
+        serving.record_served(confidence)
+        record_prediction(predicted_class, confidence)
+        
+        shadow = deployment.shadow_for(user_id)
+        if shadow is not None:
+            deployment.run_shadow(shadow, lambda version: predict_payload(image_bytes, version), predicted_class)
         
-        # Save prediction to database
-        db_prediction = Prediction(
-            user_id=user_id,
-            image_url=f"uploads/{file.filename}",  # You can implement file storage
-            prediction_result=predicted_class,
-            confidence=confidence
-        )
-        db.add(db_prediction)
-        db.commit()
-        db.refresh(db_prediction)
+        # Content-addressed: a photo uploaded again is not stored twice
+        stored = await store_image(upload_store.save, file)
         
-        # Create response with all predictions
-        all_predictions = {}
-        for i, class_name in enumerate(class_names):
-            all_predictions[class_name] = round(float(predictions[0][i]), 4)
+        # Logged write-behind: stored (and announced) by the next flush
+        logged = await prediction_log.append({
+            "user_id": user_id,
+            "image_url": stored["url"],
+            "thumbnail_url": stored["thumbnail_url"],
+            "prediction_result": predicted_class,
+            "confidence": confidence,
+            "model_version": serving.version
+        })
         
-        return {
-            "status": "success",
-            "message": "Prediction completed successfully",
-            "data": {
-                "predicted_class": predicted_class,
-                "confidence": round(confidence, 4),
-                "all_predictions": all_predictions,
-                "prediction_id": db_prediction.id
-            }
-        }
+        started = time.perf_counter()
+        encoder = encoder_for(class_names)
+        data = {"predicted_class": predicted_class, "confidence": round(confidence, 4)}
+        if compact:
+            data.update(predicted_index=predicted_idx, **encoder.compact(payload["probabilities"], top_k))
+        else:
+            data["all_predictions"] = encoder.all_predictions(payload["probabilities"], top_k)
+        data["prediction_id"] = logged["uid"]
+        data["model_version"] = serving.version
         
+        response = JSONBytes(PREDICT_PREFIX + dumps(data) + b"}", headers=encoder.headers if compact else None)
+        stage_ms["serialize"].observe(elapsed_ms(started))
+        return response
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@router.post("/predict/batch")
+async def predict_plant_batch(
+    files: List[UploadFile] = File(...),
+    user_id: str = Form(...)
+):
+    """Predict many images (or a zip/tar of images) and stream NDJSON results.
+
+    One line per image in upload order, then a summary line carrying the
+    uids of the rows handed to the prediction log in one go.
+    """
+    await model_lifecycle.wait_ready()
+
+    images = await collect_images(files)
+    serving = deployment.route(user_id)
+    class_names = serving.class_names
+
+    async def stream():
+        rows = []
+        for start in range(0, len(images), PREDICT_BATCH_CHUNK):
+            chunk = images[start:start + PREDICT_BATCH_CHUNK]
+            results = await predict_many(
+                chunk, serving.version, preprocess_image, serving.backend.predict, build_prediction_payload
+            )
+            stored = iter(await asyncio.gather(*(
+                store_image(upload_store.save_bytes, image_bytes)
+                for (_, image_bytes), result in zip(chunk, results) if not isinstance(result, Exception)
+            )))
+            for offset, ((filename, _), result) in enumerate(zip(chunk, results)):
+                line = {"index": start + offset, "filename": filename}
+                if isinstance(result, Exception):
+                    line["error"] = error_detail(result)
+                else:
+                    predicted_class = class_names[result["predicted_index"]]
+                    image = next(stored)
+                    rows.append({
+                        "user_id": user_id,
+                        "image_url": image["url"],
+                        "thumbnail_url": image["thumbnail_url"],
+                        "prediction_result": predicted_class,
+                        "confidence": result["confidence"],
+                        "model_version": serving.version,
+                    })
+                    serving.record_served(result["confidence"])
+                    record_prediction(predicted_class, result["confidence"])
+                    line.update({
+                        "predicted_class": predicted_class,
+                        "confidence": round(result["confidence"], 4),
+                        "all_predictions": encoder_for(class_names).all_predictions(result["probabilities"]),
+                    })
+                yield ndjson(line)
+
+        summary = {"done": True, "count": len(images), "model_version": serving.version}
+        try:
+            prediction_ids = [row["uid"] for row in await prediction_log.extend(rows)]
+            summary.update({"saved": len(prediction_ids), "prediction_ids": prediction_ids})
+        except Exception as e:
+            summary["error"] = f"Failed to save predictions: {str(e)}"
+        yield ndjson(summary)
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+@router.get("/plants", response_model=List[str])
+async def list_plants(
+    request: Request,
+    model_version: Optional[str] = Query(None, description="model_version of a /predict response (canary)")
+):
+    # ETag / X-Class-List-Version match classes_version in compact /predict responses
+    serving = deployment.get(model_version) if model_version else deployment.active
+    if serving is None and model_version:
+        raise HTTPException(status_code=404, detail=f"Model version {model_version} is not loaded")
+    return encoder_for(serving.class_names if serving else DEFAULT_CLASS_NAMES).class_list_response(request)
+
+@router.get("/model/status", response_model=dict)
+async def get_model_status():
+    return model_lifecycle.status()
+
+@router.get("/model/batching", response_model=dict)
+async def get_batching_stats():
+    serving = deployment.active
+    return serving.scheduler.stats() if serving is not None else {}
+
+@router.get("/predictions/log", response_model=dict)
+async def get_prediction_log_stats():
+    return prediction_log.stats()
+
+@router.get("/predictions/uploads", response_model=dict)
+async def get_upload_stats():
+    return {**upload_store.stats(), "limits": upload_limit_stats()}
+
+@router.get("/model/cache", response_model=dict)
+async def get_cache_stats():
+    serving = deployment.active
+    return {"model_version": serving.version if serving is not None else None, **prediction_cache.stats()}
+
+PREDICTION_FIELDS = list(PredictionResponse.model_fields)
+
 @router.get("/predictions", response_model=List[PredictionResponse])
-async def get_all_predictions(db: Session = Depends(get_db)):
+async def get_all_predictions(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    user_id: Optional[str] = None,
+    predicted_class: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    max_confidence: Optional[float] = Query(None, ge=0, le=1),
+    model_version: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        predictions = db.query(Prediction).order_by(Prediction.timestamp.desc()).all()
-        return predictions
+        filters = date_filters(Prediction.timestamp, since, until)
+        if user_id:
+            filters.append(Prediction.user_id == user_id)
+        if predicted_class:
+            filters.append(Prediction.prediction_result == predicted_class)
+        if min_confidence is not None:
+            filters.append(Prediction.confidence >= min_confidence)
+        if max_confidence is not None:
+            filters.append(Prediction.confidence <= max_confidence)
+        if model_version:
+            filters.append(Prediction.model_version == model_version)
+
+        projection = parse_fields(fields, PREDICTION_FIELDS)
+        predictions, next_cursor = await db.run_sync(keyset_page, Prediction, filters, limit, cursor, projection)
+        return page_response(predictions, next_cursor, None if projection else PredictionResponse, request)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch predictions: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch predictions: {str(e)}")
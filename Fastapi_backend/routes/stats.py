@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from aggregates import STATS_DAYS, read_stats, rebuild_aggregates
+from database import SessionLocal, get_async_db
+from routes.admin import require_admin
+from write_queue import write_queue
+
+router = APIRouter(prefix="/api/stats", tags=["stats"])
+
+@router.get("", response_model=dict)
+async def get_stats(
+    days: int = Query(STATS_DAYS, ge=0, le=366, description="days of daily volumes to include"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        return await db.run_sync(read_stats, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch stats: {str(e)}")
+
+def rebuild_with_session():
+    db = SessionLocal()
+    try:
+        return rebuild_aggregates(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@router.post("/rebuild", response_model=dict, dependencies=[Depends(require_admin)])
+async def rebuild_stats():
+    try:
+        # Full scan of the base tables; a sync session in a worker thread keeps it off the event loop
+        rebuilt = await run_in_threadpool(rebuild_with_session)
+        return {"status": "success", "message": "Stats rebuilt", "data": rebuilt}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild stats: {str(e)}")
+
+@router.get("/writer", response_model=dict)
+async def get_writer_stats():
+    # Group-commit sizes and waits of the SQLite write queue
+    if write_queue is None:
+        return {"enabled": False}
+    return write_queue.stats()
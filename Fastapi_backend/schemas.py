@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 from models import AppointmentStatus
 
 class FeedbackCreate(BaseModel):
@@ -12,6 +12,7 @@ class FeedbackResponse(BaseModel):
     user_id: str
     message: str
     timestamp: datetime
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -19,20 +20,34 @@ class FeedbackResponse(BaseModel):
 class PredictionCreate(BaseModel):
     user_id: str
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     prediction_result: str
     confidence: float
+    model_version: Optional[str] = None
 
 class PredictionResponse(BaseModel):
     id: int
     user_id: str
     image_url: Optional[str]
+    thumbnail_url: Optional[str] = None
     prediction_result: str
     confidence: float
     timestamp: datetime
+    uid: Optional[str] = None
+    model_version: Optional[str] = None
     
     class Config:
         from_attributes = True
 
+class ModelTrafficUpdate(BaseModel):
+    mode: Literal["off", "canary", "shadow"] = "off"
+    percent: float = Field(0.0, ge=0, le=100)
+
+class ModelLoadRequest(ModelTrafficUpdate):
+    # Relative to MODEL_DIR
+    path: str
+    backend: Optional[Literal["keras", "tflite", "onnx", "numpy"]] = None
+
 class AppointmentCreate(BaseModel):
     user_id: str
     name: str
@@ -54,6 +69,7 @@ class AppointmentResponse(BaseModel):
     reason: str
     status: AppointmentStatus
     timestamp: datetime
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
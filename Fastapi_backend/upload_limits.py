@@ -0,0 +1,174 @@
+"""
+Upload limits enforced before any decode work
+Oversize bodies are cut off while streaming; images are sniffed and size-checked from their headers
+"""
+
+import io
+import json
+import os
+from typing import BinaryIO, Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from metrics import registry
+from preprocessing import MAX_IMAGE_PIXELS
+
+# One image (a single upload or an archive member)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Whole request body, e.g. a batch or an archive; single-image routes get MAX_UPLOAD_BYTES
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+# Single-image routes: one image plus room for multipart boundaries and form fields
+SINGLE_IMAGE_REQUEST_BYTES = MAX_UPLOAD_BYTES + 64 * 1024
+
+# Leading bytes of each accepted format -> format name reported by PIL
+SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"BM", "BMP"),
+)
+SNIFF_BYTES = 16
+
+REASONS = ("request_size", "file_size", "type", "pixels", "corrupt")
+rejected = registry.counter("uploads_rejected_total", "Uploads rejected before decoding")
+rejected_bytes = registry.counter("uploads_rejected_bytes_total", "Bytes of rejected uploads")
+rejected_by_reason = {
+    reason: registry.counter(f"uploads_rejected_{reason}_total", f"Uploads rejected for {reason}")
+    for reason in REASONS
+}
+
+
+class UploadRejected(HTTPException):
+    """413/415 for an upload refused before decoding; counted by reason"""
+
+    def __init__(self, status_code: int, reason: str, detail: str, size: int = 0):
+        super().__init__(status_code=status_code, detail=detail)
+        self.reason = reason
+        rejected.inc()
+        rejected_bytes.inc(size)
+        rejected_by_reason[reason].inc()
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Image format from the first bytes, whatever the client claimed"""
+    for signature, name in SIGNATURES:
+        if head.startswith(signature):
+            return name
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def check_image(stream: BinaryIO, size: int, name: str = "upload") -> None:
+    """Reject ``stream`` unless it is an accepted image within the byte and pixel caps.
+
+    Only the header is parsed (``Image.open`` is lazy), so a small file
+    that would expand to gigabytes of pixels is refused without decoding.
+    """
+    check_size(size, name)
+
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    if sniff(head) is None:
+        raise UploadRejected(415, "type", f"{name} is not a JPEG, PNG, WebP or BMP image", size)
+
+    try:
+        with Image.open(stream) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        # PIL's own guard fires at open() past twice the cap
+        raise UploadRejected(413, "pixels", f"{name} is over {MAX_IMAGE_PIXELS} pixels", size)
+    except Exception:
+        raise UploadRejected(415, "corrupt", f"{name} could not be read as an image", size)
+    finally:
+        stream.seek(0)
+
+    if width * height > MAX_IMAGE_PIXELS:
+        raise UploadRejected(
+            413, "pixels", f"{name} is {width}x{height} pixels (max {MAX_IMAGE_PIXELS} pixels)", size
+        )
+
+
+def check_image_bytes(data: bytes, name: str = "upload") -> None:
+    check_image(io.BytesIO(data), len(data), name)
+
+
+def check_size(size: int, name: str = "upload") -> None:
+    """By size alone, e.g. an archive member before it is extracted"""
+    if size > MAX_UPLOAD_BYTES:
+        raise UploadRejected(413, "file_size", f"{name} is {size} bytes (max {MAX_UPLOAD_BYTES})", size)
+
+
+async def check_upload(upload: UploadFile) -> None:
+    """Validate an UploadFile from its spooled body, before it is read into memory"""
+    size = upload.size
+    if size is None:
+        upload.file.seek(0, os.SEEK_END)
+        size = upload.file.tell()
+        upload.file.seek(0)
+    await run_in_threadpool(check_image, upload.file, size, upload.filename or "upload")
+
+
+class UploadLimitMiddleware:
+    """Caps request bodies while they stream in.
+
+    A declared Content-Length over the limit is answered with 413 without
+    reading the body; otherwise bytes are counted as they arrive and the
+    request fails with 413 the moment it passes the limit, so an oversize
+    upload is never spooled in full. ``limits`` maps exact paths to their
+    own cap (single-image routes), everything else gets ``max_bytes``.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES, limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.limits = limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits.get(scope["path"], self.max_bytes)
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            error = UploadRejected(413, "request_size", f"Request body is {int(declared)} bytes (max {limit})",
+                                   int(declared))
+            await self._reject(send, error)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise UploadRejected(413, "request_size", f"Request body exceeds {limit} bytes", received)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(send, error: UploadRejected) -> None:
+        body = json.dumps({"detail": error.detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": error.status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def stats() -> Dict:
+    return {
+        "max_upload_bytes": MAX_UPLOAD_BYTES,
+        "max_request_bytes": MAX_REQUEST_BYTES,
+        "max_image_pixels": MAX_IMAGE_PIXELS,
+        "rejected": int(rejected.value),
+        "rejected_bytes": int(rejected_bytes.value),
+        "by_reason": {reason: int(counter.value) for reason, counter in rejected_by_reason.items()},
+    }
@@ -0,0 +1,306 @@
+"""
+Content-addressed storage for uploaded images
+Objects are named by SHA-256 in a sharded layout, stored once, and get a thumbnail for the dashboard
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Optional
+
+from fastapi import UploadFile
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from logs import get_logger
+from metrics import registry
+
+logger = get_logger(__name__)
+
+# local | s3
+UPLOAD_BACKEND = os.getenv("UPLOAD_BACKEND", "local").lower()
+# Local root; also served at /uploads (profile pictures live here too)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+
+# S3 or any S3-compatible service (MinIO, moto_server, ...)
+UPLOAD_S3_BUCKET = os.getenv("UPLOAD_S3_BUCKET", "")
+UPLOAD_S3_PREFIX = os.getenv("UPLOAD_S3_PREFIX", "")
+UPLOAD_S3_ENDPOINT_URL = os.getenv("UPLOAD_S3_ENDPOINT_URL", "")
+UPLOAD_S3_REGION = os.getenv("UPLOAD_S3_REGION", "")
+# Base of the links stored in image_url (default: <endpoint>/<bucket>)
+UPLOAD_S3_PUBLIC_URL = os.getenv("UPLOAD_S3_PUBLIC_URL", "")
+
+IMAGES = "images"
+THUMBNAILS = "thumbnails"
+# PIL format -> (extension, content type) of stored originals
+IMAGE_TYPES = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+    "BMP": (".bmp", "image/bmp"),
+    "GIF": (".gif", "image/gif"),
+    "TIFF": (".tif", "image/tiff"),
+}
+UNKNOWN_TYPE = (".bin", "application/octet-stream")
+
+
+def sharded_key(kind: str, digest: str, extension: str) -> str:
+    """``images/ab/cd/abcd...ef.jpg``: two levels of 256 keep directories small"""
+    return f"{kind}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+class StorageBackend(ABC):
+    """Where stored objects live; keys are '/'-separated relative paths"""
+
+    name = "base"
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def put_file(self, key: str, path: str, content_type: str) -> None:
+        """Store the finished temp file at ``path`` under ``key``; the file may be moved"""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Link stored in the database (relative to the API for local files)"""
+
+    def temp_dir(self) -> Optional[str]:
+        """Directory for in-progress uploads (None = system default)"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Files under ``root``; temp files live beside them so a store is one rename"""
+
+    name = "local"
+
+    def __init__(self, root: str = UPLOAD_DIR, url_prefix: str = "uploads"):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+        self._tmp = os.path.join(root, ".tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key: str, path: str, content_type: str) -> None:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Atomic: readers see the whole object or nothing; a racing
+        # identical upload just replaces it with the same bytes
+        os.replace(path, target)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def temp_dir(self) -> Optional[str]:
+        return self._tmp
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible bucket through boto3 (pip install -r requirements_s3.txt)"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str = UPLOAD_S3_BUCKET, prefix: str = UPLOAD_S3_PREFIX,
+                 endpoint_url: str = UPLOAD_S3_ENDPOINT_URL, region: str = UPLOAD_S3_REGION,
+                 public_url: str = UPLOAD_S3_PUBLIC_URL, client=None):
+        if not bucket:
+            raise RuntimeError("UPLOAD_S3_BUCKET must be set for UPLOAD_BACKEND=s3")
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("UPLOAD_BACKEND=s3 needs boto3 (pip install -r requirements_s3.txt)")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        base = public_url or f"{(endpoint_url or f'https://{bucket}.s3.amazonaws.com').rstrip('/')}"
+        if not public_url and endpoint_url:
+            # Path-style for custom endpoints
+            base = f"{base}/{bucket}"
+        self.public_url = base.rstrip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, key: str, path: str, content_type: str) -> None:
+        # upload_file switches to multipart for large files on its own
+        self.client.upload_file(path, self.bucket, self._key(key), ExtraArgs={"ContentType": content_type})
+        os.remove(path)
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{self._key(key)}"
+
+
+def create_storage(backend: str = UPLOAD_BACKEND) -> StorageBackend:
+    if backend == "local":
+        return LocalStorage()
+    if backend == "s3":
+        return S3Storage()
+    raise RuntimeError(f"Unknown UPLOAD_BACKEND {backend!r} (expected local or s3)")
+
+
+def make_thumbnail(source: BinaryIO, size: int = THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """JPEG of at most ``size`` x ``size``, upright per EXIF"""
+    with Image.open(source) as image:
+        # JPEG decoders can scale down while decoding, far cheaper than a full decode
+        image.draft("RGB", (size * 2, size * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+
+def detect_type(path: str):
+    """(extension, content type) from the file's contents, not its name"""
+    try:
+        with Image.open(path) as image:
+            return IMAGE_TYPES.get(image.format, UNKNOWN_TYPE)
+    except Exception:
+        return UNKNOWN_TYPE
+
+
+class UploadStore:
+    """Streams uploads into ``backend`` named by their SHA-256.
+
+    The body is copied in ``chunk_size`` pieces to a temp file while it is
+    hashed, so memory use does not grow with the upload. An object whose
+    digest is already stored is discarded as a duplicate; otherwise it is
+    stored along with a ``thumbnail_size`` JPEG thumbnail.
+    """
+
+    def __init__(self, backend: StorageBackend, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 thumbnail_size: int = THUMBNAIL_SIZE):
+        self.backend = backend
+        self.chunk_size = max(1, chunk_size)
+        self.thumbnail_size = thumbnail_size
+        self.stored = registry.counter("uploads_stored_total", "Uploaded images written to storage")
+        self.deduplicated = registry.counter("uploads_deduplicated_total", "Uploads already in storage")
+        self.bytes_stored = registry.counter("uploads_stored_bytes_total", "Bytes of new uploaded images")
+
+    async def save(self, upload: UploadFile) -> Dict:
+        """Store an UploadFile from its spooled body (rewound first)"""
+        upload.file.seek(0)
+        return await run_in_threadpool(self.save_stream, upload.file)
+
+    async def save_bytes(self, data: bytes) -> Dict:
+        """Store an image already in memory (e.g. extracted from an archive)"""
+        return await run_in_threadpool(self.save_stream, io.BytesIO(data))
+
+    def save_stream(self, stream: BinaryIO) -> Dict:
+        sha = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.backend.temp_dir(), suffix=".upload")
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            extension, content_type = detect_type(temp_path)
+            key = sharded_key(IMAGES, digest, extension)
+            thumbnail_key = sharded_key(THUMBNAILS, digest, ".jpg")
+
+            duplicate = self.backend.exists(key)
+            if duplicate:
+                self.deduplicated.inc()
+            else:
+                if content_type != UNKNOWN_TYPE[1]:
+                    self._store_thumbnail(temp_path, thumbnail_key)
+                self.backend.put_file(key, temp_path, content_type)
+                self.stored.inc()
+                self.bytes_stored.inc(size)
+
+            has_thumbnail = content_type != UNKNOWN_TYPE[1] and (not duplicate or self.backend.exists(thumbnail_key))
+            return {
+                "sha256": digest,
+                "size": size,
+                "content_type": content_type,
+                "key": key,
+                "url": self.backend.url(key),
+                "thumbnail_url": self.backend.url(thumbnail_key) if has_thumbnail else None,
+                "deduplicated": duplicate,
+            }
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _store_thumbnail(self, image_path: str, key: str) -> None:
+        try:
+            with open(image_path, "rb") as source:
+                thumbnail = make_thumbnail(source, self.thumbnail_size)
+        except Exception as e:
+            logger.warning("Could not thumbnail upload", key=key, error=str(e))
+            return
+        fd, temp_path = tempfile.mkstemp(dir=self.backend.temp_dir(), suffix=".thumb")
+        with os.fdopen(fd, "wb") as temp:
+            temp.write(thumbnail)
+        try:
+            self.backend.put_file(key, temp_path, "image/jpeg")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend.name,
+            "stored": int(self.stored.value),
+            "deduplicated": int(self.deduplicated.value),
+            "bytes_stored": int(self.bytes_stored.value),
+        }
+
+
+upload_store = UploadStore(create_storage())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Check the NumPy engine against Keras on the same inputs
+Exits non-zero when outputs drift beyond --tolerance or the top-1 class differs
+
+Usage:
+    python verify_numpy_engine.py                          # Medicinal_model.h5, random inputs
+    python verify_numpy_engine.py --graph model_graph.json leaf1.jpg leaf2.jpg
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import numpy as np
+
+from numpy_engine import NumpyModel
+from preprocessing import TARGET_SIZE, decode_image, normalize
+
+
+def load_inputs(paths, count: int) -> np.ndarray:
+    if not paths:
+        return np.random.default_rng(0).random((count, *TARGET_SIZE, 3), dtype=np.float32)
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(normalize(decode_image(f.read()))[0])
+    return np.stack(images)
+
+
+def timed(fn, batch: np.ndarray, repeats: int) -> float:
+    fn(batch)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(batch)
+    return round((time.perf_counter() - started) * 1000.0 / repeats, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="images to compare on (default: random pixels)")
+    parser.add_argument("--model", default="Medicinal_model.h5")
+    parser.add_argument("--graph", help="model_graph.json from extract_weights.py (default: read the H5)")
+    parser.add_argument("--count", type=int, default=8, help="random inputs when no images are given")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="maximum absolute probability difference")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    batch = load_inputs(args.images, args.count)
+
+    started = time.perf_counter()
+    engine = NumpyModel.load(args.graph or args.model)
+    engine_load_ms = (time.perf_counter() - started) * 1000.0
+
+    import tensorflow as tf
+    keras_model = tf.keras.models.load_model(args.model, compile=False)
+    expected = keras_model(batch, training=False).numpy()
+    actual = engine.predict(batch)
+
+    max_diff = float(np.abs(actual - expected).max())
+    agreement = float((actual.argmax(axis=1) == expected.argmax(axis=1)).mean())
+    report = {
+        "inputs": len(batch),
+        "max_abs_diff": max_diff,
+        "mean_abs_diff": float(np.abs(actual - expected).mean()),
+        "top1_agreement": agreement,
+        "numpy_load_ms": round(engine_load_ms, 1),
+        "numpy_batch_1_ms": timed(engine.predict, batch[:1], args.repeats),
+        "keras_batch_1_ms": timed(lambda x: keras_model(x, training=False).numpy(), batch[:1], args.repeats),
+        "passed": max_diff <= args.tolerance and agreement == 1.0,
+    }
+    print(json.dumps(report, indent=2))
+    if not report["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,13 @@ from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-import tensorflow as tf
 import numpy as np
-from PIL import Image
-import io
 from typing import Dict, List
 
+from executors import inference_executor, preprocess_executor
+from model_registry import model_registry
+from preprocessing import decode_image, normalize
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Medicinal Plant Classifier API",
@@ -54,27 +55,24 @@ def load_model_and_classes():
             'Lemon', 'Mentha', 'Neem', 'Roxburgh fig', 'sinensis'
         ]
     
-    # Load model
+    # Load model (validated against the class list, shared per process)
     try:
-        if os.path.exists(MODEL_PATH):
-            model = tf.keras.models.load_model(MODEL_PATH, compile=False)
-            print(f"Loaded model from {MODEL_PATH}")
-        else:
-            raise Exception(f"Model file {MODEL_PATH} not found")
+        loaded = model_registry.load(MODEL_PATH, CLASS_NAMES_PATH)
+        model = loaded.model
+        class_names = loaded.class_names
+        print(f"Loaded model from {MODEL_PATH}")
     except Exception as e:
         print(f"Error loading model: {e}")
         raise e
 
-def preprocess_image(image_bytes: bytes) -> np.ndarray:
+async def preprocess_image(image_bytes: bytes) -> np.ndarray:
     try:
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        image = image.resize(TARGET_SIZE, Image.Resampling.LANCZOS)
-        img_array = np.array(image, dtype=np.float32)
-        img_array = img_array / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        return img_array
+        pixels = await preprocess_executor.run(decode_image, image_bytes, TARGET_SIZE)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Image preprocessing failed: {str(e)}")
+    return normalize(pixels)
 
 # Load model on startup
 load_model_and_classes()
@@ -107,10 +105,10 @@ async def predict_plant(file: UploadFile = File(...)) -> Dict:
     try:
         # Read and preprocess image
         image_bytes = await file.read()
-        processed_image = preprocess_image(image_bytes)
+        processed_image = await preprocess_image(image_bytes)
         
         # Make prediction using actual model
-        predictions = model.predict(processed_image, verbose=0)
+        predictions = await inference_executor.run(model.predict, processed_image, verbose=0)
         
         # Get predicted class and confidence
         predicted_index = np.argmax(predictions[0])
@@ -142,6 +140,8 @@ async def predict_plant(file: UploadFile = File(...)) -> Dict:
             "safety_note": "Never consume unknown plants. Misidentification can be dangerous or fatal."
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
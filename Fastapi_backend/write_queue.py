@@ -0,0 +1,230 @@
+"""
+Single-writer queue for SQLite
+Route writes are funnelled to one connection and group-committed, so they never fight over the write lock
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import DATABASE_URL
+from db_config import apply_sqlite_profile, is_sqlite_file
+from executors import ExecutorSaturated
+from metrics import registry
+
+# "0" sends SQLite writes straight through the request's session as on PostgreSQL
+SQLITE_WRITE_QUEUE = os.getenv("SQLITE_WRITE_QUEUE", "1").lower() in ("1", "true", "yes")
+# Writes per transaction, and how long the first one waits for company (ms)
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "64"))
+WRITE_BATCH_WAIT_MS = float(os.getenv("WRITE_BATCH_WAIT_MS", "0"))
+MAX_PENDING_WRITES = int(os.getenv("MAX_PENDING_WRITES", "1024"))
+
+WRITE_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# A write is a sync function ``fn(session, *args)`` that adds/updates rows and flushes
+WriteJob = Tuple[Callable, tuple, asyncio.Future, float]
+
+
+def create_writer_engine(url: str):
+    """One-connection engine whose transactions start with BEGIN IMMEDIATE.
+
+    pysqlite defers BEGIN until the first write and would end a transaction
+    at the first RELEASE, breaking the per-write savepoints; driving BEGIN
+    ourselves fixes both and takes the write lock up front, so the writer
+    never hits a lock upgrade deadlock against a reader.
+    """
+    engine = create_engine(url, pool_size=1, max_overflow=0, pool_pre_ping=False,
+                           connect_args={"check_same_thread": False})
+    apply_sqlite_profile(engine)
+
+    @event.listens_for(engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+class WriteQueue:
+    """Group commit for SQLite writes.
+
+    Requests queue their write and wait; one task hands everything queued
+    (up to ``max_batch``) to a single writer thread, which runs each write in
+    its own SAVEPOINT and commits once. A failing write rolls back alone and
+    gets its exception; the rest of the group still commits. Readers keep
+    using the async pool and, with WAL, are never blocked by the writer.
+    """
+
+    def __init__(self, url: str, max_batch: int = WRITE_BATCH_MAX, max_wait_ms: float = WRITE_BATCH_WAIT_MS,
+                 max_queue: int = MAX_PENDING_WRITES):
+        self.url = url
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+
+        self._engine = None
+        self._session_factory = None
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.batch_size_histogram = registry.histogram(
+            "db_write_batch_size", "Writes per SQLite commit", WRITE_BATCH_BUCKETS
+        )
+        self.queue_wait_histogram = registry.histogram(
+            "db_write_queue_wait_ms", "Time a write waited for the writer (ms)"
+        )
+        self.commit_histogram = registry.histogram(
+            "db_write_commit_ms", "Writer transaction time, all writes plus COMMIT (ms)"
+        )
+        self.failed = registry.counter("db_writes_failed_total", "Queued writes that raised")
+        registry.gauge("db_write_queue_depth", "Writes waiting for the writer",
+                       lambda: self._queue.qsize() if self._queue is not None else 0)
+
+    def _ensure_worker(self) -> None:
+        """Start the writer task on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, fn: Callable, *args):
+        """Run ``fn(session, *args)`` in the next group commit and return its result"""
+        self._ensure_worker()
+        if self._queue.qsize() >= self.max_queue:
+            raise ExecutorSaturated("database writer")
+
+        future = self._loop.create_future()
+        await self._queue.put((fn, args, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[Optional[WriteJob]]:
+        jobs = [await self._queue.get()]
+        if jobs[0] is None:
+            return jobs
+        deadline = jobs[0][3] + self.max_wait
+
+        while len(jobs) < self.max_batch and jobs[-1] is not None:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Everything that queued up during the last commit joins this one
+                while len(jobs) < self.max_batch and not self._queue.empty() and jobs[-1] is not None:
+                    jobs.append(self._queue.get_nowait())
+                break
+            try:
+                jobs.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return jobs
+
+    async def _run(self) -> None:
+        while True:
+            jobs = await self._collect()
+            # None is the shutdown marker from close(): commit what came before it, then stop
+            stopping = jobs[-1] is None
+            jobs = [job for job in jobs if job is not None]
+            if jobs:
+                await self._commit(jobs)
+            if stopping:
+                return
+
+    async def _commit(self, jobs: List[WriteJob]) -> None:
+        dispatched_at = time.perf_counter()
+        for _, _, _, enqueued_at in jobs:
+            self.queue_wait_histogram.observe((dispatched_at - enqueued_at) * 1000.0)
+        self.batch_size_histogram.observe(len(jobs))
+
+        try:
+            outcomes = await self._loop.run_in_executor(self._thread, self._apply, jobs)
+        except Exception as e:
+            # The commit itself failed: nothing in the group was stored
+            outcomes = [(False, e)] * len(jobs)
+        finally:
+            self.commit_histogram.observe((time.perf_counter() - dispatched_at) * 1000.0)
+
+        for (_, _, future, _), (ok, value) in zip(jobs, outcomes):
+            if not ok:
+                self.failed.inc()
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _apply(self, jobs: List[WriteJob]) -> List[Tuple[bool, object]]:
+        """Writer thread: every job in one transaction, one SAVEPOINT each"""
+        if self._session_factory is None:
+            self._engine = create_writer_engine(self.url)
+            self._session_factory = sessionmaker(bind=self._engine, autoflush=False, expire_on_commit=False)
+
+        outcomes = []
+        db = self._session_factory()
+        try:
+            for fn, args, _, _ in jobs:
+                savepoint = db.begin_nested()
+                try:
+                    result = fn(db, *args)
+                    savepoint.commit()
+                    outcomes.append((True, result))
+                except Exception as e:
+                    savepoint.rollback()
+                    outcomes.append((False, e))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return outcomes
+
+    async def close(self) -> None:
+        """Commit the writes already queued, then stop the task and release the connection"""
+        if self._worker is not None and not self._worker.done() and self._loop is asyncio.get_running_loop():
+            await self._queue.put(None)
+            await self._worker
+        self._thread.shutdown(wait=True)
+        if self._engine is not None:
+            self._engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "failed": int(self.failed.value),
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_ms": self.queue_wait_histogram.snapshot(),
+            "commit_ms": self.commit_histogram.snapshot(),
+        }
+
+
+# PostgreSQL handles concurrent writers itself; only SQLite files get the queue
+write_queue = WriteQueue(DATABASE_URL) if SQLITE_WRITE_QUEUE and is_sqlite_file(DATABASE_URL) else None
+
+
+async def run_write(db, fn: Callable, *args):
+    """Apply ``fn(session, *args)`` and commit, returning its result.
+
+    Goes through the write queue on SQLite, otherwise runs on the request's
+    AsyncSession. ``fn`` must flush (and refresh anything it returns that
+    the database fills in on update) since the caller reads the result
+    after the session is gone.
+    """
+    if write_queue is not None:
+        return await write_queue.submit(fn, *args)
+    result = await db.run_sync(fn, *args)
+    await db.commit()
+    return result
@@ -6,11 +6,131 @@ let predictionsData = [];
 let appointmentsData = [];
 let profilesData = [];
 
+// Keyset pagination: rows per request and a cap on how far back the tables go
+const PAGE_SIZE = 500;
+const MAX_TABLE_ROWS = 5000;
+const truncatedTables = {};
+
+// Follow X-Next-Cursor until the list is exhausted or maxRows is reached
+async function fetchAllPages(path, params = {}, maxRows = MAX_TABLE_ROWS) {
+    let rows = [];
+    let cursor = null;
+    do {
+        const query = new URLSearchParams({ ...params, limit: PAGE_SIZE });
+        if (cursor) {
+            query.set('cursor', cursor);
+        }
+        const response = await fetch(`${API_BASE_URL}${path}?${query}`);
+        if (!response.ok) {
+            throw new Error(`${path} returned ${response.status}`);
+        }
+        rows = rows.concat(await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor && rows.length < maxRows);
+    truncatedTables[path] = Boolean(cursor);
+    return rows;
+}
+
+// Change feed cursor; null until the first full load has taken one
+let syncCursor = null;
+
+// Insert or replace rows by id; new rows go on top, the table stays newest first
+function mergeRows(rows, changes) {
+    if (!changes.length) {
+        return rows;
+    }
+    const merged = rows.slice();
+    const positions = new Map(merged.map((row, index) => [row.id, index]));
+    const added = [];
+    changes.forEach(change => {
+        if (positions.has(change.id)) {
+            merged[positions.get(change.id)] = { ...merged[positions.get(change.id)], ...change };
+        } else {
+            added.push(change);
+        }
+    });
+    // The feed is oldest first
+    return added.reverse().concat(merged).slice(0, MAX_TABLE_ROWS);
+}
+
+// Fetch only rows inserted or updated since the last sync and merge them
+async function syncChanges() {
+    if (!syncCursor) {
+        return loadDashboardData();
+    }
+    try {
+        let data;
+        do {
+            const query = new URLSearchParams({ since: syncCursor, limit: PAGE_SIZE });
+            const response = await fetch(`${API_BASE_URL}/api/admin/changes?${query}`);
+            if (!response.ok) {
+                throw new Error(`/api/admin/changes returned ${response.status}`);
+            }
+            data = await response.json();
+            applyChanges(data);
+            syncCursor = data.cursor;
+        } while (data.has_more);
+    } catch (error) {
+        console.error('Error syncing changes:', error);
+        // Start over with a full load on the next tick
+        syncCursor = null;
+    }
+}
+
+// Merge changed rows (from the change feed or a live event) and redraw what changed
+function applyChanges(changes) {
+    const tables = [
+        ['feedback', () => feedbackData, rows => { feedbackData = rows; }, displayFeedback],
+        ['predictions', () => predictionsData, rows => { predictionsData = rows; }, displayPredictions],
+        ['appointments', () => appointmentsData, rows => { appointmentsData = rows; }, displayAppointments],
+        ['profiles', () => profilesData, rows => { profilesData = rows; }, displayProfiles]
+    ];
+    tables.forEach(([name, get, set, display]) => {
+        const rows = changes[name] || [];
+        if (rows.length) {
+            set(mergeRows(get(), rows));
+            display();
+        }
+    });
+    updateDashboardStats();
+}
+
+// Live updates over Server-Sent Events; each event carries the inserted or updated rows
+let liveUpdates = false;
+
+function connectLiveUpdates() {
+    if (!window.EventSource) {
+        return;
+    }
+    const source = new EventSource(`${API_BASE_URL}/api/events`);
+    source.onopen = () => {
+        liveUpdates = true;
+        // Catch up on anything written while the stream was down
+        syncChanges();
+    };
+    source.onerror = () => {
+        // EventSource reconnects by itself; poll until it does
+        liveUpdates = false;
+    };
+    ['feedback', 'predictions', 'appointments'].forEach(name => {
+        source.addEventListener(name, event => applyChanges({ [name]: JSON.parse(event.data) }));
+    });
+    // Events were dropped for this client: fetch what it missed
+    source.addEventListener('resync', () => syncChanges());
+}
+
 // Initialize dashboard
 document.addEventListener('DOMContentLoaded', function() {
-    loadDashboardData();
-    // Auto-refresh every 30 seconds
-    setInterval(loadDashboardData, 30000);
+    loadDashboardData().then(connectLiveUpdates);
+    // Poll for changes every 30 seconds while the live stream is down, and
+    // every 5 minutes while it is up (events only cover this server process)
+    let ticks = 0;
+    setInterval(() => {
+        ticks += 1;
+        if (!liveUpdates || ticks % 10 === 0) {
+            syncChanges();
+        }
+    }, 30000);
 });
 
 // Navigation functions
@@ -50,6 +170,10 @@ function showSection(sectionName) {
 // Data loading functions
 async function loadDashboardData() {
     try {
+        // Take the cursor before loading so nothing written meanwhile is missed;
+        // rows that show up in both are merged by id
+        const response = await fetch(`${API_BASE_URL}/api/admin/changes`);
+        syncCursor = response.ok ? (await response.json()).cursor : null;
         await Promise.all([
             loadFeedback(),
             loadPredictions(),
@@ -64,8 +188,7 @@ async function loadDashboardData() {
 
 async function loadFeedback() {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/feedback/`);
-        feedbackData = await response.json();
+        feedbackData = await fetchAllPages('/api/feedback/');
         displayFeedback();
         updateDashboardStats();
     } catch (error) {
@@ -76,8 +199,10 @@ async function loadFeedback() {
 
 async function loadPredictions() {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/predictions`);
-        predictionsData = await response.json();
+        // Only the columns the table shows
+        predictionsData = await fetchAllPages('/api/predictions', {
+            fields: 'id,user_id,thumbnail_url,prediction_result,confidence,timestamp'
+        });
         displayPredictions();
         updateDashboardStats();
     } catch (error) {
@@ -88,8 +213,7 @@ async function loadPredictions() {
 
 async function loadAppointments() {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/appointments/`);
-        appointmentsData = await response.json();
+        appointmentsData = await fetchAllPages('/api/appointments/');
         displayAppointments();
         updateDashboardStats();
     } catch (error) {
@@ -128,14 +252,24 @@ function displayFeedback() {
     });
 }
 
+// Local uploads are relative to the API; S3 links are absolute
+function mediaUrl(url) {
+    return /^https?:\/\//.test(url) ? url : `${API_BASE_URL}/${url}`;
+}
+
 function displayPredictions() {
     const tbody = document.getElementById('predictions-table-body');
     tbody.innerHTML = '';
     
     predictionsData.forEach(prediction => {
+        const thumbnail = prediction.thumbnail_url ?
+            `<img src="${mediaUrl(prediction.thumbnail_url)}" alt="Leaf" loading="lazy" style="width: 48px; height: 48px; border-radius: 4px; object-fit: cover;">` :
+            '<i class="fas fa-image fa-2x text-muted"></i>';
+        
         const row = `
             <tr>
                 <td>${prediction.id}</td>
+                <td>${thumbnail}</td>
                 <td>${prediction.user_id}</td>
                 <td>${prediction.prediction_result}</td>
                 <td>${(prediction.confidence * 100).toFixed(2)}%</td>
@@ -224,15 +358,46 @@ function displayProfiles() {
     });
 }
 
-// Update dashboard statistics
+// Update dashboard statistics from the server-side counters (/api/stats); the
+// tables only hold the newest rows, so their lengths are not the totals
+const STATS_MIN_INTERVAL_MS = 2000;
+let statsTimer = null;
+let statsFetchedAt = 0;
+
 function updateDashboardStats() {
-    document.getElementById('total-feedback').textContent = feedbackData.length;
-    document.getElementById('total-predictions').textContent = predictionsData.length;
-    document.getElementById('total-appointments').textContent = appointmentsData.length;
     document.getElementById('total-profiles').textContent = profilesData.length;
-    
-    const pendingAppointments = appointmentsData.filter(apt => apt.status === 'pending').length;
-    document.getElementById('pending-appointments').textContent = pendingAppointments;
+    // Coalesce bursts (live events, page loads) into one request
+    if (statsTimer) {
+        return;
+    }
+    const wait = Math.max(0, statsFetchedAt + STATS_MIN_INTERVAL_MS - Date.now());
+    statsTimer = setTimeout(loadStats, wait);
+}
+
+async function loadStats() {
+    // Changes arriving while this request is in flight schedule the next one
+    statsTimer = null;
+    statsFetchedAt = Date.now();
+    try {
+        const response = await fetch(`${API_BASE_URL}/api/stats`);
+        if (!response.ok) {
+            throw new Error(`/api/stats returned ${response.status}`);
+        }
+        const stats = await response.json();
+        document.getElementById('total-feedback').textContent = stats.total_feedback;
+        document.getElementById('total-predictions').textContent = stats.total_predictions;
+        document.getElementById('total-appointments').textContent = stats.total_appointments;
+        document.getElementById('pending-appointments').textContent = stats.pending_appointments;
+    } catch (error) {
+        console.error('Error loading stats:', error);
+        // Fall back to what the tables hold
+        const count = (rows, path) => rows.length + (truncatedTables[path] ? '+' : '');
+        document.getElementById('total-feedback').textContent = count(feedbackData, '/api/feedback/');
+        document.getElementById('total-predictions').textContent = count(predictionsData, '/api/predictions');
+        document.getElementById('total-appointments').textContent = count(appointmentsData, '/api/appointments/');
+        document.getElementById('pending-appointments').textContent =
+            appointmentsData.filter(apt => apt.status === 'pending').length;
+    }
 }
 
 // Appointment management functions